@@ -0,0 +1,265 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Cache of IUT build artifacts and a background builder
+
+A build is keyed on the state of the source repos (HEAD and the diff of
+the tracked files), the board, the contents of the ordered overlays and
+the build environment. An entry holds only the artifacts needed to run or
+flash the IUT, see ARTIFACT_PATTERNS. The absolute path of the build
+directory in them, e.g. the domain build directories of sysbuild that
+west flash uses, is rewritten to the directory the build is restored to.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+log = logging.debug
+
+BUILD_CACHE_MAX_ENTRIES = 16
+
+# Relative to the build directory, also for the images of sysbuild domains
+ARTIFACT_PATTERNS = (
+    '**/CMakeCache.txt',
+    'domains.yaml',
+    '**/zephyr/.config',
+    '**/zephyr/runners.yaml',
+    '**/zephyr/zephyr.exe',
+    '**/zephyr/zephyr.elf',
+    '**/zephyr/zephyr.hex',
+    '**/zephyr/zephyr.bin',
+    '**/zephyr/zephyr.signed.hex',
+    '**/zephyr/zephyr.signed.bin',
+    '**/merged*.hex',
+)
+
+# Artifacts with the absolute path of the build directory
+RELOCATED_ARTIFACT_PATTERNS = (
+    '**/CMakeCache.txt',
+    'domains.yaml',
+    '**/zephyr/runners.yaml',
+)
+
+# File of an entry with the absolute path of the build directory it was built in
+BUILD_DIR_FILE = 'build_dir.txt'
+
+# Variables of the environment that change the build output
+BUILD_ENV_VARS = ('ZEPHYR_BASE', 'ZEPHYR_TOOLCHAIN_VARIANT', 'ZEPHYR_SDK_INSTALL_DIR',
+                  'AUTOPTS_SOURCE_DIR_APP')
+
+
+def source_tree_hash(repo_paths):
+    """Hash of HEAD and of the uncommitted changes of the git repos
+
+    Untracked files are not hashed. Returns None if any of the paths is
+    not a git repo.
+    """
+    digest = hashlib.sha256()
+
+    try:
+        for path in repo_paths:
+            digest.update(subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=path))
+            digest.update(subprocess.check_output(['git', 'diff', 'HEAD', '--binary'], cwd=path))
+    except (OSError, subprocess.CalledProcessError) as e:
+        log(f"Cannot hash the source tree: {e}")
+        return None
+
+    return digest.hexdigest()
+
+
+def _relocate(build_dir, old_build_dir):
+    """Rewrite old_build_dir to build_dir in the artifacts"""
+    new_build_dir = os.path.abspath(build_dir)
+    replacements = {old_build_dir: new_build_dir,
+                    # CMake writes the paths with slashes, also on Windows
+                    old_build_dir.replace('\\', '/'): new_build_dir.replace('\\', '/')}
+
+    for pattern in RELOCATED_ARTIFACT_PATTERNS:
+        for path in glob.glob(os.path.join(build_dir, pattern), recursive=True):
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            for old, new in replacements.items():
+                data = data.replace(old.encode(), new.encode())
+
+            with open(path, 'wb') as f:
+                f.write(data)
+
+
+def build_key(source_hash, board, overlay_files, env_cmd=None, extra=()):
+    """Key of a build
+
+    overlay_files -- ordered paths of the overlays, their contents are hashed
+    extra -- other strings that change the build, e.g. the build command
+    """
+    if source_hash is None:
+        return None
+
+    overlays = []
+    for path in overlay_files:
+        with open(path, 'rb') as f:
+            overlays.append((os.path.basename(path), hashlib.sha256(f.read()).hexdigest()))
+
+    env = {name: os.environ.get(name) for name in BUILD_ENV_VARS}
+    key = json.dumps([source_hash, board, overlays, env_cmd, env, list(extra)])
+
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class BuildCache:
+    """Build artifacts in cache_dir, one directory per key"""
+
+    def __init__(self, cache_dir, max_entries=BUILD_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def __contains__(self, key):
+        return key is not None and os.path.isdir(self._entry_dir(key))
+
+    def store(self, key, build_dir):
+        tmp_dir = tempfile.mkdtemp(prefix=f'{key}.', dir=self.cache_dir)
+
+        for pattern in ARTIFACT_PATTERNS:
+            for path in glob.glob(os.path.join(build_dir, pattern), recursive=True):
+                dst = os.path.join(tmp_dir, os.path.relpath(path, build_dir))
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(path, dst)
+
+        with open(os.path.join(tmp_dir, BUILD_DIR_FILE), 'w') as f:
+            f.write(os.path.abspath(build_dir))
+
+        with self._lock:
+            entry_dir = self._entry_dir(key)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(tmp_dir)
+            else:
+                os.rename(tmp_dir, entry_dir)
+
+            self._prune()
+
+        log(f"Stored build {key} of {build_dir}")
+
+    def _prune(self):
+        entries = sorted((entry for entry in os.scandir(self.cache_dir)
+                          if entry.is_dir() and '.' not in entry.name),
+                         key=lambda entry: entry.stat().st_mtime)
+
+        for entry in entries[:max(len(entries) - self.max_entries, 0)]:
+            log(f"Removing build {entry.name} from the cache")
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def restore(self, key, build_dir):
+        """Copy the artifacts of a build to build_dir
+
+        Returns False if the build is not in the cache.
+        """
+        with self._lock:
+            entry_dir = self._entry_dir(key)
+            if key is None or not os.path.isdir(entry_dir):
+                return False
+
+            # Least recently used entries are pruned first
+            os.utime(entry_dir)
+
+            shutil.rmtree(build_dir, ignore_errors=True)
+            shutil.copytree(entry_dir, build_dir)
+
+        build_dir_file = os.path.join(build_dir, BUILD_DIR_FILE)
+        if os.path.exists(build_dir_file):
+            with open(build_dir_file) as f:
+                old_build_dir = f.read()
+
+            os.remove(build_dir_file)
+            _relocate(build_dir, old_build_dir)
+
+        log(f"Restored build {key} to {build_dir}")
+
+        return True
+
+    def build(self, key, build_dir, build_fn):
+        """Restore the build or run build_fn(build_dir) and store it
+
+        Returns True if the build has been restored from the cache.
+        """
+        if self.restore(key, build_dir):
+            return True
+
+        shutil.rmtree(build_dir, ignore_errors=True)
+        build_fn(build_dir)
+
+        if key is not None:
+            self.store(key, build_dir)
+
+        return False
+
+
+class BackgroundBuilder:
+    """Builds to the cache, e.g. the next config while the current one is tested
+
+    Each build runs in its own build directory under the cache directory,
+    which is removed once the build is stored, see BuildCache.restore.
+    A failed build is only logged, the foreground build of the config
+    reports it.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._builds = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, build_fn):
+        with self._lock:
+            if key is None or key in self.cache or key in self._builds:
+                return
+
+            thread = threading.Thread(target=self._build, args=(key, build_fn),
+                                      name='BackgroundBuilder', daemon=True)
+            self._builds[key] = thread
+
+        thread.start()
+
+    def _build(self, key, build_fn):
+        build_dir = os.path.join(self.cache.cache_dir, f'build.{key}')
+        start = time.monotonic()
+
+        try:
+            self.cache.build(key, build_dir, build_fn)
+            log(f"Background build {key} done in {time.monotonic() - start:.1f} s")
+        except Exception as e:
+            logging.exception(e)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    def wait(self, key):
+        """Wait for the build of key if it is running"""
+        with self._lock:
+            thread = self._builds.pop(key, None)
+
+        if thread:
+            log(f"Waiting for the background build {key}")
+            thread.join()
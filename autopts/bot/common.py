@@ -34,7 +34,9 @@ from autopts.bot.common_features import github, google_drive, mail, report
 from autopts.client import Client, CliParser, TestCaseRunStats, init_logging, run_recovery
 from autopts.config import AUTOPTS_ROOT_DIR, MAX_SERVER_RESTART_TIME, generate_file_paths, SERIAL_BAUDRATE
 from autopts.ptsprojects.boards import get_debugger_snr, get_free_device, get_tty, release_device
+from autopts.ptsprojects.results_store import remove_results_files
 from autopts.ptsprojects.testcase_db import DATABASE_FILE
+from autopts.pybtp.wirelog import WIRE_LOG_TEXT
 
 log = logging.debug
 
@@ -94,6 +96,7 @@ class BotConfigArgs(Namespace):
         self.local_addr = args.get('local_ip', ['127.0.0.1'] * len(self.cli_port))
         self.server_count = args.get('server_count', len(self.cli_port))
         self.tty_file = args.get('tty_file', None)
+        self.serial_btp = args.get('serial_btp', False)
         self.board_name = args.get('board', None)
         self.tty_alias = args.get('tty_alias', None)
         self.net_tty_file = args.get('net_tty_file', None)
@@ -104,9 +107,11 @@ class BotConfigArgs(Namespace):
         self.store = args.get('store', False)
         self.rtt_log = args.get('rtt_log', False)
         self.btmon = args.get('btmon', False)
+        self.btp_log = args.get('btp_log', WIRE_LOG_TEXT)
         self.device_core = args.get('device_core', 'NRF52840_XXAA')
         self.qemu_bin = args.get('qemu_bin', None)
         self.qemu_options = args.get('qemu_options', '-cpu cortex-m3 -machine lm3s6965evb')
+        self.qemu_snapshot = args.get('qemu_snapshot', False)
         self.btattach_bin = args.get('btattach_bin', None)
         self.btattach_at_every_test_case = args.get('btattach_at_every_test_case', False)
         self.btproxy_bin = args.get('btproxy_bin', None)
@@ -123,6 +128,9 @@ class BotConfigArgs(Namespace):
         self.bd_addr = args.get('bd_addr', '')
         self.enable_max_logs = args.get('enable_max_logs', False)
         self.retry = args.get('retry', 0)
+        self.deferred_retry = args.get('deferred_retry', False)
+        self.retry_slot = args.get('retry_slot', 0)
+        self.retry_backoff = float(args.get('retry_backoff', 10))
         self.no_retry_on_regression = args.get('no_retry_on_regression')
         self.repeat_until_fail = args.get('repeat_until_fail', False)
         self.stress_test = args.get('stress_test', False)
@@ -131,6 +139,11 @@ class BotConfigArgs(Namespace):
         self.active_hub_server = args.get('active_hub_server', None)
         self.recovery = args.get('recovery', False)
         self.superguard = float(args.get('superguard', 0))
+        self.superguard_stats = args.get('superguard_stats', False)
+        self.settle_time = float(args.get('settle_time', 3))
+        self.pipeline = args.get('pipeline', False)
+        self.order_test_cases = args.get('order_test_cases', False)
+        self.iut_pool = int(args.get('iut_pool', 0))
         self.cron_optim = args.get('cron_optim', False)
         self.project_repos = args.get('repos', None)
         self.test_case_limit = args.get('test_case_limit', 0)
@@ -142,6 +155,8 @@ class BotConfigArgs(Namespace):
         self.no_build = args.get('no_build', False)
         self.dongle_init_retry = args.get('dongle_init_retry', 5)
         self.build_env_cmd = args.get('build_env_cmd', None)
+        self.build_cache = args.get('build_cache', None)
+        self.prebuild = args.get('prebuild', False)
         self.copy_workspace = args.get('copy_workspace', True)
         self.wid_usage = args.get('wid_usage', False)
         self.pts_addr_map = args.get('pts_addr_map', {})
@@ -295,6 +310,10 @@ class BotClient(Client):
     def apply_config(self, args, config, value):
         pass
 
+    def prebuild_config(self, args, config, value):
+        """Start building the next config while the current one is tested"""
+        pass
+
     def bot_pre_cleanup(self):
         """Perform cleanup before test run
         :return: None
@@ -312,6 +331,8 @@ class BotClient(Client):
         files_to_save = [
             self.file_paths['ALL_STATS_RESULTS_XML_FILE'],
             self.file_paths['TC_STATS_RESULTS_XML_FILE'],
+            self.file_paths['ALL_STATS_RESULTS_JOURNAL_FILE'],
+            self.file_paths['TC_STATS_RESULTS_JOURNAL_FILE'],
             self.file_paths['TEST_CASES_JSON_FILE'],
             self.file_paths['ALL_STATS_JSON_FILE'],
             self.file_paths['TC_STATS_JSON_FILE'],
@@ -337,6 +358,9 @@ class BotClient(Client):
             run_config = split_test_cases_per_iut_target(_run_order, config_testcases_map,
                                                          self.args.iut_target_selection)
 
+            if self.args.order_test_cases:
+                self._order_test_cases(run_config)
+
             new_run_config = []
             for entry in run_config:
                 tcs = entry['test_cases']
@@ -371,8 +395,18 @@ class BotClient(Client):
 
             yield i, run_args
 
-    def _backup_tc_stats(self, config=None, test_case=None, stats=None, **kwargs):
-        if not self.backup or not stats:
+    def _order_test_cases(self, run_config):
+        # Within a config, before the --test_case_limit and the backup of the order
+        for entry in run_config:
+            entry['test_cases'], report = autoptsclient.plan_test_case_order(
+                entry['test_cases'], self.test_cases, self.test_case_database)
+
+            print(f"{entry['config_file']}: ", end='')
+            autoptsclient.print_order_simulation(report)
+
+    def _backup_tc_stats(self, config=None, test_case=None, stats=None, deferred_retry=False, **kwargs):
+        # A resumed run continues after the last test case run first
+        if not self.backup or not stats or deferred_retry:
             return
 
         stats.pending_config = config
@@ -382,8 +416,7 @@ class BotClient(Client):
     def _merge_stats(self, all_stats, stats):
         all_stats.merge(stats)
 
-        if os.path.exists(stats.xml_results):
-            os.remove(stats.xml_results)
+        remove_results_files(stats.xml_results)
 
         if os.path.exists(self.file_paths['TC_STATS_JSON_FILE']):
             os.remove(self.file_paths['TC_STATS_JSON_FILE'])
@@ -414,7 +447,9 @@ class BotClient(Client):
 
         projects = self.ptses[0].get_project_list()
 
-        for config, config_args in self._yield_next_config():
+        next_configs = list(self._yield_next_config())
+
+        for i, (config, config_args) in enumerate(next_configs):
             try:
                 if not stats:
                     stats = TestCaseRunStats(projects,
@@ -430,6 +465,11 @@ class BotClient(Client):
                 self.apply_config(config_args, config_args.iut_config_file,
                                   self.iut_config[config_args.iut_config_file])
 
+                if i + 1 < len(next_configs):
+                    _, prebuild_args = next_configs[i + 1]
+                    self.prebuild_config(prebuild_args, prebuild_args.iut_config_file,
+                                         self.iut_config[prebuild_args.iut_config_file])
+
                 rules = autoptsclient.parse_test_case_pts_addr_map(
                     getattr(self.args, "pts_addr_map", None))
                 restricted_pts_addrs = {
@@ -439,19 +479,26 @@ class BotClient(Client):
 
                 runtime_test_case_cache = {}
 
+                def _select_ptses(test_case):
+                    mapped_addr = rules.get(test_case) if test_case else None
+
+                    if test_case and mapped_addr:
+                        return autoptsclient.reorder_ptses_by_addr(self.ptses, test_case, rules)
+
+                    return [pts for pts in self.ptses
+                            if autoptsclient.normalize_bd_addr(pts.bd_addr()) not in restricted_pts_addrs]
+
+                def _test_case_selection_fn(test_case=None, **kwargs):
+                    # The IUT map is set per config
+                    return tuple(autoptsclient.normalize_bd_addr(pts.bd_addr())
+                                 for pts in _select_ptses(test_case))
+
                 def _pre_test_case_fn(config=None, test_case=None, stats=None, **kwargs):
                     self._backup_tc_stats(config=config, test_case=test_case, stats=stats, **kwargs)
 
-                    mapped_addr = rules.get(test_case) if test_case else None
-
                     self._ensure_ptses_ready(config_args)
 
-                    if test_case and mapped_addr:
-                        selected_ptses = autoptsclient.reorder_ptses_by_addr(self.ptses, test_case, rules)
-                    else:
-                        selected_ptses = [
-                            pts for pts in self.ptses
-                            if autoptsclient.normalize_bd_addr(pts.bd_addr()) not in restricted_pts_addrs]
+                    selected_ptses = _select_ptses(test_case)
 
                     cache_key = tuple(
                         autoptsclient.normalize_bd_addr(pts.bd_addr())
@@ -477,6 +524,8 @@ class BotClient(Client):
                                                      stats,
                                                      config=config,
                                                      pre_test_case_fn=_pre_test_case_fn,
+                                                     test_case_selection_fn=_test_case_selection_fn,
+                                                     setup_project_pixits=self.setup_project_pixits,
                                                      file_paths=copy.deepcopy(self.file_paths))
 
             except BuildAndFlashException:
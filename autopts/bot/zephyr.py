@@ -30,24 +30,26 @@ import serial
 
 from autopts import bot
 from autopts import client as autoptsclient
+from autopts.bot.build_cache import BackgroundBuilder, BuildCache, build_key, source_tree_hash
 from autopts.bot.common import BotClient, BotConfigArgs, BuildAndFlashException, check_call
 from autopts.config import FILE_PATHS
-from autopts.ptsprojects.boards import get_board_type, get_build_and_flash, tty_to_com
+from autopts.ptsprojects.boards import get_board_type, get_build, get_build_and_flash, get_flash, tty_to_com
 from autopts.ptsprojects.zephyr import ZEPHYR_PROJECT_URL
 from autopts.ptsprojects.zephyr.iutctl import get_iut, log
 
 PROJECT_NAME = Path(__file__).stem
 
 
-def build_image(zephyr_wd, tester_app_dir, cpu_type, conf_file=None, env_cmd=None):
+def build_image(zephyr_wd, tester_app_dir, cpu_type, conf_file=None, env_cmd=None, build_dir='build'):
     """Build and flash Zephyr binary
     :param zephyr_wd: Zephyr source path
     :param tester_app_dir: path to the tester application relative to zephyr_wd
     :param cpu_type: IUT
     :param conf_file: configuration file to be used
     :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    :param build_dir: build directory, relative to the tester application
     """
-    log(f"{build_image.__name__}: {zephyr_wd} {tester_app_dir} {cpu_type} {conf_file} {env_cmd}")
+    log(f"{build_image.__name__}: {zephyr_wd} {tester_app_dir} {cpu_type} {conf_file} {env_cmd} {build_dir}")
 
     if env_cmd:
         env_cmd = env_cmd.split() + ['&&']
@@ -56,9 +58,9 @@ def build_image(zephyr_wd, tester_app_dir, cpu_type, conf_file=None, env_cmd=Non
 
     tester_dir = os.path.join(zephyr_wd, tester_app_dir)
 
-    shutil.rmtree(os.path.join(tester_dir, 'build'), ignore_errors=True)
+    shutil.rmtree(os.path.join(tester_dir, build_dir), ignore_errors=True)
 
-    cmd = ['west', 'build', '-p', 'auto', '-b', cpu_type]
+    cmd = ['west', 'build', '-p', 'auto', '-b', cpu_type, '-d', build_dir]
     if conf_file and conf_file != 'default' and conf_file != 'prj.conf':
         cmd.extend(('--', f'-DEXTRA_CONF_FILE=\'{conf_file}\''))
 
@@ -94,16 +96,28 @@ def apply_overlay(zephyr_wd, tester_app_dir, cfg_name, overlay):
     :param overlay: defines changes to be applied
     :return: None
     """
+    # Not with chdir, the next config may be applied while test cases run
+    with open(get_overlay_path(zephyr_wd, tester_app_dir, cfg_name), 'w') as config:
+        for k, v in list(overlay.items()):
+            config.write(f"{k}={v}\n")
+
+
+def get_overlay_path(zephyr_wd, tester_app_dir, cfg_name):
     overwrite = os.getenv("AUTOPTS_SOURCE_DIR_APP")
-    cwd = os.getcwd()
 
-    os.chdir(os.path.join(zephyr_wd, overwrite if overwrite else tester_app_dir))
+    return os.path.join(zephyr_wd, overwrite if overwrite else tester_app_dir, cfg_name)
 
-    with open(cfg_name, 'w') as config:
-        for k, v in list(overlay.items()):
-            config.write(f"{k}={v}\n")
 
-    os.chdir(cwd)
+def get_repo_paths(zephyr_wd, project_repos):
+    """Paths of the repos of a build, for the build cache key"""
+    paths = [zephyr_wd]
+
+    for repo in (project_repos or {}).values():
+        path = repo.get('path') if isinstance(repo, dict) else repo
+        if path:
+            paths.append(path)
+
+    return paths
 
 
 def zephyr_hash_url(commit):
@@ -146,6 +160,8 @@ class ZephyrBotClient(BotClient):
                          ZephyrBotCliParser)
         self.config_default = "prj.conf"
         self.fail_info_parser = zephyr_get_assertion_info
+        self.build_cache = None
+        self.builder = None
 
     def apply_config(self, args, config, value):
         iutctl = self.get_iut()
@@ -162,7 +178,77 @@ class ZephyrBotClient(BotClient):
         else:
             self._apply_config(next(iter(args.iut_targets_args.values())), config, value)
 
-    def _apply_config(self, args, config, value):
+    def prebuild_config(self, args, config, value):
+        if hasattr(self.get_iut(), 'select_iut'):
+            targets_args = [args.iut_targets_args[name] for name in args.iut_map.values()]
+        else:
+            targets_args = [next(iter(args.iut_targets_args.values()))]
+
+        for iut_args in targets_args:
+            self._prebuild_config(iut_args, config, value)
+
+    def _get_build_cache(self, args):
+        if self.build_cache is None and args.build_cache:
+            self.build_cache = BuildCache(args.build_cache)
+            if args.prebuild:
+                self.builder = BackgroundBuilder(self.build_cache)
+
+        return self.build_cache
+
+    def _get_build_fn(self, args, overlays):
+        """Return (board, build_fn(build_dir)) or (None, None) if the build cannot be cached"""
+        if args.iut_mode != 'tty':
+            return str(args.kernel_cpu), lambda build_dir: build_image(
+                args.project_path, args.tester_app_dir, args.kernel_cpu, overlays, args.build_env_cmd, build_dir)
+
+        build = get_build(args.board_name)
+        if build is None or get_flash(args.board_name) is None:
+            return None, None
+
+        board_type = get_board_type(args.board_name)
+
+        return board_type, lambda build_dir: build(
+            args.project_path, args.tester_app_dir, board_type, overlays, args.project_repos,
+            args.build_env_cmd, build_dir=build_dir)
+
+    def _get_build_key(self, args, board, configs):
+        source_hash = source_tree_hash(get_repo_paths(args.project_path, args.project_repos))
+        overlay_files = [get_overlay_path(args.project_path, args.tester_app_dir, name) for name in configs]
+        overlay_files = [path if os.path.exists(path) else
+                         os.path.join(args.project_path, args.tester_app_dir, name)
+                         for path, name in zip(overlay_files, configs, strict=True)]
+
+        return build_key(source_hash, board, overlay_files, args.build_env_cmd,
+                         (str(args.tester_app_dir), args.iut_mode))
+
+    def _cached_build(self, args, configs, board, build_fn):
+        tester_dir = os.path.join(args.project_path, args.tester_app_dir)
+        build_dir = os.path.join(tester_dir, 'build')
+        cache = self._get_build_cache(args)
+
+        if not cache:
+            build_fn(build_dir)
+            return
+
+        key = self._get_build_key(args, board, configs)
+        if self.builder:
+            self.builder.wait(key)
+
+        if cache.build(key, build_dir, build_fn):
+            log(f"Build of {';'.join(configs)} restored from the cache")
+
+    def _prebuild_config(self, args, config, value):
+        if args.no_build or not self._get_build_cache(args) or not self.builder:
+            return
+
+        configs = self._get_overlays(args, config, value)
+        board, build_fn = self._get_build_fn(args, ';'.join(configs))
+        if build_fn is None:
+            return
+
+        self.builder.submit(self._get_build_key(args, board, configs), build_fn)
+
+    def _get_overlays(self, args, config, value):
         pre_overlay = value.get('pre_overlay', [])
         if isinstance(pre_overlay, str):
             pre_overlay = [pre_overlay]
@@ -183,6 +269,11 @@ class ZephyrBotClient(BotClient):
 
             configs.append(name)
 
+        return configs
+
+    def _apply_config(self, args, config, value):
+        configs = self._get_overlays(args, config, value)
+
         # The order is used in the -DEXTRA_CONF_FILE="<overlay1>;<...>" option.
         overlays = ';'.join(configs)
 
@@ -203,13 +294,20 @@ class ZephyrBotClient(BotClient):
 
             return
 
+        board, build_fn = self._get_build_fn(args, overlays)
+
         if args.iut_mode == 'tty':
             build_and_flash = get_build_and_flash(args.board_name)
             board_type = get_board_type(args.board_name)
 
             try:
-                build_and_flash(args.project_path, args.tester_app_dir, board_type, args.debugger_snr,
-                                overlays, args.project_repos, args.build_env_cmd)
+                if build_fn and args.build_cache:
+                    self._cached_build(args, configs, board, build_fn)
+                    get_flash(args.board_name)(args.project_path, args.tester_app_dir, args.debugger_snr,
+                                               args.build_env_cmd)
+                else:
+                    build_and_flash(args.project_path, args.tester_app_dir, board_type, args.debugger_snr,
+                                    overlays, args.project_repos, args.build_env_cmd)
 
                 flush_serial(args.tty_file, rtscts=args.rtscts, baudrate=args.tty_baudrate)
             except BaseException as e:
@@ -219,7 +317,7 @@ class ZephyrBotClient(BotClient):
 
             time.sleep(10)
         else:
-            build_image(args.project_path, args.tester_app_dir, args.kernel_cpu, overlays, args.build_env_cmd)
+            self._cached_build(args, configs, board, build_fn)
             if args.setcap_cmd:
                 check_call(args.setcap_cmd.split())
 
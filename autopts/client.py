@@ -30,31 +30,52 @@ import re
 import shutil
 import signal
 import socket
+import subprocess
 import sys
 import threading
 import time
 import traceback
-import xml.etree.ElementTree as ElementTree
 import xmlrpc.client
+from contextlib import contextmanager
+from functools import partial
 from os.path import dirname
-from xmlrpc.server import SimpleXMLRPCServer
 
 from termcolor import colored
 
-from autopts.config import FILE_PATHS
+from autopts.config import FILE_PATHS, generate_file_paths
 from autopts.ptsprojects import ptstypes, stack
 from autopts.ptsprojects.boards import get_available_boards, tty_to_com
 from autopts.ptsprojects.ptstypes import E_FATAL_ERROR
-from autopts.ptsprojects.testcase import PTSCallback, TestCaseLT1, TestCaseLT2, TestCaseLT3
+from autopts.ptsprojects.results_store import ResultsStore, get_journal_path, remove_results_files
+from autopts.ptsprojects.testcase import (
+    SETTLE_TIME,
+    TEST_CASE_STATE_COND,
+    PTSCallback,
+    TestCaseLT1,
+    TestCaseLT2,
+    TestCaseLT3,
+    configure_settle,
+)
 from autopts.ptsprojects.testcase_db import TestCaseTable
 from autopts.pybtp import btp
 from autopts.pybtp.btp import get_iut_method as get_iut
 from autopts.pybtp.types import BTPError, BTPFatalError, BTPInitError, MissingWIDError, SynchError
+from autopts.retry_scheduler import RetryScheduler, is_deterministic_failure
+from autopts.sharding import (
+    ShardCoordinator,
+    ShardScheduler,
+    ShardWorker,
+    estimate_durations,
+    iter_shard_test_cases,
+    load_rig_groups,
+)
+from autopts.test_order import get_signatures, order_test_cases, simulate_order
 from autopts.utils import (
     CounterWithFlag,
     InterruptableThread,
     ResultWithFlag,
     RunEnd,
+    WaitCondition,
     active_hub_server_replug_usb,
     extract_wid_testcases_to_csv,
     get_global_end,
@@ -63,6 +84,8 @@ from autopts.utils import (
     set_global_end,
     ykush_replug_usb,
 )
+from autopts.xmlrpc_keepalive import KeepAliveTransport, KeepAliveXMLRPCRequestHandler, ThreadingXMLRPCServer
+from autopts.xmlrpc_keepalive import multicall as xmlrpc_multicall
 from cliparser import CliParser
 
 log = logging.debug
@@ -72,6 +95,9 @@ RUNNING_TEST_CASE = {}
 autoprojects = None
 TEST_CASE_TIMEOUT_MS = 300000  # milliseconds
 
+# Max number of PTS log callbacks written with a single logging call
+LOG_CALLBACK_BATCH_MAX = 100
+
 # To test autopts client locally:
 # Envrinment variable AUTO_PTS_LOCAL must be set for FakeProxy to
 # be used. When FakeProxy is used autoptsserver on Windows will
@@ -92,34 +118,89 @@ def logger_log(self, *args, **kwargs):
 
 
 class PtsServerProxy(xmlrpc.client.ServerProxy):
-    """Client to remote autoptsserver"""
+    """Client to remote autoptsserver
+
+    Results of MEMOIZED_METHODS are cached until one of the
+    INVALIDATING_METHODS is called.
+    """
+
+    MEMOIZED_METHODS = ('bd_addr', 'get_version', 'get_project_list')
+    INVALIDATING_METHODS = ('cleanup_caches', 'restart_pts', 'recover_pts', 'open_workspace')
+
     def __init__(self, server_address, server_port):
         super().__init__(uri=f"http://{server_address}:{server_port}/",
-                         allow_none=True, transport=None,
+                         allow_none=True,
+                         transport=KeepAliveTransport(use_datetime=False, use_builtin_types=False,
+                                                      headers=()),
                          encoding=None, verbose=False,
                          use_datetime=False, use_builtin_types=False,
                          headers=(), context=None)
         self.info = f"{server_address}:{server_port}"
         self.callback_thread = None
         self.callback = None
+        self.pixit_mirror = {}
+        self._memo = {}
+        self._multicall_supported = True
+
+    def __getattr__(self, name):
+        if name in self.MEMOIZED_METHODS:
+            return partial(self._call_memoized, name)
+
+        if name in self.INVALIDATING_METHODS:
+            self._memo.clear()
+
+        return super().__getattr__(name)
+
+    def _call_memoized(self, method_name):
+        try:
+            return self._memo[method_name]
+        except KeyError:
+            pass
+
+        result = super().__getattr__(method_name)()
+        # E.g. no address before PTS has started
+        if result:
+            self._memo[method_name] = result
+
+        return result
+
+    def multicall(self, calls):
+        """Call methods in a single request, see xmlrpc_keepalive.multicall"""
+        calls = list(calls)
+
+        if self._multicall_supported:
+            try:
+                return xmlrpc_multicall(self, calls)
+            except xmlrpc.client.Fault as e:
+                if 'system.multicall' not in e.faultString:
+                    raise
+
+                log(f'{self.info} does not support system.multicall')
+                self._multicall_supported = False
+
+        return [super(PtsServerProxy, self).__getattr__(method_name)(*args)
+                for method_name, args in calls]
+
+    def set_pixit(self, project_name, param_name, param_value):
+        result = self.__getattr__('set_pixit')(project_name, param_name, param_value)
+        update_pixit_mirror(self, project_name, {param_name: param_value})
+        return result
 
     @staticmethod
     def factory_get_instance(_id, server_address, server_port,
                              client_address, client_port, timeout):
-        proxy = proxy = PtsServerProxy(server_address, server_port)
-        result = ResultWithFlag(False)
+        proxy = PtsServerProxy(server_address, server_port)
         print(f"{id(proxy)} Starting PTS: {proxy.info} ...")
 
-        def wait_for():
+        def is_ready():
             try:
                 proxy.ready()
-                result.set(True)
+                return True
             except BaseException:
                 log('autoptsserver not responding, retrying...')
-            # Continue waiting
-            return True
+                return False
 
-        result.wait(timeout=timeout, predicate=wait_for)
+        WaitCondition().wait_for(is_ready, timeout=timeout, poll_period=1)
 
         log("Server methods: %s", proxy.system.listMethods())
         proxy.callback_thread = ClientCallbackServer(client_port, f'LT{_id}-callback')
@@ -170,25 +251,20 @@ class PtsServer(Server):
     def __init__(self, _args=None):
         super().__init__(PtsServer.finish_count, _args=_args)
         self.info = f'builtin {_args.srv_port}'
+        self.pixit_mirror = {}
+
+    def set_pixit(self, project_name, param_name, param_value):
+        result = self._dispatch_to_pts('set_pixit', project_name, param_name, param_value)
+        update_pixit_mirror(self, project_name, {param_name: param_value})
+        return result
 
     @staticmethod
     def factory_get_instance(args, timeout):
         proxy = PtsServer(args)
         proxy.start()
 
-        result = ResultWithFlag(False)
-
-        def wait_for():
-            if proxy.ready():
-                result.set(True)
-                return False
-            # Continue waiting
-            return True
-
         try:
-            result.wait(timeout=timeout, predicate=wait_for)
-            if not result.get_nowait():
-                raise Exception('Failed to start autoptsserver')
+            WaitCondition().wait_for(proxy.ready, timeout=timeout, poll_period=1)
         except BaseException:
             proxy.terminate()
             raise
@@ -199,10 +275,78 @@ class PtsServer(Server):
         return proxy
 
 
+class LogCallbackWorker(threading.Thread):
+    """Writes the PTS log callbacks out of the callback server threads
+
+    The log callbacks only queue the entries, so a burst of them with the
+    maximum logging enabled does not hold the callback server and the log
+    lock when a WID comes. The entries queued meanwhile are coalesced into
+    a single logging call of up to LOG_CALLBACK_BATCH_MAX lines, written
+    only when no WID is being handled.
+    """
+
+    def __init__(self, logger):
+        super().__init__(name='LogCallbackWorker', daemon=True)
+        self.logger = logger
+        self.queue = queue.SimpleQueue()
+        self._wids = 0
+        self._wids_cond = threading.Condition()
+
+    def put(self, entry):
+        self.queue.put(entry)
+
+    @contextmanager
+    def deferred(self):
+        """Hold back the writes while a WID is handled"""
+        with self._wids_cond:
+            self._wids += 1
+
+        try:
+            yield
+        finally:
+            with self._wids_cond:
+                self._wids -= 1
+                self._wids_cond.notify_all()
+
+    def stop(self, timeout=1):
+        """Write the queued entries and stop"""
+        self.queue.put(None)
+        self.join(timeout=timeout)
+
+    def run(self):
+        while True:
+            entries = [self.queue.get()]
+            # The worker is the only consumer
+            while entries[-1] is not None and len(entries) < LOG_CALLBACK_BATCH_MAX \
+                    and not self.queue.empty():
+                entries.append(self.queue.get())
+
+            end = entries[-1] is None
+            if end:
+                entries.pop()
+
+            with self._wids_cond:
+                self._wids_cond.wait_for(lambda: not self._wids)
+
+            try:
+                if entries:
+                    self.logger.info("\n".join(
+                        f"{ptstypes.PTS_LOGTYPE_STRING[log_type]} {logtype_string} {log_time} "
+                        f"{test_case_name} {log_message}"
+                        for log_type, logtype_string, log_time, log_message, test_case_name in entries))
+            except Exception as e:
+                logging.exception(e)
+
+            if end:
+                break
+
+
 class ClientCallback(PTSCallback):
     def __init__(self):
         super().__init__()
         self.exception = queue.Queue()
+        self.log_worker = LogCallbackWorker(logging.getLogger(f"{self.__class__.__name__}.log"))
+        self.log_worker.start()
         self._results = {}
         self._callbacks = {}
         # Long methods run asynchronously
@@ -245,12 +389,12 @@ class ClientCallback(PTSCallback):
 
         test_case_name - To be identified by client in case of multiple pts
                          usage.
+
+        Written by the log_worker, see LogCallbackWorker.
         """
 
-        logger = logging.getLogger(f"{self.__class__.__name__}.{self.log.__name__}")
-        logger.info("%s %s %s %s %s", ptstypes.PTS_LOGTYPE_STRING[log_type],
-                    logtype_string, log_time, test_case_name,
-                    log_message)
+        self.log_worker.put((log_type, logtype_string, log_time, log_message,
+                             test_case_name))
 
     def on_implicit_send(self, project_name, wid, test_case_name, description,
                          style):
@@ -269,9 +413,11 @@ class ClientCallback(PTSCallback):
         };
         """
 
-        logger = logging.getLogger(f"{self.__class__.__name__}.{self.on_implicit_send.__name__}")
+        # The log callbacks wait for the WID
+        with self.log_worker.deferred():
+            logger = logging.getLogger(f"{self.__class__.__name__}.{self.on_implicit_send.__name__}")
 
-        logger.info(f"""
+            logger.info(f"""
     {"*" * 20}
     BEGIN OnImplicitSend:
     project_name: {project_name}
@@ -280,29 +426,29 @@ class ClientCallback(PTSCallback):
     description: {description}
     style: {ptstypes.MMI_STYLE_STRING[style]} 0x{style:x}""")
 
-        try:
-            # XXX: 361 WID MESH sends tc name with leading white spaces
-            test_case_name = test_case_name.lstrip()
+            try:
+                # XXX: 361 WID MESH sends tc name with leading white spaces
+                test_case_name = test_case_name.lstrip()
 
-            logger.info("Calling test cases on_implicit_send")
+                logger.info("Calling test cases on_implicit_send")
 
-            RUNNING_TEST_CASE[test_case_name].on_implicit_send(project_name, wid, test_case_name,
-                                                               description, style)
+                RUNNING_TEST_CASE[test_case_name].on_implicit_send(project_name, wid, test_case_name,
+                                                                   description, style)
 
-            # Make the PTS wait for response without blocking xmlrpc server
-            testcase_response = "WAIT"
+                # Make the PTS wait for response without blocking xmlrpc server
+                testcase_response = "WAIT"
 
-        except Exception as e:
-            testcase_response = "Cancel"
-            logging.exception("OnImplicitSend caught exception %s", e)
-            self.exception.put(sys.exc_info()[1])
+            except Exception as e:
+                testcase_response = "Cancel"
+                logging.exception("OnImplicitSend caught exception %s", e)
+                self.exception.put(sys.exc_info()[1])
 
-        logger.info(f"""
+            logger.info(f"""
     on_implicit_send returned response: {testcase_response}
     END OnImplicitSend
     {'*' * 20}""")
 
-        return testcase_response
+            return testcase_response
 
     def set_result(self, method_name, result):
         """
@@ -332,6 +478,10 @@ class ClientCallback(PTSCallback):
 
         return result
 
+    def notify(self, method_name):
+        """Wake up get_result() waiting for the method to check its predicate"""
+        self._results[method_name].notify()
+
     def cleanup(self):
         while not self.exception.empty():
             self.exception.get_nowait()
@@ -374,8 +524,11 @@ class ClientCallbackServer(threading.Thread):
         log("%s.%s", self.__class__.__name__, self.run.__name__)
         log("Client callback serving on port %s ...", self.port)
 
-        self.server = SimpleXMLRPCServer(("", self.port),
-                                         allow_none=True, logRequests=False)
+        # Each connection is served in its own thread, so the log
+        # callbacks, sent over their own connection, do not delay WIDs.
+        self.server = ThreadingXMLRPCServer(("", self.port),
+                                            requestHandler=KeepAliveXMLRPCRequestHandler,
+                                            allow_none=True, logRequests=False)
         self.server.register_instance(self.callback)
         self.server.register_introspection_functions()
         self.server.timeout = 1.0
@@ -388,6 +541,7 @@ class ClientCallbackServer(threading.Thread):
         finally:
             log("Client callback finishing...")
             self.server.server_close()
+            self.callback.log_worker.stop()
 
     def stop(self):
         log("%s.%s", self.__class__.__name__, self.stop.__name__)
@@ -478,6 +632,7 @@ def init_pts_thread_entry(proxy, args, exceptions, finish_count):
 
     sys.stdout.flush()
     proxy.cleanup_caches()
+    proxy.pixit_mirror = {}
     err = proxy.restart_pts()
     if err != "WAIT":
         raise Exception("Failed to restart PTS!")
@@ -595,12 +750,10 @@ class TestCaseRunStats:
         self.test_run_completed = False
         self.session_log_dir = None
         self.fail_info_cb = None
+        self.results = None
 
-        if self.xml_results and not os.path.exists(self.xml_results):
-            os.makedirs(dirname(self.xml_results), exist_ok=True)
-            root = ElementTree.Element("results")
-            tree = ElementTree.ElementTree(root)
-            tree.write(self.xml_results)
+        if self.xml_results:
+            self.results = ResultsStore(self.xml_results)
 
         if self.db:
             self.est_duration = db.estimate_session_duration(test_cases,
@@ -620,6 +773,10 @@ class TestCaseRunStats:
             data = json.load(f)
             stats = TestCaseRunStats([], [], 0, None)
             stats.__dict__.update(data)
+
+            if stats.xml_results:
+                stats.results = ResultsStore(stats.xml_results)
+
             return stats
 
     def merge(self, stats2):
@@ -632,99 +789,80 @@ class TestCaseRunStats:
         self.pending_test_case = stats2.pending_test_case
         self.session_log_dir = stats2.session_log_dir
 
-        stats2_tree = ElementTree.parse(stats2.xml_results)
-        root2 = stats2_tree.getroot()
+        self.results.extend(stats2.results.records)
+        self.results.export_xml()
 
-        self_tree = ElementTree.parse(self.xml_results)
-        root1 = self_tree.getroot()
-        root1.extend(root2)
-        self_tree.write(self.xml_results)
+    def export_xml(self):
+        self.results.export_xml()
 
     def update(self, test_case_name, duration, status, description='', test_start_time=None, test_end_time=None):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
-        elem = root.find(f"./test_case[@name='{test_case_name}']")
-        if elem is None:
-            elem = ElementTree.SubElement(root, 'test_case')
-            elem.attrib["new"] = '0'
+        record = self.results.get(test_case_name)
+        if record is None:
+            record = {"new": '0'}
 
             status_previous = None
             if self.db:
                 status_previous = self.db.get_result(test_case_name)
                 if status_previous is None:
-                    elem.attrib["new"] = '1'
+                    record["new"] = '1'
 
-            elem.attrib["project"] = test_case_name.split('/')[0]
-            elem.attrib["name"] = test_case_name
-            elem.attrib["duration"] = str(duration)
-            elem.attrib["status"] = ""
-            elem.attrib["status_previous"] = str(status_previous)
-            elem.attrib["description"] = description
-            elem.attrib["test_start_time"] = ""
-            elem.attrib["test_end_time"] = ""
+            record["project"] = test_case_name.split('/')[0]
+            record["name"] = test_case_name
+            record["duration"] = str(duration)
+            record["status"] = ""
+            record["status_previous"] = str(status_previous)
+            record["description"] = description
+            record["test_start_time"] = ""
+            record["test_end_time"] = ""
 
             run_count = 0
         else:
-            run_count = int(elem.attrib["run_count"])
+            record = dict(record)
+            run_count = int(record["run_count"])
 
-        elem.attrib["status"] = status
+        record["status"] = status
 
         if test_start_time is not None:
-            elem.attrib["test_start_time"] = test_start_time.strftime('%Y-%m-%d %H:%M:%S')
+            record["test_start_time"] = test_start_time.strftime('%Y-%m-%d %H:%M:%S')
         if test_end_time is not None:
-            elem.attrib["test_end_time"] = test_end_time.strftime('%Y-%m-%d %H:%M:%S')
+            record["test_end_time"] = test_end_time.strftime('%Y-%m-%d %H:%M:%S')
 
-        regression = bool(elem.attrib["status"] != "PASS" and elem.attrib["status_previous"] == "PASS")
-        progress = bool(elem.attrib["status"] == "PASS" and elem.attrib["status_previous"] != "PASS"
-                        and elem.attrib["status_previous"] != "None")
+        regression = bool(record["status"] != "PASS" and record["status_previous"] == "PASS")
+        progress = bool(record["status"] == "PASS" and record["status_previous"] != "PASS"
+                        and record["status_previous"] != "None")
 
-        elem.attrib["regression"] = str(regression)
-        elem.attrib["progress"] = str(progress)
-        elem.attrib["run_count"] = str(run_count + 1)
+        record["regression"] = str(regression)
+        record["progress"] = str(progress)
+        record["run_count"] = str(run_count + 1)
 
-        tree.write(self.xml_results)
+        self.results.set(record)
 
         return regression, progress
 
     def update_descriptions(self, descriptions):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
-        for tc in descriptions.keys():
-            elem = root.find(f"./test_case[@name='{tc}']")
-            if elem is None:
+        for tc, description in descriptions.items():
+            record = self.results.get(tc)
+            if record is None:
                 continue
 
-            elem.attrib["description"] = descriptions[tc]
+            self.results.set(dict(record, description=description))
 
-        tree.write(self.xml_results)
+        self.results.export_xml()
 
     def get_descriptions(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
-        descriptions = {}
-
-        for tc_xml in root.findall("./test_case"):
-            descriptions[tc_xml.attrib["name"]] = tc_xml.attrib["description"]
-
-        return descriptions
+        return {record["name"]: record["description"] for record in self.results.records}
 
     def get_wid_usage(self):
         extract_wid_testcases_to_csv()
 
     def get_results(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
         results = {}
-        for tc_xml in root.findall("./test_case"):
-            status = tc_xml.attrib["status"]
-            run_count = tc_xml.attrib["run_count"]
-            start_time = tc_xml.attrib.get("test_start_time")
-            end_time = tc_xml.attrib.get("test_end_time")
-            duration = tc_xml.attrib.get("duration")
+        for record in self.results.records:
+            status = record["status"]
+            run_count = record["run_count"]
+            start_time = record.get("test_start_time")
+            end_time = record.get("test_end_time")
+            duration = record.get("duration")
 
             patterns = ["UNKNOWN VERDICT"]
             if self.fail_info_cb:
@@ -739,14 +877,14 @@ class TestCaseRunStats:
                     break
 
             if self.fail_info_cb:
-                assertion_line = self.fail_info_cb(tc_xml.attrib["name"])
+                assertion_line = self.fail_info_cb(record["name"])
                 if assertion_line:
                     if additional_info:
                         additional_info += " | " + assertion_line
                     else:
                         additional_info = assertion_line
 
-            results[tc_xml.attrib["name"]] = {
+            results[record["name"]] = {
                 "status": status,
                 "run_count": run_count,
                 "test_start_time": start_time,
@@ -759,37 +897,22 @@ class TestCaseRunStats:
         return results
 
     def get_regressions(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@regression='True']")
-
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+        return [record["name"] for record in self.results.records if record["regression"] == 'True']
 
     def get_progresses(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@progress='True']")
-
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+        return [record["name"] for record in self.results.records if record["progress"] == 'True']
 
     def get_new_cases(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@new='1']")
-
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+        return [record["name"] for record in self.results.records if record["new"] == '1']
 
     def get_status_count(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
         status_dict = {}
 
-        for test_case_xml in root.findall("./test_case"):
-            if test_case_xml.attrib["status"] not in status_dict:
-                status_dict[test_case_xml.attrib["status"]] = 0
+        for record in self.results.records:
+            if record["status"] not in status_dict:
+                status_dict[record["status"]] = 0
 
-            status_dict[test_case_xml.attrib["status"]] += 1
+            status_dict[record["status"]] += 1
 
         return status_dict
 
@@ -845,7 +968,7 @@ def get_formatted_summary(status_count, num_test_cases, regressions_count, progr
 
 
 def run_test_case_wrapper(func):
-    def wrapper(*args):
+    def wrapper(*args, **kwargs):
         test_case_name = args[2]
         stats = args[3]
 
@@ -867,7 +990,7 @@ def run_test_case_wrapper(func):
 
         start_dt_test = datetime.datetime.now()
         start_time = time.time()
-        status = func(*args)
+        status = func(*args, **kwargs)
         duration = time.time() - start_time
         end_dt_test = datetime.datetime.now()
 
@@ -945,30 +1068,33 @@ def get_error_code(exc):
 
 
 def synchronize_instances(state, break_state=None, end_flag=None):
-    """Synchronize instances to be in one state before executing further"""
-    match = ResultWithFlag()
+    """Synchronize instances to be in one state before executing further
 
-    def wait_for():
+    Woken up by test case state changes, see TEST_CASE_STATE_COND. The
+    end_flag has to share that condition to end the wait immediately.
+    """
+
+    def check_sync():
+        # Returns a 1-tuple, so the wait ends also if not in sync
         if get_global_end():
-            return False
+            return (False,)
 
         for tc in RUNNING_TEST_CASE.values():
             if tc.state != state:
                 if break_state and tc.state in break_state:
                     log(f'SynchError: {tc.name} in an invalid state {tc.state} ')
-                    return False
+                    return (False,)
 
                 if end_flag and end_flag.is_set():
                     log(f'SynchError: timeout: {tc.name} in an invalid state {tc.state} ')
-                    return False
+                    return (False,)
 
-                return True
+                return None
 
         # Instances are in sync
-        match.set(True)
-        return False
+        return (True,)
 
-    return match.get(predicate=wait_for)
+    return TEST_CASE_STATE_COND.wait_for(check_sync)[0]
 
 
 class LTThread(InterruptableThread):
@@ -1048,6 +1174,7 @@ class LTThread(InterruptableThread):
 
         try:
             pts.callback._callbacks['run_test_case'] = self.set_test_case_result
+            test_case.on_step_queued = lambda: pts.callback.notify('run_test_case')
             RUNNING_TEST_CASE[test_case.name] = test_case
             test_case.state = "PRE_RUN"
             test_case.pre_run()
@@ -1086,6 +1213,7 @@ class LTThread(InterruptableThread):
                         continue
 
                     pts.set_wid_response(response)
+                    test_case.wid_response_sent()
 
             except BaseException as test_case_error:
                 try:
@@ -1134,6 +1262,8 @@ class LTThread(InterruptableThread):
 
         finally:
             test_case.state = "FINISHED"
+            test_case.on_step_queued = None
+            test_case.log_wid_turnarounds()
 
             if test_case.status != "PASS":
                 finish_count.set_flag()
@@ -1152,9 +1282,13 @@ class LTThread(InterruptableThread):
             self.cancel_sync_points()
 
 
-@run_test_case_wrapper
-def run_test_case(ptses, test_case_instances, test_case_name, stats,
-                  session_log_dir, exceptions, timeout):
+def prepare_test_case_lts(ptses, test_case_instances, test_case_name, session_log_dir):
+    """Looks up and resets the LT instances of a test case and creates its
+    logs directory
+
+    Returns a tuple of the list of instances and None, or of None and the
+    status if the test case cannot be run.
+    """
     def test_case_lookup_name(name, test_case_class):
         """Return 'test_case_class' instance if found or None otherwise"""
         if test_case_instances is None:
@@ -1166,12 +1300,6 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
 
         return None
 
-    logger = logging.getLogger()
-
-    format_template = ("%(asctime)s %(threadName)s %(name)s %(levelname)s %(filename)-25s "
-                       "%(lineno)-5s %(funcName)-25s : %(message)s")
-    formatter = logging.Formatter(format_template)
-
     # Lookup TestCase class instances
     test_case_lts = []
     tc_name = test_case_name
@@ -1180,7 +1308,7 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
         test_case_lt = test_case_lookup_name(tc_name, tc_class)
         if test_case_lt is None:
             log(f'The {tc_name} test case enabled in workspace, but the profile not implemented!')
-            return 'NOT_IMPLEMENTED'
+            return None, 'NOT_IMPLEMENTED'
 
         test_case_lt.reset()
         test_case_lts.append(test_case_lt)
@@ -1192,21 +1320,53 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
         if len(ptses) < i:
             log(f'Not enough PTS instances configured. At least {i}'
                 f'instances are required for this test case!')
-            return f'LT{i}_NOT_AVAILABLE'
+            return None, f'LT{i}_NOT_AVAILABLE'
 
     iut = get_iut()
     if test_case_lts[0].iut_count > 1 and (not hasattr(iut, 'get_iut_map') or
             len(iut.get_iut_map().keys()) < test_case_lts[0].iut_count):
         log('Not enough IUT instances configured.')
-        return 'IUT2_NOT_AVAILABLE'
+        return None, 'IUT2_NOT_AVAILABLE'
 
     test_case_lts[0].initialize_logging(session_log_dir)
+
+    return test_case_lts, None
+
+
+@run_test_case_wrapper
+def run_test_case(ptses, test_case_instances, test_case_name, stats,
+                  session_log_dir, exceptions, timeout, prepared_lts=None,
+                  on_cleanup_done=None):
+    """Runs a test case on its LT instances
+
+    prepared_lts -- LT instances already prepared by TestCasePipeline
+
+    on_cleanup_done -- called with the LT instances once the clean-up of
+                       the test case has stopped the IUT
+    """
+    logger = logging.getLogger()
+
+    format_template = ("%(asctime)s %(threadName)s %(name)s %(levelname)s %(filename)-25s "
+                       "%(lineno)-5s %(funcName)-25s : %(message)s")
+    formatter = logging.Formatter(format_template)
+
+    test_case_lts = prepared_lts
+    if test_case_lts is None:
+        test_case_lts, status = prepare_test_case_lts(ptses, test_case_instances,
+                                                      test_case_name, session_log_dir)
+        if test_case_lts is None:
+            return status
+
+    if on_cleanup_done:
+        test_case_lts[0].on_cleanup_done = partial(on_cleanup_done, test_case_lts)
+
     file_handler = logging.FileHandler(test_case_lts[0].log_filename, encoding='utf-8')
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
 
-    # Multi-instance related stuff
-    finish_count = CounterWithFlag(init_count=0)
+    # Multi-instance related stuff. Shares the condition with the test case
+    # states, so synchronize_instances() is woken up when it is set.
+    finish_count = CounterWithFlag(init_count=0, cond=TEST_CASE_STATE_COND)
     thread_count = 0
     thread_list = []
 
@@ -1250,6 +1410,8 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
         if superguard_timeout:
             test_case_lts[0].status = 'SUPERGUARD TIMEOUT'
 
+        test_case_lts[0].on_cleanup_done = None
+
     logger.removeHandler(file_handler)
 
     for test_case_lt in test_case_lts:
@@ -1308,6 +1470,29 @@ def get_test_cases(pts, test_cases, excluded):
     return _test_cases
 
 
+def plan_test_case_order(test_cases, test_case_instances, db=None):
+    """Order the test cases by their preconditions, see test_order.py
+
+    Returns the ordered test cases and the simulation report of the order.
+    """
+    signatures = get_signatures(test_cases, test_case_instances)
+
+    durations = {}
+    if db:
+        durations = {name: tc_stats.mean for name, tc_stats in db.get_statistics(test_cases).items()}
+
+    plan = order_test_cases(test_cases, signatures, durations)
+
+    return plan, simulate_order(test_cases, plan, signatures)
+
+
+def print_order_simulation(report):
+    components = ', '.join(f'{name}: {count}' for name, count in report['planned_components'].items())
+    print(f"Test case order: {report['test_cases']} test cases in {report['groups']} precondition groups, "
+          f"{report['transitions']} -> {report['planned_transitions']} transitions ({components}), "
+          f"estimated {report['time_saved']:.0f} s saved")
+
+
 def normalize_bd_addr(address):
     if address is None:
         return None
@@ -1375,6 +1560,96 @@ def print_pts_instances(ptses):
         logger.info("  LT%s: %s  BD_ADDR=%s", idx + 1, info, addr)
 
 
+class TestCasePipeline:
+    """Prepares the next test case while the previous one finishes
+
+    Enabled with --pipeline. Once the clean-up of a passed test case has
+    stopped the IUT, the next test case is prepared in a thread, while PTS
+    finalizes the verdict and logs and the device settles down:
+    - the PIXITs are set, if they are set per test case,
+    - the LT instances are looked up and reset and the logs directory is
+      created, see prepare_test_case_lts,
+    - in the native and QEMU IUT modes, the IUT is started with
+      TestCase.prestart.
+
+    The next test case is prepared only if it runs with the IUT map and
+    the PTSes of the previous one, see same_test_case_selection. The
+    preparation is rolled back if another test case runs next, e.g. a
+    retry, or with other PTSes, and before a recovery.
+    """
+
+    PRESTART_IUT_MODES = ('native', 'qemu')
+
+    def __init__(self, session_log_dir, set_pixits=None):
+        self.session_log_dir = session_log_dir
+        self.set_pixits = set_pixits
+        self._thread = None
+        # (test_case_name, ptses, test_case_instances, test_case_lts)
+        self._prepared = None
+
+    def prepare(self, test_case_name, ptses, test_case_instances):
+        self.rollback()
+
+        self._thread = threading.Thread(target=self._prepare, name='TestCasePipeline', daemon=True,
+                                        args=(test_case_name, ptses, test_case_instances))
+        self._thread.start()
+
+    def _prepare(self, test_case_name, ptses, test_case_instances):
+        log(f"Preparing {test_case_name}")
+
+        try:
+            if self.set_pixits:
+                self.set_pixits(ptses)
+
+            test_case_lts, _ = prepare_test_case_lts(ptses, test_case_instances,
+                                                     test_case_name, self.session_log_dir)
+            if test_case_lts is None:
+                return
+
+            self._prepared = (test_case_name, ptses, test_case_instances, test_case_lts)
+
+            if getattr(get_iut(), 'iut_mode', None) in self.PRESTART_IUT_MODES:
+                test_case_lts[0].prestart()
+
+        except Exception as e:
+            # The test case starts its IUT in pre_run and reports the error
+            logging.exception(e)
+
+    def _join(self):
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def take(self, test_case_name, ptses, test_case_instances):
+        """Returns the prepared LT instances of the test case or None"""
+        self._join()
+
+        prepared = self._prepared
+        if prepared and prepared[0] == test_case_name and prepared[2] is test_case_instances and \
+                len(prepared[1]) == len(ptses) and \
+                all(pts is prepared_pts for pts, prepared_pts in zip(ptses, prepared[1], strict=True)):
+            self._prepared = None
+            return prepared[3]
+
+        self.rollback()
+        return None
+
+    def rollback(self):
+        self._join()
+
+        if self._prepared is None:
+            return
+
+        test_case_name, _, _, test_case_lts = self._prepared
+        self._prepared = None
+        log(f"Rolling back the preparation of {test_case_name}")
+
+        try:
+            test_case_lts[0].rollback_prestart()
+        except Exception as e:
+            logging.exception(e)
+
+
 def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
     """Runs a list of test cases"""
     session_log_dir = stats.session_log_dir
@@ -1391,64 +1666,159 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
             if e.errno != errno.EEXIST:
                 raise
 
-    test_cases = args.test_cases
-    retry_config = getattr(args, 'retry_config', None)
-    repeat_until_failed = getattr(args, 'repeat_until_fail', False)
+    # An iterator of test cases when the test cases are shared with other rigs
+    test_case_source = kwargs.get('test_case_source', None)
+    test_cases = args.test_cases if test_case_source is None else test_case_source
     pre_test_case_fn = kwargs.get('pre_test_case_fn', None)
+    configure_settle(getattr(args, 'settle_time', SETTLE_TIME))
     exceptions = queue.Queue()
 
+    # The next test case is known only with a list of test cases
+    pipeline = None
+    if getattr(args, 'pipeline', False) and test_case_source is None:
+        set_pixits = None
+        if pre_test_case_fn:
+            # Set per test case by pre_test_case_fn
+            set_pixits = kwargs.get('setup_project_pixits', setup_project_pixits)
+
+        pipeline = TestCasePipeline(session_log_dir, set_pixits)
+
     approx = ''
     if stats.est_duration:
         approx = " in approximately: " + str(datetime.timedelta(seconds=stats.est_duration))
     print(f"Number of test cases to run: {stats.num_test_cases}{approx}")
 
-    for test_case in test_cases:
-        stats.run_count = 0
-        test_retry_count = None
+    try:
+        _run_test_cases(ptses, test_case_instances, args, stats, test_cases, exceptions,
+                        pipeline, session_log_dir, **kwargs)
+    finally:
+        if pipeline:
+            pipeline.rollback()
 
-        if retry_config is not None:
-            if test_case in retry_config:
-                test_retry_count = retry_config[test_case]
+    if test_case_source is None:
+        stats.print_summary()
+        stats.export_xml()
 
-        while True:
-            selected_ptses = ptses
-            selected_test_case_instances = test_case_instances
-            if pre_test_case_fn:
-                prepared = pre_test_case_fn(test_case=test_case, stats=stats, **kwargs)
-
-                if isinstance(prepared, dict):
-                    selected_ptses = prepared.get('ptses') or ptses
-                    selected_test_case_instances = prepared.get('test_cases') or test_case_instances
-                else:
-                    selected_ptses = prepared or ptses
+    return stats
+
+
+def _run_test_case_attempt(ptses, test_case_instances, args, stats, test_case, next_test_case,
+                           exceptions, pipeline, session_log_dir, deferred_retry=False, **kwargs):
+    """Runs a test case once
 
-            pts_mapping = ", ".join(
-                f"LT{idx + 1}={getattr(pts, 'info', f'pts[{idx}]')} [{pts.bd_addr()}]"
-                for idx, pts in enumerate(selected_ptses))
+    Returns the status, the duration and True if a recovery is needed.
+    """
+    pre_test_case_fn = kwargs.get('pre_test_case_fn', None)
 
-            logging.getLogger(__name__).info("Running %s on %s", test_case, pts_mapping)
+    selected_ptses = ptses
+    selected_test_case_instances = test_case_instances
+    if pre_test_case_fn:
+        if deferred_retry:
+            kwargs['deferred_retry'] = True
 
-            status, duration = run_test_case(selected_ptses, selected_test_case_instances,
-                                             test_case, stats, session_log_dir,
-                                             exceptions, args.superguard)
+        prepared = pre_test_case_fn(test_case=test_case, stats=stats, **kwargs)
 
-            raise_on_global_end()
+        if isinstance(prepared, dict):
+            selected_ptses = prepared.get('ptses') or ptses
+            selected_test_case_instances = prepared.get('test_cases') or test_case_instances
+        else:
+            selected_ptses = prepared or ptses
 
-            num_exceptions = exceptions.qsize()
-            if num_exceptions:
-                exception_messages = [str(exceptions.get_nowait()) for _ in range(num_exceptions)]
-                exeption_msg = "\n".join(exception_messages) + "\n"
-            else:
-                exeption_msg = ""
-            log(f'exception_msg: {exeption_msg}')
+    pts_mapping = ", ".join(
+        f"LT{idx + 1}={getattr(pts, 'info', f'pts[{idx}]')} [{pts.bd_addr()}]"
+        for idx, pts in enumerate(selected_ptses))
 
-            if args.recovery and (exeption_msg != '' or status not in args.not_recover):
-                run_recovery(args, ptses)
+    logging.getLogger(__name__).info("Running %s on %s", test_case, pts_mapping)
 
-            if test_retry_count is not None:
-                retry_limit = test_retry_count
-            else:
-                retry_limit = args.retry
+    superguard = args.superguard
+    if args.superguard_stats and stats.db:
+        superguard = stats.db.get_superguard_timeout(test_case, args.superguard)
+
+    prepared_lts = None
+    on_cleanup_done = None
+    if pipeline:
+        prepared_lts = pipeline.take(test_case, selected_ptses, selected_test_case_instances)
+
+        if next_test_case and same_test_case_selection(test_case, next_test_case, **kwargs):
+            def on_cleanup_done(test_case_lts, next_test_case=next_test_case, ptses=selected_ptses,
+                                test_case_instances=selected_test_case_instances):
+                if all(test_case_lt.status == 'PASS' for test_case_lt in test_case_lts):
+                    pipeline.prepare(next_test_case, ptses, test_case_instances)
+
+    status, duration = run_test_case(selected_ptses, selected_test_case_instances,
+                                     test_case, stats, session_log_dir,
+                                     exceptions, superguard,
+                                     prepared_lts=prepared_lts,
+                                     on_cleanup_done=on_cleanup_done)
+
+    raise_on_global_end()
+
+    num_exceptions = exceptions.qsize()
+    if num_exceptions:
+        exception_messages = [str(exceptions.get_nowait()) for _ in range(num_exceptions)]
+        exeption_msg = "\n".join(exception_messages) + "\n"
+    else:
+        exeption_msg = ""
+    log(f'exception_msg: {exeption_msg}')
+
+    recover = args.recovery and (exeption_msg != '' or status not in args.not_recover)
+
+    return status, duration, recover
+
+
+def same_test_case_selection(test_case, next_test_case, **kwargs):
+    """Returns True if both test cases run with the same IUT map and PTSes
+
+    With pre_test_case_fn, the selection of a test case is known only
+    from test_case_selection_fn, which is called with the kwargs of
+    run_test_cases and returns e.g. the IUT map and the PTS addresses.
+    """
+    if not kwargs.get('pre_test_case_fn'):
+        return True
+
+    selection_fn = kwargs.get('test_case_selection_fn')
+    if selection_fn is None:
+        return False
+
+    return selection_fn(test_case=test_case, **kwargs) == selection_fn(test_case=next_test_case, **kwargs)
+
+
+def get_retry_limit(args, test_case):
+    retry_config = getattr(args, 'retry_config', None)
+    if retry_config is not None and test_case in retry_config:
+        return retry_config[test_case]
+
+    return args.retry
+
+
+def _run_test_cases(ptses, test_case_instances, args, stats, test_cases, exceptions,
+                    pipeline, session_log_dir, **kwargs):
+    """Runs the test cases of run_test_cases and their retries"""
+    repeat_until_failed = getattr(args, 'repeat_until_fail', False)
+
+    if getattr(args, 'deferred_retry', False) and not repeat_until_failed and not args.stress_test:
+        _run_deferred_test_cases(ptses, test_case_instances, args, stats, test_cases, exceptions,
+                                 pipeline, session_log_dir, **kwargs)
+        return
+
+    for index, test_case in enumerate(test_cases):
+        stats.run_count = 0
+        next_test_case = None
+        if pipeline and index + 1 < len(test_cases):
+            next_test_case = test_cases[index + 1]
+
+        retry_limit = get_retry_limit(args, test_case)
+
+        while True:
+            status, duration, recover = _run_test_case_attempt(
+                ptses, test_case_instances, args, stats, test_case, next_test_case,
+                exceptions, pipeline, session_log_dir, **kwargs)
+
+            if recover:
+                if pipeline:
+                    pipeline.rollback()
+
+                run_recovery(args, ptses)
 
             if repeat_until_failed and status == 'PASS':
                 continue
@@ -1470,7 +1840,154 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
 
         stats.index += 1
 
+
+def _run_deferred_test_cases(ptses, test_case_instances, args, stats, test_cases, exceptions,
+                             pipeline, session_log_dir, **kwargs):
+    """Runs the test cases with the retries deferred by a RetryScheduler
+
+    The recoveries needed after a test case are run once, before the next
+    test case, so during the backoff of a retry.
+    """
+    scheduler = RetryScheduler(test_cases, getattr(args, 'retry_slot', 0),
+                               getattr(args, 'retry_backoff', 0))
+    # The progress index of the first run of each test case, counted here or
+    # set by the source, see iter_shard_test_cases. The test cases are pulled
+    # from the source lazily, peek() is used only with the pipeline, so never
+    # on a shared source.
+    indexes = {}
+    next_index = stats.index
+    statuses = {}
+    recover = False
+
+    while True:
+        stats.index = next_index
+        test_case, delay = scheduler.pop()
+        if test_case is None:
+            break
+
+        if test_case not in indexes:
+            indexes[test_case] = stats.index
+            next_index = stats.index + 1
+
+        if recover:
+            if pipeline:
+                pipeline.rollback()
+
+            start = time.monotonic()
+            run_recovery(args, ptses)
+            recover = False
+            delay -= time.monotonic() - start
+
+        if delay > 0:
+            log(f'Waiting {delay:.1f} s before the retry of {test_case}')
+            scheduler.wait(delay)
+
+        # The progress of the retries is printed with the first run
+        stats.index = indexes[test_case]
+        stats.run_count = scheduler.attempts[test_case] - 1
+        retry_limit = get_retry_limit(args, test_case)
+
+        status, duration, attempt_recover = _run_test_case_attempt(
+            ptses, test_case_instances, args, stats, test_case,
+            scheduler.peek() if pipeline else None, exceptions, pipeline, session_log_dir,
+            deferred_retry=stats.run_count > 0, **kwargs)
+
+        recover = recover or attempt_recover
+        previous_status = statuses.get(test_case)
+        statuses[test_case] = status
+
+        if status in ('PASS', 'MISSING WID ERROR') or stats.run_count == retry_limit or \
+                (args.no_retry_on_regression and test_case not in stats.get_regressions()) or \
+                (not attempt_recover and is_deterministic_failure(status, previous_status, args.not_recover)):
+            if stats.db:
+                stats.db.update_statistics(test_case, duration, status)
+
+            continue
+
+        scheduler.defer(test_case)
+
+    if recover:
+        if pipeline:
+            pipeline.rollback()
+
+        run_recovery(args, ptses)
+
+    stats.index = next_index
+
+
+def run_sharded_test_cases(ptses, test_case_instances, args, stats, **kwargs):
+    """Runs a list of test cases on this rig and the rig groups of args.rig_groups
+
+    Each rig group runs in a shard worker client process, see sharding.py.
+    Results of the workers are merged into stats.
+    """
+    projects = kwargs.pop('projects', [])
+    file_paths = kwargs["file_paths"]
+    test_cases = args.test_cases
+    rig_groups = load_rig_groups(args.rig_groups)
+    num_shards = len(rig_groups) + 1
+
+    mean_durations = {}
+    if stats.db:
+        mean_durations = {name: tc_stats.mean
+                          for name, tc_stats in stats.db.get_statistics(test_cases).items()}
+
+    scheduler = ShardScheduler(test_cases, estimate_durations(test_cases, mean_durations), num_shards)
+
+    shard_dirs = {shard_id: os.path.join(file_paths['TMP_DIR'], f'shard_{shard_id}')
+                  for shard_id in range(1, num_shards)}
+
+    def hello(shard_id):
+        return {
+            'file_paths': {
+                'TMP_DIR': shard_dirs[shard_id],
+                # Shared, the database is safe for concurrent writers
+                'TEST_CASE_DB_FILE': file_paths['TEST_CASE_DB_FILE'],
+            },
+            'projects': list(projects),
+            'test_cases': list(test_cases),
+        }
+
+    coordinator = ShardCoordinator(scheduler, hello)
+    workers = []
+
+    try:
+        for shard_id, argv in enumerate(rig_groups, 1):
+            shutil.rmtree(shard_dirs[shard_id], ignore_errors=True)
+            cmd = [sys.executable, sys.argv[0], *argv,
+                   '--shard_worker', coordinator.address, '--shard_id', str(shard_id)]
+            log(f'Starting shard {shard_id}: {cmd}')
+            workers.append(subprocess.Popen(cmd, env=coordinator.worker_env()))
+
+        run_test_cases(ptses, test_case_instances, args, stats,
+                       test_case_source=iter_shard_test_cases(
+                           lambda: scheduler.next_test_case(0), stats),
+                       **kwargs)
+
+        while any(worker.poll() is None for worker in workers):
+            raise_on_global_end()
+            time.sleep(1)
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+                worker.wait()
+
+        coordinator.close()
+
+    results_file_name = os.path.basename(file_paths['TC_STATS_RESULTS_XML_FILE'])
+    for shard_id, shard_dir in shard_dirs.items():
+        xml_file = os.path.join(shard_dir, results_file_name)
+        if not os.path.exists(get_journal_path(xml_file)):
+            logging.error(f'No results of shard {shard_id}')
+            continue
+
+        stats.results.extend(ResultsStore(xml_file).records)
+
+    log(f'Test cases stolen between shards: {scheduler.stolen}')
+
     stats.print_summary()
+    stats.export_xml()
 
     return stats
 
@@ -1503,6 +2020,8 @@ class Client:
         self.arg_parser = parser_class(board_names=self.boards)
         self.prev_sigint_handler = None
         self.test_case_database = None
+        # Connection to the main client if running as a shard worker
+        self.shard_worker = None
 
     def parse_config_and_args(self, args_namespace=None):
         if args_namespace is None:
@@ -1570,6 +2089,10 @@ class Client:
         if not self.args.sudo and have_admin_rights():
             sys.exit("root privileges detected. Use --sudo to skip this check.")
 
+        if self.args.shard_worker:
+            self.shard_worker = ShardWorker(self.args.shard_worker, self.args.shard_id)
+            generate_file_paths(self.shard_worker.hello['file_paths'])
+
         os.makedirs(self.file_paths["TMP_DIR"], exist_ok=True)
 
         self.load_test_case_database()
@@ -1603,7 +2126,7 @@ class Client:
 
         self.cleanup()
 
-        if self.args.store:
+        if self.args.store and not self.shard_worker:
             os.makedirs(os.path.dirname(self.args.database_file), exist_ok=True)
             shutil.move(self.file_paths['TEST_CASE_DB_FILE'], self.args.database_file)
 
@@ -1621,15 +2144,28 @@ class Client:
     def setup_test_cases(self, ptses):
         self.test_cases = setup_test_cases(ptses)
 
+    def get_iut_map(self, test_case):
+        iut_map = self.args.iut_target_selection['default_iut_map']
+        for iut_rule in self.args.iut_target_selection.get('rules', []):
+            if test_case in iut_rule.get('test_cases', []) and 'iut_map' in iut_rule:
+                iut_map = iut_rule['iut_map']
+
+        return iut_map
+
+    def get_test_case_selection(self, test_case, pts_addr_rules=None, **_kwargs):
+        """Returns the IUT map and the PTS addresses pre_test_case_fn selects"""
+        iut_map = None
+        if hasattr(get_iut(), 'select_iut'):
+            iut_map = sorted((str(iut_id), name) for iut_id, name in self.get_iut_map(test_case).items())
+
+        ptses = reorder_ptses_by_addr(self.ptses, test_case, pts_addr_rules)
+
+        return iut_map, [normalize_bd_addr(pts.bd_addr()) for pts in ptses]
+
     def pre_test_case_fn(self, test_case, pts_addr_rules=None, runtime_test_case_cache=None, **_kwargs):
         iutctl = get_iut()
         if hasattr(iutctl, 'select_iut'):
-            iut_map = self.args.iut_target_selection['default_iut_map']
-            for iut_rule in self.args.iut_target_selection.get('rules', []):
-                if test_case in iut_rule.get('test_cases', []) and 'iut_map' in iut_rule:
-                    iut_map = iut_rule['iut_map']
-
-            iutctl.set_iut_map(iut_map)
+            iutctl.set_iut_map(self.get_iut_map(test_case))
             iutctl.select_iut(0)
 
         if pts_addr_rules:
@@ -1657,19 +2193,63 @@ class Client:
         build-flash-run routines, so multiple reinitialization could
         be skipped. See BotClient class in bot/common.py.
         """
+        if self.shard_worker:
+            return self.run_shard_test_cases()
+
         self.args.test_cases = get_test_cases(self.ptses[0],
                                               self.args.test_cases,
                                               self.args.excluded)
 
+        if self.args.order_test_cases or self.args.simulate_order:
+            plan, report = plan_test_case_order(self.args.test_cases, self.test_cases,
+                                                self.test_case_database)
+            print_order_simulation(report)
+
+            if self.args.simulate_order:
+                # Nothing is run
+                return None
+
+            self.args.test_cases = plan
+
         projects = self.ptses[0].get_project_list()
 
-        if os.path.exists(self.file_paths['TC_STATS_RESULTS_XML_FILE']):
-            os.remove(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+        remove_results_files(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
 
         stats = TestCaseRunStats(projects, self.args.test_cases,
                                  self.args.retry, self.test_case_database,
                                  xml_results_file=self.file_paths['TC_STATS_RESULTS_XML_FILE'])
 
+        if self.args.rig_groups:
+            return run_sharded_test_cases(self.ptses, self.test_cases, self.args, stats,
+                                          projects=projects, **self.get_run_test_cases_kwargs())
+
+        return run_test_cases(self.ptses, self.test_cases, self.args, stats,
+                              **self.get_run_test_cases_kwargs())
+
+    def run_shard_test_cases(self):
+        """Runs test cases received from the main client, in shard worker mode"""
+        hello = self.shard_worker.hello
+        self.args.test_cases = hello['test_cases']
+
+        remove_results_files(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+
+        stats = TestCaseRunStats(hello['projects'], self.args.test_cases,
+                                 self.args.retry, self.test_case_database,
+                                 xml_results_file=self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+
+        try:
+            run_test_cases(self.ptses, self.test_cases, self.args, stats,
+                           test_case_source=iter_shard_test_cases(
+                               self.shard_worker.next_test_case, stats),
+                           **self.get_run_test_cases_kwargs())
+        finally:
+            self.shard_worker.close()
+
+        stats.export_xml()
+
+        return stats
+
+    def get_run_test_cases_kwargs(self):
         pts_addr_rules = parse_test_case_pts_addr_map(
                 getattr(self.args, "pts_addr_map", None))
 
@@ -1679,12 +2259,14 @@ class Client:
         if pts_addr_rules or 'rules' in self.args.iut_target_selection:
             pre_test_case_fn = self.pre_test_case_fn
 
-        return run_test_cases(self.ptses, self.test_cases, self.args, stats,
-                              file_paths=copy.deepcopy(self.file_paths),
-                              pre_test_case_fn=pre_test_case_fn,
-                              pts_addr_rules=pts_addr_rules,
-                              runtime_test_case_cache=runtime_test_case_cache,
-                              )
+        return {
+            'file_paths': copy.deepcopy(self.file_paths),
+            'pre_test_case_fn': pre_test_case_fn,
+            'test_case_selection_fn': self.get_test_case_selection,
+            'setup_project_pixits': self.setup_project_pixits,
+            'pts_addr_rules': pts_addr_rules,
+            'runtime_test_case_cache': runtime_test_case_cache,
+        }
 
     def cleanup(self):
         log(f'{self.__class__.__name__}.{self.cleanup.__name__}')
@@ -1747,53 +2329,134 @@ def recover_at_exception(func):
     return _recover_at_exception
 
 
-@recover_at_exception
-def run_recovery(args, ptses):
-    log('Running recovery')
+class ConcurrentRecovery:
+    """Recovery tasks of the PTS instances and IUTs run in parallel
 
-    iut = get_iut()
-    for iut_id in args.iut_map.keys():
-        if hasattr(iut, 'select_iut'):
-            iut.select_iut(iut_id)
-        iut.stop()
+    Each round runs the pending tasks in their own threads until a shared
+    deadline. A task that failed or did not finish in time is reported and
+    only it is run again in the next round. A task whose thread is still
+    running, e.g. stuck in the stop of an IUT, is waited for instead of
+    being started twice.
+    """
 
-        if args.usb_replug_available:
-            iut.btattach_stop()
-            replug_usb(args, iut)
-            iut.btattach_start()
+    def __init__(self):
+        self.cond = WaitCondition()
+        self.tasks = {}
+        self.results = {}
+        self.deadline = None
+        self._threads = {}
+
+    def add(self, name, target, *args):
+        self.tasks[name] = (target, args)
+
+    def _run(self, name, target, args):
+        error = None
+        try:
+            target(*args)
+        except BaseException as e:
+            error = e
+
+        with self.cond:
+            self.results[name] = error
+            self.cond.notify()
+
+    def run_round(self, names, timeout):
+        """Run the tasks for up to timeout seconds and return the failed ones
+
+        Returns a dict of the names of the failed tasks and their errors,
+        TimeoutError for the tasks that did not finish in time.
+        """
+        self.deadline = time.monotonic() + timeout
 
+        for name in names:
+            thread = self._threads.get(name)
+            if thread and thread.is_alive():
+                continue
+
+            with self.cond:
+                self.results.pop(name, None)
+
+            target, args = self.tasks[name]
+            thread = threading.Thread(target=self._run, args=(name, target, args),
+                                      name=f'Recovery {name}', daemon=True)
+            self._threads[name] = thread
+            thread.start()
+
+        try:
+            # The tasks end at the deadline themselves, unless stuck
+            self.cond.wait_for(lambda: all(name in self.results for name in names),
+                               timeout=timeout + 1)
+        except TimeoutError:
+            pass
+
+        failed = {}
+        with self.cond:
+            for name in names:
+                if name not in self.results:
+                    failed[name] = TimeoutError(f'{name} is stuck')
+                elif self.results[name] is not None:
+                    failed[name] = self.results[name]
+
+        return failed
+
+
+def _recover_iut(args, iut_id, replug_lock):
+    iut = get_iut()
     if hasattr(iut, 'select_iut'):
-        iut.select_iut(0)
+        # The selection is per thread
+        iut.select_iut(iut_id)
+    iut.stop()
+
+    if args.usb_replug_available:
+        iut.btattach_stop()
+        # The IUTs are replugged one at a time, e.g. through the same hub
+        with replug_lock:
+            replug_usb(args, iut)
+        iut.btattach_start()
 
-    for pts in ptses:
-        req_sent = False
-        last_restart_time = None
 
-        while not get_global_end():
-            try:
-                if not last_restart_time:
-                    last_restart_time = pts.get_last_recovery_time()
-                    log(f'Last restart time of PTS {pts}: {last_restart_time}')
-
-                if not req_sent:
-                    log(f'Recovering PTS {pts} ...')
-                    pts.recover_pts()
-                    req_sent = True
-                    err = pts.callback.get_result('recover_pts', timeout=args.max_server_restart_time)
-                    if err:
-                        log('PTS recovered')
-                        break
+def _recover_pts(pts, recovery):
+    log(f'Recovering PTS {pts} ...')
+    # PTS could have lost the PIXITs if autoptsserver restarted
+    pts.pixit_mirror = {}
+    # Drop a late result of a previous request
+    pts.callback._results['recover_pts'].clear()
+    pts.recover_pts()
 
-                if last_restart_time < pts.get_last_recovery_time():
-                    log('PTS recovered')
-                    break
+    # Set by the recover_pts callback of autoptsserver
+    result = pts.callback.get_result('recover_pts',
+                                     timeout=max(recovery.deadline - time.monotonic(), 0.001))
+    if not result:
+        raise Exception(f'PTS {pts} recovery failed: {result}')
 
-            except BaseException as e:
-                log(e)
+    log(f'PTS {pts} recovered')
+
+
+@recover_at_exception
+def run_recovery(args, ptses):
+    log('Running recovery')
+
+    recovery = ConcurrentRecovery()
+    replug_lock = threading.Lock()
+
+    for iut_id in args.iut_map.keys():
+        recovery.add(f'IUT {iut_id}', _recover_iut, args, iut_id, replug_lock)
 
-            log('Server is still resetting. Wait a little more.')
+    for i, pts in enumerate(ptses):
+        recovery.add(f'PTS {i}', _recover_pts, pts, recovery)
+
+    pending = list(recovery.tasks)
+    while pending and not get_global_end():
+        failed = recovery.run_round(pending, args.max_server_restart_time)
+
+        for name, error in failed.items():
+            log(f'{name} recovery failed: {error!r}, retrying')
+
+        pending = list(failed)
+        if pending:
             time.sleep(1)
 
+    iut = get_iut()
     for iut_id in args.iut_map.keys():
         if hasattr(iut, 'select_iut'):
             iut.select_iut(iut_id)
@@ -1843,11 +2506,75 @@ def _get_profiles(ptses):
     return profiles
 
 
+class PixitRecorder:
+    """PTS proxy stand-in collecting the set_pixit calls
+
+    Other attributes are the ones of the PTS proxy.
+    """
+
+    def __init__(self, pts):
+        self.pts = pts
+        self.pixits = {}
+
+    def set_pixit(self, project_name, param_name, param_value):
+        self.pixits.setdefault(project_name, {})[param_name] = param_value
+
+    def __getattr__(self, name):
+        return getattr(self.pts, name)
+
+
+def update_pixit_mirror(pts, project_name, pixits):
+    pts.pixit_mirror.setdefault(project_name, {}).update(pixits)
+
+
+def pts_multicall(pts, calls):
+    """Call methods of a PTS in a single request if the proxy supports it
+
+    calls -- iterable of (method_name, args)
+    """
+    if isinstance(pts, PtsServerProxy):
+        return pts.multicall(calls)
+
+    return [getattr(pts, method_name)(*args) for method_name, args in calls]
+
+
+def apply_pixits(pts, pixits):
+    """Set the PIXITs that differ from pts.pixit_mirror in a single request
+
+    pts.pixit_mirror holds the PIXIT values set with set_pixit, which PTS
+    gets back after test cases and recovery. The proxies update it also on
+    set_pixit calls out of setup_project_pixits, e.g. by test cases.
+    """
+    changes = []
+
+    for project_name, project_pixits in pixits.items():
+        mirror = pts.pixit_mirror.get(project_name, {})
+        changed = {name: value for name, value in project_pixits.items()
+                   if mirror.get(name) != value}
+
+        if changed:
+            log("Setting %d of %d PIXITs of %s", len(changed), len(project_pixits), project_name)
+            changes.append((project_name, changed))
+
+    if not changes:
+        return
+
+    pts_multicall(pts, [('set_pixits', change) for change in changes])
+
+    for project_name, changed in changes:
+        update_pixit_mirror(pts, project_name, changed)
+
+
 def setup_project_pixits(ptses):
+    recorders = [PixitRecorder(pts) for pts in ptses]
+
     for profile in _get_profiles(ptses):
         mod = getattr(autoprojects, profile, None)
         if mod is not None:
-            mod.set_pixits(ptses)
+            mod.set_pixits(recorders)
+
+    for recorder in recorders:
+        apply_pixits(recorder.pts, recorder.pixits)
 
 
 def setup_test_cases(ptses):
@@ -41,6 +41,8 @@ def generate_file_paths(file_paths=None, autopts_root_dir=AUTOPTS_ROOT_DIR):
     FILE_PATHS.update({
         'ALL_STATS_RESULTS_XML_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'all_stats_results.xml'),
         'TC_STATS_RESULTS_XML_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'tc_stats_results.xml'),
+        'ALL_STATS_RESULTS_JOURNAL_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'all_stats_results.jsonl'),
+        'TC_STATS_RESULTS_JOURNAL_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'tc_stats_results.jsonl'),
         'TEST_CASES_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'test_cases_file.json'),
         'ALL_STATS_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'all_stats.json'),
         'TC_STATS_JSON_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'tc_stats.json'),
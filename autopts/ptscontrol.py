@@ -34,6 +34,7 @@ Cause of tight coupling with PTS, this module is Windows specific
 """
 
 import ctypes
+import itertools
 import logging as root_logging
 import os
 import shutil
@@ -314,6 +315,10 @@ class PTSSender(win32com.server.connect.ConnectableServer):
                                        [rsp, rsp_len, is_present])
 
 
+def _pixit_recov_key(project_name, param_name):
+    return 'set_pixit', project_name, param_name
+
+
 def parse_ptscontrol_error(err):
     try:
         # Decode HRESULT code from PTS exception
@@ -351,8 +356,11 @@ class PyPTS:
         self._init_attributes()
         self._end = threading.Event()
 
-        # list of tuples of methods and arguments to recover after PTS restart
-        self._recov = []
+        # tuples of methods and arguments to recover after PTS restart, in
+        # the order of calls, indexed by ('set_pixit', project, param) for
+        # PIXITs and by a sequence number for the others
+        self._recov = {}
+        self._recov_seq = itertools.count()
         self._temp_changes = []
         self._recov_in_progress = False
         self._ready = False
@@ -416,22 +424,13 @@ class PyPTS:
 
         # Re-set recovery element to avoid duplications
         if func == self.set_pixit:  # pylint: disable=W0143
-            profile = args[0]
-            pixit = args[1]
-            # Look for possible re-setable PIXIT
-            try:
-                # Search for matching recover function, PIXIT and recover if value was changed.
-                item = next(x for x in self._recov if ((x[0] ==
-                                                        self.set_pixit) and (x[1][0] == profile) and
-                                                       (x[1][1] == pixit)))
-
-                self._recov.remove(item)
-                log("%s, re-set pixit: %s", self.add_recov.__name__, pixit)
-
-            except StopIteration:
-                pass
+            key = _pixit_recov_key(args[0], args[1])
+            if self._recov.pop(key, None):
+                log("%s, re-set pixit: %s", self.add_recov.__name__, args[1])
+        else:
+            key = next(self._recov_seq)
 
-        self._recov.append((func, args, kwds))
+        self._recov[key] = (func, args, kwds)
 
     def _add_temp_change(self, func, *args, **kwds):
         """Add function to set temporary value"""
@@ -443,20 +442,17 @@ class PyPTS:
         """Remove function from recovery list"""
         log("%s %r %r %r", self.del_recov.__name__, func, args, kwds)
 
-        recov_funcs = [item[0] for item in self._recov]
-
-        if func not in recov_funcs:
-            return
-
         # no arguments specified: remove all method calls
         if not args and not kwds:
-            self._recov = [item for item in self._recov if item[0] != func]
+            keys = [key for key, item in self._recov.items() if item[0] == func]
 
         # remove single method call with matching arguments
         else:
             item = (func, args, kwds)
-            if item in self._recov:
-                self._recov.remove(item)
+            keys = [key for key, recov_item in self._recov.items() if recov_item == item][:1]
+
+        for key in keys:
+            del self._recov[key]
 
     def _recover_item(self, item):
         """Recovery item wraper"""
@@ -497,7 +493,7 @@ class PyPTS:
 
         self.restart_pts()
 
-        for item in self._recov:
+        for item in list(self._recov.values()):
             self._recover_item(item)
 
         self._recov_in_progress = False
@@ -773,22 +769,15 @@ class PyPTS:
 
         self._recov_in_progress = True
 
-        for tch in self._temp_changes:
-            func = tch[0]
-
-            if func == self.update_pixit_param:
-                # Look for possible recoverable parameter
-                try:
-                    '''Search for matching recover function, PIXIT and recover
-                    if value was changed. '''
-                    item = next(x for x in self._recov if ((x[0] ==
-                                                            self.set_pixit) and (x[1][0] ==
-                                                                                 tch[1][0]) and (x[1][1] == tch[1][1])))
+        # The same parameter can be changed more than once in a test case
+        keys = dict.fromkeys(_pixit_recov_key(tch[1][0], tch[1][1]) for tch in self._temp_changes
+                             if tch[0] == self.update_pixit_param)
 
-                    self._recover_item(item)
-
-                except StopIteration:
-                    continue
+        for key in keys:
+            # Recover the PIXIT if it has been set
+            item = self._recov.get(key)
+            if item:
+                self._recover_item(item)
 
         self._recov_in_progress = False
         self._temp_changes = []
@@ -943,6 +932,16 @@ class PyPTS:
 
             raise Exception(e) from e
 
+    def set_pixits(self, project_name, pixits):
+        """Set PIXITs of a project in a single call
+
+        pixits -- dict of {param_name: param_value}
+        """
+        log("%s %s %d PIXITs", self.set_pixits.__name__, project_name, len(pixits))
+
+        for param_name, param_value in pixits.items():
+            self.set_pixit(project_name, param_name, param_value)
+
     def update_pixit_param(self, project_name, param_name, new_param_value):
         """Updates PIXIT
 
@@ -115,6 +115,31 @@ def get_build_and_flash(board_name):
         return None
 
 
+def get_build(board_name):
+    """Return the build function of a board that flashes with a separate flash function"""
+    board_mod = importlib.import_module(__package__ + '.' + board_name)
+
+    if board_mod is None:
+        raise Exception(f"Board name {board_name} is not supported!")
+
+    try:
+        return board_mod.build
+    except AttributeError:
+        return None
+
+
+def get_flash(board_name):
+    board_mod = importlib.import_module(__package__ + '.' + board_name)
+
+    if board_mod is None:
+        raise Exception(f"Board name {board_name} is not supported!")
+
+    try:
+        return board_mod.flash
+    except AttributeError:
+        return None
+
+
 def get_board_type(board_name):
     board_mod = importlib.import_module(__package__ + '.' + board_name)
 
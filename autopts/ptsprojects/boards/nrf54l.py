@@ -13,7 +13,7 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.boards.nrf5x import build_and_flash, reset_cmd  # noqa: F401
+from autopts.ptsprojects.boards.nrf5x import build, build_and_flash, flash, reset_cmd  # noqa: F401
 
 board_type = 'nrf54l15dk/nrf54l15/cpuapp'
 supported_projects = ['zephyr']
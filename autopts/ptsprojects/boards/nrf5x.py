@@ -31,19 +31,19 @@ def reset_cmd(iutctl):
     return f'nrfutil device reset --reset-kind RESET_PIN --serial-number {iutctl.debugger_snr}'
 
 
-def build_and_flash(zephyr_wd, tester_app_dir, board, debugger_snr, conf_file=None, project_repos=None,
-                    env_cmd=None, *args):
-    """Build and flash Zephyr binary
+def build(zephyr_wd, tester_app_dir, board, conf_file=None, project_repos=None, env_cmd=None,
+          build_dir='build'):
+    """Build Zephyr binary
     :param zephyr_wd: Zephyr source path
     :param tester_app_dir: path to tester application relative to zephyr_wd
     :param board: IUT
-    :param debugger_snr serial number
     :param conf_file: configuration file to be used
     :param project_repos: a list of repo paths
     :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    :param build_dir: build directory, relative to the tester application
     """
-    logging.debug("%s: %s %s %s %s", build_and_flash.__name__, zephyr_wd, tester_app_dir,
-                  board, conf_file)
+    logging.debug("%s: %s %s %s %s %s", build.__name__, zephyr_wd, tester_app_dir,
+                  board, conf_file, build_dir)
 
     if env_cmd:
         env_cmd = env_cmd.split() + ['&&']
@@ -52,12 +52,46 @@ def build_and_flash(zephyr_wd, tester_app_dir, board, debugger_snr, conf_file=No
 
     tester_dir = os.path.join(zephyr_wd, tester_app_dir)
 
-    check_call('rm -rf build/'.split(), cwd=tester_dir)
+    check_call(['rm', '-rf', build_dir], cwd=tester_dir)
 
-    cmd = ['west', 'build', '-p', 'auto', '-b', board]
+    cmd = ['west', 'build', '-p', 'auto', '-b', board, '-d', build_dir]
     if conf_file and conf_file not in ["default", "prj.conf"]:
         cmd.extend(('--', f'-DEXTRA_CONF_FILE=\'{conf_file}\''))
 
     check_call(env_cmd + cmd, cwd=tester_dir)
+
+
+def flash(zephyr_wd, tester_app_dir, debugger_snr, env_cmd=None):
+    """Flash the Zephyr binary built by build()
+    :param zephyr_wd: Zephyr source path
+    :param tester_app_dir: path to tester application relative to zephyr_wd
+    :param debugger_snr serial number
+    :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    """
+    if env_cmd:
+        env_cmd = env_cmd.split() + ['&&']
+    else:
+        env_cmd = []
+
+    tester_dir = os.path.join(zephyr_wd, tester_app_dir)
+
     check_call(env_cmd + ['west', 'flash', '--skip-rebuild', '--recover',
                           '-i', debugger_snr], cwd=tester_dir)
+
+
+def build_and_flash(zephyr_wd, tester_app_dir, board, debugger_snr, conf_file=None, project_repos=None,
+                    env_cmd=None, *args):
+    """Build and flash Zephyr binary
+    :param zephyr_wd: Zephyr source path
+    :param tester_app_dir: path to tester application relative to zephyr_wd
+    :param board: IUT
+    :param debugger_snr serial number
+    :param conf_file: configuration file to be used
+    :param project_repos: a list of repo paths
+    :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    """
+    logging.debug("%s: %s %s %s %s", build_and_flash.__name__, zephyr_wd, tester_app_dir,
+                  board, conf_file)
+
+    build(zephyr_wd, tester_app_dir, board, conf_file, project_repos, env_cmd)
+    flash(zephyr_wd, tester_app_dir, debugger_snr, env_cmd)
@@ -0,0 +1,220 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Pool of native IUT processes booted ahead of the test cases
+
+Each warm IUT runs in its own working directory, so it has its own
+flash.bin, and is parked on its own BTP socket with its IUT ready event
+consumed. The tester enables Bluetooth, and so opens the HCI device, only
+once GAP is registered, so parked IUTs do not take the controller of the
+running one.
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+from autopts.config import FILE_PATHS
+from autopts.ptsprojects.utils.native import NativeIUT
+from autopts.pybtp import defs
+from autopts.pybtp.iutctl_common import BTPSocketSrv
+from autopts.pybtp.types import BTPInitError
+
+log = logging.debug
+
+# Max time to boot a pooled IUT until its IUT ready event
+IUT_POOL_BOOT_TIMEOUT = 30
+
+_pools = []
+
+
+def _image_stamp(kernel_image):
+    try:
+        stat = os.stat(kernel_image)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class WarmIut:
+    """A native IUT process parked on its own BTP socket"""
+
+    def __init__(self, btp_address, socket_srv, native, work_dir, image_stamp):
+        self.btp_address = btp_address
+        self.socket_srv = socket_srv
+        self.native = native
+        self.work_dir = work_dir
+        self.image_stamp = image_stamp
+
+    def close(self, log_dir=None):
+        """Stop the IUT and move its log to log_dir"""
+        if self.socket_srv.conn is not None:
+            self.socket_srv.close()
+        elif self.socket_srv.sock:
+            self.socket_srv.sock.close()
+
+        self.native.close()
+
+        # After a reset in the middle of a test case, it logs to log_dir
+        if log_dir and self.native.log_path and os.path.exists(self.native.log_path) and \
+                os.path.dirname(os.path.abspath(self.native.log_path)) != os.path.abspath(log_dir):
+            with open(self.native.log_path) as src, \
+                    open(os.path.join(log_dir, os.path.basename(self.native.log_path)), 'a') as dst:
+                shutil.copyfileobj(src, dst)
+
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        if os.path.exists(self.btp_address):
+            os.remove(self.btp_address)
+
+
+class IutPool:
+    """Native IUT processes of an IutCtl booted in the background
+
+    take() hands out a warm IUT and boots its replacement.
+    """
+
+    def __init__(self, iutctl, size):
+        self.iutctl = iutctl
+        self.size = size
+        self._warm = queue.Queue()
+        self._lock = threading.Lock()
+        self._booting = 0
+        self._closed = False
+        self._ids = itertools.count()
+        os.makedirs(FILE_PATHS['TMP_DIR'], exist_ok=True)
+        self._pool_dir = tempfile.mkdtemp(prefix=f'iut_pool_{iutctl.iut_target_name}_',
+                                          dir=FILE_PATHS['TMP_DIR'])
+        _pools.append(self)
+
+    def fill(self):
+        """Boot IUTs up to the pool size"""
+        with self._lock:
+            if self._closed:
+                return
+
+            missing = self.size - self._warm.qsize() - self._booting
+            self._booting += max(missing, 0)
+
+        for _ in range(missing):
+            threading.Thread(target=self._boot, name='IutPoolBoot', daemon=True).start()
+
+    def _boot(self):
+        warm = None
+        try:
+            warm = self._boot_iut(next(self._ids))
+        except Exception as e:
+            logging.exception(e)
+
+        with self._lock:
+            self._booting -= 1
+            closed = self._closed
+
+        if warm and closed:
+            warm.close()
+            return
+
+        # None wakes up take() after a failed boot
+        self._warm.put(warm)
+
+    def _boot_iut(self, iut_id):
+        iutctl = self.iutctl
+        work_dir = os.path.join(self._pool_dir, str(iut_id))
+        os.makedirs(work_dir)
+        btp_address = f'{iutctl.btp_address}-pool-{iutctl.iut_target_name}-{iut_id}'
+        image_stamp = _image_stamp(iutctl.kernel_image)
+
+        socket_srv = BTPSocketSrv()
+        socket_srv.open(btp_address)
+        native = NativeIUT()
+        warm = WarmIut(btp_address, socket_srv, native, work_dir, image_stamp)
+
+        try:
+            native_cmd = iutctl.get_native_cmd(kernel_image=os.path.abspath(iutctl.kernel_image),
+                                               hci=iutctl.hci,
+                                               tty_baudrate=iutctl.tty_baudrate,
+                                               btp_address=btp_address,
+                                               rtscts=iutctl.rtscts)
+            native.start(native_cmd, work_dir, cwd=work_dir)
+            socket_srv.accept(timeout=IUT_POOL_BOOT_TIMEOUT)
+
+            tuple_hdr, _ = socket_srv.read(timeout=IUT_POOL_BOOT_TIMEOUT)
+            if tuple_hdr.svc_id != defs.BTP_SERVICE_ID_CORE or \
+                    tuple_hdr.op != defs.BTP_CORE_EV_IUT_READY:
+                raise BTPInitError(f'IUT ready event NOT received from {btp_address}!')
+        except BaseException:
+            warm.close()
+            raise
+
+        log(f"Pooled IUT {btp_address} is ready")
+
+        return warm
+
+    def take(self):
+        """Return a warm IUT, or None if there is none booted or booting"""
+        image_stamp = _image_stamp(self.iutctl.kernel_image)
+        warm = None
+
+        while True:
+            with self._lock:
+                if self._warm.empty() and not self._booting:
+                    break
+
+            try:
+                warm = self._warm.get(timeout=IUT_POOL_BOOT_TIMEOUT)
+            except queue.Empty:
+                break
+
+            if warm is None:
+                continue
+
+            if warm.image_stamp == image_stamp and warm.native.is_running():
+                break
+
+            # E.g. the image has been rebuilt for another config
+            log(f"Dropping pooled IUT {warm.btp_address}")
+            warm.close()
+            warm = None
+            self.fill()
+
+        self.fill()
+
+        return warm
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+        while not self._warm.empty():
+            warm = self._warm.get_nowait()
+            if warm:
+                warm.close()
+
+        shutil.rmtree(self._pool_dir, ignore_errors=True)
+
+        if self in _pools:
+            _pools.remove(self)
+
+
+@atexit.register
+def close_iut_pools():
+    """Stop the parked IUTs of all pools"""
+    while _pools:
+        _pools[-1].close()
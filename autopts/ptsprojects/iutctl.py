@@ -21,16 +21,18 @@ import shlex
 import socket
 import subprocess
 import sys
+import threading
 import time
-from contextvars import ContextVar
 
 import serial
 
 from autopts.config import FILE_PATHS
 from autopts.ptsprojects.boards import Board, tty_to_com
+from autopts.ptsprojects.iut_pool import IutPool
 from autopts.ptsprojects.stack import Stack
+from autopts.ptsprojects.utils.native import NativeIUT
 from autopts.pybtp import btp, defs
-from autopts.pybtp.iutctl_common import BTP_ADDRESS, BTPSocketSrv, BTPWorker, LoggerWorker
+from autopts.pybtp.iutctl_common import BTP_ADDRESS, BTPSocketSrv, BTPWorker, LoggerWorker, get_btp_serial
 from autopts.pybtp.types import BTPInitError
 from autopts.rtt import BTMON, RTTLogger
 from autopts.utils import get_global_end
@@ -118,6 +120,8 @@ class IutCtl:
         self._btproxy = None
         self._uart_logger = None
         self.rtscts = args.rtscts
+        self.serial_btp = getattr(args, 'serial_btp', False)
+        self.btp_log = args.btp_log
         self._start_mode = None
         self._stop_mode = None
         self.get_btproxy_cmd = get_btproxy_cmd
@@ -125,6 +129,13 @@ class IutCtl:
         self.get_btattach_cmd = get_btattach_cmd
         self.get_native_cmd = get_native_cmd
         self.boot_log = ''
+        self.iut_pool_size = getattr(args, 'iut_pool', 0)
+        self._iut_pool = None
+        self._warm_iut = None
+        # Restarted in the middle of a test case, see wait_iut_ready_event
+        self._iut_resetting = False
+        self._qemu_snapshot = None
+        self._save_qemu_snapshot = False
 
         if args.board_name:
             self.board = Board(args.board_name, self)
@@ -141,8 +152,11 @@ class IutCtl:
         elif self.iut_mode == "qemu":
             from autopts.ptsprojects.utils.btattach import Btattach
             from autopts.ptsprojects.utils.btproxy import Btproxy
-            from autopts.ptsprojects.utils.qemu import QEMU
+            from autopts.ptsprojects.utils.qemu import QEMU, QemuSnapshot
             self._qemu = QEMU()
+            if getattr(args, 'qemu_snapshot', False):
+                self._qemu_snapshot = QemuSnapshot(FILE_PATHS['TMP_DIR'], self.iut_target_name,
+                                                   f'{self.btp_address}-qmp')
             self._start_mode = self._start_qemu_mode
             self._stop_mode = self._stop_qemu_mode
             self._btproxy = Btproxy() if self.btproxy_bin else None
@@ -152,7 +166,6 @@ class IutCtl:
                 self.btattach_start()
         elif self.iut_mode == "native":
             from autopts.ptsprojects.utils.btattach import Btattach
-            from autopts.ptsprojects.utils.native import NativeIUT
             self._native = NativeIUT()
             self._start_mode = self._start_native_mode
             self._stop_mode = self._stop_native_mode
@@ -203,6 +216,10 @@ class IutCtl:
             self.board.reset()
 
     def _start_tty_mode(self, test_case):
+        if self.serial_btp:
+            self._start_tty_serial_mode(test_case)
+            return
+
         do_reset = not self.gdb
 
         if do_reset and len(self.stack.core.event_queues[defs.BTP_CORE_EV_IUT_READY]) == 0:
@@ -218,7 +235,8 @@ class IutCtl:
         # Flush serial to ignore it.
         self.flush_serial(self.rtscts)
 
-        self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log")
+        self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log",
+                                       self.btp_log, self.iut_target_name)
         self.socket_srv.open(self.btp_address)
         self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
         flow_control = "crtscts" if self.rtscts else ""
@@ -261,8 +279,29 @@ class IutCtl:
             # the beginning of the first test case.
             self.board.reset()
 
+    def _start_tty_serial_mode(self, test_case):
+        """BTP over the serial port opened in-process instead of socat"""
+        do_reset = not self.gdb
+        tty = tty_to_com(self.tty_file) if sys.platform == "win32" else self.tty_file
+
+        self.socket_srv = get_btp_serial(tty, self.tty_baudrate, self.rtscts)
+        self.socket_srv.open_wire_logs(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log",
+                                       self.btp_log, self.iut_target_name)
+        # Received while no test case was running, e.g. a part of an IUT
+        # ready event
+        self.socket_srv.flush()
+
+        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
+        self.btp_socket.start()
+
+        if do_reset and len(self.stack.core.event_queues[defs.BTP_CORE_EV_IUT_READY]) == 0:
+            # The port is open, so the IUT ready event of this reset is
+            # received, e.g. at the beginning of the first test case.
+            self.board.reset()
+
     def _start_qemu_mode(self, test_case):
-        self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log")
+        self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log",
+                                       self.btp_log, self.iut_target_name)
         self.socket_srv.open(self.btp_address)
         self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
 
@@ -286,14 +325,102 @@ class IutCtl:
                                      btp_address=self.btp_address,
                                      qemu_options=self.qemu_options)
 
+        snapshot = self._qemu_snapshot
+        if snapshot and snapshot.update(self.kernel_image, qemu_cmd) and snapshot.verify():
+            self._restore_qemu_snapshot(qemu_cmd, test_case)
+            return
+
+        if snapshot and not snapshot.disabled:
+            qemu_cmd = snapshot.boot_cmd(qemu_cmd)
+            self._save_qemu_snapshot = True
+
         log(f"Starting QEMU process: {qemu_cmd}")
 
         self._qemu.start(qemu_cmd, self.boot_log, test_case.log_dir)
 
         self.btp_socket.accept()
 
+    def _restore_qemu_snapshot(self, qemu_cmd, test_case):
+        snapshot = self._qemu_snapshot
+        qemu_cmd = snapshot.restore_cmd(qemu_cmd)
+
+        log(f"Restoring QEMU process: {qemu_cmd}")
+
+        try:
+            self._qemu.start(qemu_cmd, None, test_case.log_dir)
+            self.btp_socket.accept()
+            snapshot.wait_restored()
+        except Exception:
+            # Boot it the next time
+            snapshot.drop()
+            raise
+
+        # Sent by the IUT before the snapshot was saved
+        self.stack.core.event_received(defs.BTP_CORE_EV_IUT_READY, True)
+
+    def _save_qemu_snapshot_once(self):
+        self._save_qemu_snapshot = False
+
+        try:
+            self._qemu_snapshot.save()
+        except Exception as e:
+            logging.exception(e)
+            log("QEMU snapshot disabled, the IUT will be booted at every test case")
+            self._qemu_snapshot.disabled = True
+
+    def _start_pooled_native_mode(self, test_case):
+        """Hand out a warm IUT of the pool, see IutPool
+
+        Returns False if the IUT has to be started here. Only done at the
+        start of a test case, a reset in the middle of it keeps the flash.bin
+        of the IUT.
+        """
+        if not self.iut_pool_size or self._btattach_at_every_test_case or self.hid_serial or self.gdb:
+            return False
+
+        if self._iut_resetting:
+            return False
+
+        if self._iut_pool is None:
+            # Started on first use, so only the targets of the IUT maps boot
+            self._iut_pool = IutPool(self, self.iut_pool_size)
+            self._iut_pool.fill()
+            return False
+
+        warm = self._iut_pool.take()
+        if warm is None:
+            return False
+
+        log(f"Using pooled IUT {warm.btp_address}")
+
+        self._warm_iut = warm
+        self._native = warm.native
+        self.socket_srv = warm.socket_srv
+        self.socket_srv.open_wire_logs(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log",
+                                       self.btp_log, self.iut_target_name)
+        self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
+
+        if self._btmon:
+            self.btmon_start()
+
+        self.btp_socket.start()
+
+        # Consumed by the pool
+        self.stack.core.event_received(defs.BTP_CORE_EV_IUT_READY, True)
+
+        return True
+
+    def close_iut_pool(self):
+        if self._iut_pool:
+            self._iut_pool.close()
+            self._iut_pool = None
+
     def _start_native_mode(self, test_case):
-        self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log")
+        if self._start_pooled_native_mode(test_case):
+            return
+
+        self.socket_srv = BTPSocketSrv(test_case.log_dir, f"autopts-iutctl-{self.iut_target_name}.log",
+                                       self.btp_log, self.iut_target_name)
         self.socket_srv.open(self.btp_address)
         self.btp_socket = BTPWorker(self.socket_srv, iut_name=self.iut_target_name)
 
@@ -309,7 +436,14 @@ class IutCtl:
         if self._btmon:
             self.btmon_start()
 
-        native_cmd = self.get_native_cmd(kernel_image=self.kernel_image,
+        kernel_image = self.kernel_image
+        cwd = None
+        if self._warm_iut:
+            # Reset of a pooled IUT, restarted in its work dir with its flash.bin
+            kernel_image = os.path.abspath(kernel_image)
+            cwd = self._warm_iut.work_dir
+
+        native_cmd = self.get_native_cmd(kernel_image=kernel_image,
                                          hci=self.hci,
                                          tty_baudrate=self.tty_baudrate,
                                          btp_address=self.btp_address,
@@ -317,7 +451,7 @@ class IutCtl:
 
         log(f"Starting native process: {native_cmd}")
 
-        self._native.start(native_cmd, test_case.log_dir)
+        self._native.start(native_cmd, test_case.log_dir, cwd=cwd)
 
         self.btp_socket.accept()
 
@@ -381,8 +515,12 @@ class IutCtl:
                 self.board.reset()
             else:
                 # For QEMU, the IUT ready event is sent at startup of the process.
-                self.stop()
-                self.start(self.test_case)
+                self._iut_resetting = True
+                try:
+                    self.stop()
+                    self.start(self.test_case)
+                finally:
+                    self._iut_resetting = False
 
         ev = self.stack.core.wait_iut_ready_ev(30)
         # Clear, because if the board has reset unexpectedly in the middle
@@ -394,6 +532,10 @@ class IutCtl:
 
         log("IUT ready event received OK")
 
+        if self._save_qemu_snapshot:
+            # Before any BTP command, so the restored IUT has nothing registered
+            self._save_qemu_snapshot_once()
+
         if not reset:
             # Final steps of IUT startup. The IUT is ready, let's open the loggers.
 
@@ -460,6 +602,9 @@ class IutCtl:
         if self._qemu:
             self._qemu.close()
 
+        # Stopped before its IUT ready event
+        self._save_qemu_snapshot = False
+
         if self._btproxy:
             self._btproxy.close()
 
@@ -481,6 +626,11 @@ class IutCtl:
         if self._native:
             self._native.close()
 
+        if self._warm_iut and not self._iut_resetting:
+            self._warm_iut.close(self.test_case.log_dir)
+            self._warm_iut = None
+            self._native = NativeIUT()
+
         if self._btmon:
             self.btmon_stop()
 
@@ -491,24 +641,60 @@ class IutCtl:
         self.stack.cleanup()
 
 
+class _IutCtlHandle:
+    """Base of the thread-local handles of an IutCtlWrapper
+
+    A handle shares __dict__ with the IUT target selected in its thread,
+    so attributes are read and written as on a plain IutCtl. Attributes
+    missing in the target are looked up in the wrapper.
+    """
+
+    __setattr__ = object.__setattr__
+
+    def __getattr__(self, name):
+        return object.__getattribute__(self._wrapper, name)
+
+
+class _SelectedIut(threading.local):
+    """Handle of the IUT target selected in a thread, the first by default"""
+
+    def __init__(self, wrapper):
+        self.handle = object.__new__(wrapper._handle_class)
+        self.handle.__dict__ = wrapper._iut_targets[wrapper._default_iut_target_name].__dict__
+
+
 class IutCtlWrapper:
+    """IUT control of multiple IUT targets
+
+    Every thread gets its own handle() to the IUT target it selected with
+    select_iut(), the first target by default. get_iut() returns the handle,
+    so access on the BTP path does not go through the wrapper. Attributes
+    accessed on the wrapper itself are delegated to the handle of the
+    calling thread.
+    """
+
     def __init__(self, args):
-        object.__setattr__(self, '_iut_targets', None)
-        object.__setattr__(self, '_active_iut_target', None)
-        object.__setattr__(self, '_active_iut_target_name', None)
+        object.__setattr__(self, '_wrapper', self)
+        object.__setattr__(self, '_iut_targets', {})
         object.__setattr__(self, '_iut_map', {'0': 'iut0', '1': 'iut1'})
 
-        self._iut_targets = {}
-
         for target_name in args.iut_targets_args:
             iutctl = IutCtl(args.iut_targets_args[target_name])
             self._iut_targets[target_name] = iutctl
 
-        iut_target_name = next(iter(self._iut_targets))
-        self._active_iut_target = ContextVar("active_iut_target")
-        self._active_iut_target.set(self._iut_targets[iut_target_name])
-        self._active_iut_target_name = ContextVar("active_iut_target_name")
-        self._active_iut_target_name.set(iut_target_name)
+        object.__setattr__(self, '_default_iut_target_name', next(iter(self._iut_targets)))
+
+        # The handles get the methods of the wrapper subclass, e.g.
+        # ZephyrCtl.remove_flash_bin, before the IutCtl ones.
+        handle_class = type(f'{type(self).__name__}Handle',
+                            (_IutCtlHandle, type(self), IutCtl),
+                            {'_wrapper': self})
+        object.__setattr__(self, '_handle_class', handle_class)
+        object.__setattr__(self, '_selected', _SelectedIut(self))
+
+    def handle(self):
+        """Return the IUT handle of the calling thread"""
+        return self._wrapper._selected.handle
 
     def select_iut(self, iut_id=None, iut_name=None):
         """
@@ -516,33 +702,34 @@ class IutCtlWrapper:
         This is a part of a workaround that allows threads to receive
         a right IUT instance (and its stack) from get_iut() and get_stack().
         """
+        wrapper = self._wrapper
+
         if iut_id is not None:
-            name = self._iut_map[str(iut_id)]
+            name = wrapper._iut_map[str(iut_id)]
         else:
             name = iut_name
-        self._active_iut_target.set(self._iut_targets[name])
-        self._active_iut_target_name.set(name)
+        wrapper._selected.handle.__dict__ = wrapper._iut_targets[name].__dict__
         log(f"Selected IUT controller: {iut_id}->{name}")
 
     def set_iut_map(self, iut_map):
         log(f"IUT updated: {iut_map}")
-        self._iut_map = {}
-        for iut_id in iut_map:
-            self._iut_map[str(iut_id)] = iut_map[iut_id]
+        iut_map = {str(iut_id): iut_map[iut_id] for iut_id in iut_map}
+        object.__setattr__(self._wrapper, '_iut_map', iut_map)
 
     def get_iut_map(self):
-        return self._iut_map
+        return self._wrapper._iut_map
 
-    def __getattribute__(self, name):
-        try:
-            return object.__getattribute__(self, name)
-        except AttributeError:
-            return getattr(self._active_iut_target.get(), name)
+    def __getattr__(self, name):
+        # Only called when the wrapper itself has no such attribute
+        return getattr(self.handle(), name)
 
     def __setattr__(self, name, value):
-        target = object.__getattribute__(self, '_active_iut_target')
+        handle = self.handle()
 
-        if target and hasattr(target.get(), name):
-            setattr(target.get(), name, value)
-        else:
+        try:
+            # Without the fallback of the handle to the wrapper
+            object.__getattribute__(handle, name)
+        except AttributeError:
             object.__setattr__(self, name, value)
+        else:
+            setattr(handle, name, value)
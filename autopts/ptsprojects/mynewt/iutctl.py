@@ -36,6 +36,9 @@ def create_mynewt_ctl_class(use_wrapper: bool):
 
 
 def get_iut():
+    if isinstance(MYNEWT, IutCtlWrapper):
+        return MYNEWT.handle()
+
     return MYNEWT
 
 
@@ -0,0 +1,134 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Test case results store of TestCaseRunStats
+
+Results are kept in memory, indexed by test case name, and every change is
+appended to a JSON lines journal, so an interrupted run can be resumed
+with --use_backup. The results XML is exported from memory on demand.
+
+Journal entries:
+    ["set", record]        - replace the record of record["name"], add it if new
+    ["extend", [records]]  - append records, e.g. when merging stats
+"""
+
+import json
+import logging
+import os
+import xml.etree.ElementTree as ElementTree
+
+log = logging.debug
+
+JOURNAL_FILE_EXT = '.jsonl'
+
+
+def get_journal_path(xml_file):
+    return os.path.splitext(xml_file)[0] + JOURNAL_FILE_EXT
+
+
+def remove_results_files(xml_file):
+    for path in (xml_file, get_journal_path(xml_file)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ResultsStore:
+    def __init__(self, xml_file):
+        self.xml_file = xml_file
+        self.journal_file = get_journal_path(xml_file)
+        # Records in the order of the results XML. The same test case can
+        # be present more than once after merging stats of several configs,
+        # the index points to the first one, as XPath lookup used to.
+        self.records = []
+        self.index = {}
+
+        if os.path.exists(self.journal_file):
+            self._replay_journal()
+        elif os.path.exists(self.xml_file):
+            self._import_xml()
+        else:
+            os.makedirs(os.path.dirname(self.xml_file) or '.', exist_ok=True)
+            self.export_xml()
+
+    def _apply(self, entry):
+        op, arg = entry
+
+        if op == 'set':
+            record = self.index.get(arg['name'])
+            if record is None:
+                record = dict(arg)
+                self.records.append(record)
+                self.index[record['name']] = record
+            else:
+                record.update(arg)
+        elif op == 'extend':
+            for arg_record in arg:
+                record = dict(arg_record)
+                self.records.append(record)
+                self.index.setdefault(record['name'], record)
+        else:
+            raise ValueError(f'Unknown results journal operation {op!r}')
+
+    def _append(self, entry):
+        self._apply(entry)
+
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay_journal(self):
+        with open(self.journal_file, 'rb+') as f:
+            end = 0
+            for line_no, line in enumerate(f, 1):
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('No end of line')
+
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last entry written when the run was interrupted,
+                    # cut off so the next entry starts on its own line
+                    log(f'Removing incomplete entry {line_no} of {self.journal_file}')
+                    f.truncate(end)
+                    break
+
+                self._apply(entry)
+                end += len(line)
+
+    def _import_xml(self):
+        root = ElementTree.parse(self.xml_file).getroot()
+        records = [dict(elem.attrib) for elem in root.findall('./test_case')]
+
+        if records:
+            self._append(['extend', records])
+
+    def get(self, name):
+        return self.index.get(name)
+
+    def set(self, record):
+        self._append(['set', record])
+
+    def extend(self, records):
+        self._append(['extend', list(records)])
+
+    def export_xml(self):
+        root = ElementTree.Element('results')
+        for record in self.records:
+            ElementTree.SubElement(root, 'test_case', record)
+
+        tmp_file = self.xml_file + '.tmp'
+        ElementTree.ElementTree(root).write(tmp_file)
+        os.replace(tmp_file, self.xml_file)
@@ -15,11 +15,28 @@
 #
 import inspect
 import logging
-from threading import Event, Lock, Timer
-from time import sleep
+from threading import Condition, Lock
+from time import monotonic
 
 from autopts.utils import raise_on_global_end
 
+# Max time a waiter sleeps before re-checking its condition and global end.
+# Waiters are woken up earlier whenever an event is received.
+EVENT_WAIT_PERIOD = 1.0
+
+# Shared by all stack layers. Bumped and notified on every received event.
+_event_cond = Condition()
+_event_count = 0
+
+
+def notify_event_waiters():
+    """Wake up all threads waiting for stack events or state changes"""
+    global _event_count
+
+    with _event_cond:
+        _event_count += 1
+        _event_cond.notify_all()
+
 
 class Property:
     def __init__(self, data):
@@ -40,48 +57,78 @@ class WildCard:
         return True
 
 
-def timeout_cb(timeout, flag, condition):
+class EventQueue(list):
+    """List of received events that wakes up the waiters on insertion"""
+
+    def append(self, item):
+        super().append(item)
+        notify_event_waiters()
+
+    def extend(self, items):
+        super().extend(items)
+        notify_event_waiters()
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        notify_event_waiters()
+
+    def wait_for(self, condition_cb, timeout, remove=True):
+        return wait_event_with_condition(self, condition_cb, timeout, remove)
+
+
+def timeout_cb(timeout, condition):
     logging.error(
-        f"Timeout after {timeout} seconds while waiting for event {flag} "
+        f"Timeout after {timeout} seconds while waiting for event "
         f"with condition {inspect.getsource(condition)}"
     )
-    flag.clear()
-
 
-def wait_for_event(timeout, test, *args, **kwargs):
-    if test(*args, **kwargs):
-        return True
 
-    flag = Event()
-    flag.set()
+def _wait_until(timeout, predicate):
+    """Block until predicate returns a truthy value or timeout expires
 
-    t = Timer(timeout, timeout_cb, [timeout, flag, test])
-    t.name = f'EventTimer{t.name}'
-    t.start()
+    The predicate is evaluated without holding the event condition, so it
+    may take any stack lock. A notification that arrives while it runs is
+    not lost, because the event counter is checked before going to sleep.
+    Returns the predicate result, or None on timeout.
+    """
+    deadline = None if timeout is None else monotonic() + timeout
 
-    while flag.is_set():
+    while True:
         raise_on_global_end()
 
-        result = test(*args, **kwargs)
+        with _event_cond:
+            seen_count = _event_count
+
+        result = predicate()
         if result:
-            t.cancel()
             return result
 
-        sleep(0.1)
+        wait_time = EVENT_WAIT_PERIOD
+        if deadline is not None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return None
+            wait_time = min(remaining, wait_time)
 
-    return False
+        with _event_cond:
+            if seen_count == _event_count:
+                _event_cond.wait(wait_time)
 
 
-def wait_event_with_condition(event_queue, condition_cb, timeout, remove):
-    flag = Event()
-    flag.set()
+def wait_for_event(timeout, test, *args, **kwargs):
+    if test(*args, **kwargs):
+        return True
 
-    t = Timer(timeout, timeout_cb, [timeout, flag, condition_cb])
-    t.start()
+    result = _wait_until(timeout, lambda: test(*args, **kwargs))
+    if result:
+        return result
 
-    while flag.is_set():
-        raise_on_global_end()
+    timeout_cb(timeout, test)
+    return False
 
+
+def wait_event_with_condition(event_queue, condition_cb, timeout, remove):
+    def find_event():
         for ev in event_queue:
             if isinstance(ev, tuple):
                 result = condition_cb(*ev)
@@ -89,14 +136,18 @@ def wait_event_with_condition(event_queue, condition_cb, timeout, remove):
                 result = condition_cb(ev)
 
             if result:
-                t.cancel()
-                if ev and remove:
-                    event_queue.remove(ev)
+                # Wrapped so that a matched falsy event still ends the wait
+                return (ev,)
+
+        return None
 
-                return ev
+    found = _wait_until(timeout, find_event)
+    if found is None:
+        timeout_cb(timeout, condition_cb)
+        return None
 
-        # TODO: Use wait() and notify() from threading.Condition
-        #  instead of sleep()
-        sleep(0.1)
+    ev = found[0]
+    if ev and remove:
+        event_queue.remove(ev)
 
-    return None
+    return ev
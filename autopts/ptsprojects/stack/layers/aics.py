@@ -13,19 +13,19 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
 class AICS:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_AICS_EV_STATE: [],
-            defs.BTP_AICS_EV_GAIN_SETTING_PROP: [],
-            defs.BTP_AICS_EV_INPUT_TYPE: [],
-            defs.BTP_AICS_EV_STATUS: [],
-            defs.BTP_AICS_EV_DESCRIPTION: [],
-            defs.BTP_AICS_EV_PROCEDURE: [],
+            defs.BTP_AICS_EV_STATE: EventQueue(),
+            defs.BTP_AICS_EV_GAIN_SETTING_PROP: EventQueue(),
+            defs.BTP_AICS_EV_INPUT_TYPE: EventQueue(),
+            defs.BTP_AICS_EV_STATUS: EventQueue(),
+            defs.BTP_AICS_EV_DESCRIPTION: EventQueue(),
+            defs.BTP_AICS_EV_PROCEDURE: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
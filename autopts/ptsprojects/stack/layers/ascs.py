@@ -13,18 +13,18 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
 class ASCS:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_ASCS_EV_OPERATION_COMPLETED: [],
-            defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED: [],
-            defs.BTP_ASCS_EV_ASE_STATE_CHANGED: [],
-            defs.BTP_ASCS_EV_CIS_CONNECTED: [],
-            defs.BTP_ASCS_EV_CIS_DISCONNECTED: [],
+            defs.BTP_ASCS_EV_OPERATION_COMPLETED: EventQueue(),
+            defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED: EventQueue(),
+            defs.BTP_ASCS_EV_ASE_STATE_CHANGED: EventQueue(),
+            defs.BTP_ASCS_EV_CIS_CONNECTED: EventQueue(),
+            defs.BTP_ASCS_EV_CIS_DISCONNECTED: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
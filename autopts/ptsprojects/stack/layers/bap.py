@@ -13,7 +13,7 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import WildCard, wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, WildCard, wait_event_with_condition
 from autopts.pybtp import defs
 
 
@@ -30,17 +30,17 @@ class BAP:
         self.broadcast_code = ''
         self.hdl_wid_114_cnt = 0
         self.event_queues = {
-            defs.BTP_BAP_EV_DISCOVERY_COMPLETED: [],
-            defs.BTP_BAP_EV_CODEC_CAP_FOUND: [],
-            defs.BTP_BAP_EV_ASE_FOUND: [],
-            defs.BTP_BAP_EV_STREAM_RECEIVED: [],
-            defs.BTP_BAP_EV_BAA_FOUND: [],
-            defs.BTP_BAP_EV_BIS_FOUND: [],
-            defs.BTP_BAP_EV_BIS_SYNCED: [],
-            defs.BTP_BAP_EV_BIS_STREAM_RECEIVED: [],
-            defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND: [],
-            defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE: [],
-            defs.BTP_BAP_EV_PA_SYNC_REQ: [],
+            defs.BTP_BAP_EV_DISCOVERY_COMPLETED: EventQueue(),
+            defs.BTP_BAP_EV_CODEC_CAP_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_ASE_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_STREAM_RECEIVED: EventQueue(),
+            defs.BTP_BAP_EV_BAA_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_BIS_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_BIS_SYNCED: EventQueue(),
+            defs.BTP_BAP_EV_BIS_STREAM_RECEIVED: EventQueue(),
+            defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE: EventQueue(),
+            defs.BTP_BAP_EV_PA_SYNC_REQ: EventQueue(),
         }
         self.event_handlers = {
             defs.BTP_BAP_EV_DISCOVERY_COMPLETED: self._ev_discovery_completed,
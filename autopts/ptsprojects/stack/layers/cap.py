@@ -12,16 +12,16 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
 class CAP:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_CAP_EV_DISCOVERY_COMPLETED: [],
-            defs.BTP_CAP_EV_UNICAST_START_COMPLETED: [],
-            defs.BTP_CAP_EV_UNICAST_STOP_COMPLETED: [],
+            defs.BTP_CAP_EV_DISCOVERY_COMPLETED: EventQueue(),
+            defs.BTP_CAP_EV_UNICAST_START_COMPLETED: EventQueue(),
+            defs.BTP_CAP_EV_UNICAST_STOP_COMPLETED: EventQueue(),
         }
 
         self.local_broadcast_id = 0x123456
@@ -15,7 +15,7 @@
 #
 import copy
 
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
@@ -24,11 +24,11 @@ class CCP:
         self.events = {
             defs.BTP_CCP_EV_DISCOVERED:  {'count': 0, 'status': 0, 'tbs_count': 0, 'gtbs': False},
             defs.BTP_CCP_EV_CALL_STATES: {'count': 0, 'status': 0, 'index': 0, 'call_count': 0, 'states': []},
-            defs.BTP_CCP_EV_CHRC_HANDLES: [],
-            defs.BTP_CCP_EV_CHRC_VAL: [],
-            defs.BTP_CCP_EV_CHRC_STR: [],
-            defs.BTP_CCP_EV_CP: [],
-            defs.BTP_CCP_EV_CURRENT_CALLS: [],
+            defs.BTP_CCP_EV_CHRC_HANDLES: EventQueue(),
+            defs.BTP_CCP_EV_CHRC_VAL: EventQueue(),
+            defs.BTP_CCP_EV_CHRC_STR: EventQueue(),
+            defs.BTP_CCP_EV_CP: EventQueue(),
+            defs.BTP_CCP_EV_CURRENT_CALLS: EventQueue(),
         }
 
     def event_received(self, event_type, event_dict):
@@ -14,7 +14,11 @@
 # more details.
 #
 import logging
-from threading import Event
+from threading import Event, Lock
+
+# Permission bits of attributes that can be read or written without
+# any security requirements, see Perm in pybtp/types.py
+PERM_NO_SECURITY = 0x03
 
 
 class GattAttribute:
@@ -84,6 +88,69 @@ class Gatt:
         self.signed_write_handle = 0
         self.value_len = 0
 
+        # Snapshot of the IUT server database read by gatt_server_fetch_db.
+        # snapshot_attrs maps handles to (perm, type_uuid) from gatts_get_attrs.
+        # snapshot_dirty maps handles to read again to their invalidation count.
+        self.snapshot = None
+        self.snapshot_attrs = None
+        self.snapshot_dirty = {}
+        self.snapshot_generation = 0
+        self.snapshot_lock = Lock()
+
+    def snapshot_get(self):
+        """Returns cached snapshot, its attributes, handles to refresh and generation
+
+        The handles stay dirty until the caller has refreshed them and
+        stored the result with snapshot_store.
+        """
+        with self.snapshot_lock:
+            return self.snapshot, self.snapshot_attrs, dict(self.snapshot_dirty), self.snapshot_generation
+
+    def snapshot_store(self, db, attrs, generation, refreshed):
+        """Cache the database read with the snapshot of the generation
+
+        refreshed -- dirty handles returned by snapshot_get, read again
+        """
+        with self.snapshot_lock:
+            # Discard if the whole database was invalidated in the meantime
+            if generation != self.snapshot_generation:
+                return
+
+            self.snapshot = db
+            self.snapshot_attrs = attrs
+
+            for handle, count in refreshed.items():
+                # Keep the ones invalidated again while being read
+                if self.snapshot_dirty.get(handle) == count:
+                    del self.snapshot_dirty[handle]
+
+    def _snapshot_mark_dirty(self, handle):
+        self.snapshot_dirty[handle] = self.snapshot_dirty.get(handle, 0) + 1
+
+    def snapshot_invalidate(self, handle=None):
+        """Mark an attribute of the snapshot to be read again, all if handle is None"""
+        with self.snapshot_lock:
+            if handle is None:
+                self.snapshot = None
+                self.snapshot_attrs = None
+                self.snapshot_dirty = {}
+                self.snapshot_generation += 1
+            elif self.snapshot is not None:
+                self._snapshot_mark_dirty(handle)
+
+    def snapshot_invalidate_secured(self):
+        """Mark attributes with security requirements to be read again
+
+        Read response of these depends on the security of the connection.
+        """
+        with self.snapshot_lock:
+            if self.snapshot_attrs is None:
+                return
+
+            for handle, (perm, _) in self.snapshot_attrs.items():
+                if perm & ~PERM_NO_SECURITY:
+                    self._snapshot_mark_dirty(handle)
+
     def attr_value_set(self, handle, value):
         attr = self.server_db.attr_lookup_handle(handle)
         if attr:
@@ -13,14 +13,14 @@
 # more details.
 #
 
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
 class GTBS:
     def __init__(self):
         self.event_queues = {
-            defs.GTBS_EV_DISCOVERY_COMPLETED: [],
+            defs.GTBS_EV_DISCOVERY_COMPLETED: EventQueue(),
         }
 
     def event_received(self, event_type, event_data):
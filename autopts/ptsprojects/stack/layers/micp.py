@@ -13,15 +13,15 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
 class MICP:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_MICP_EV_DISCOVERED: [],
-            defs.BTP_MICP_EV_MUTE_STATE: [],
+            defs.BTP_MICP_EV_DISCOVERED: EventQueue(),
+            defs.BTP_MICP_EV_MUTE_STATE: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
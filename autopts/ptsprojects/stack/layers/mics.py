@@ -13,7 +13,7 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
@@ -21,7 +21,7 @@ class MICS:
     def __init__(self):
         self.mute_state = None
         self.event_queues = {
-            defs.BTP_MICS_EV_MUTE_STATE: [],
+            defs.BTP_MICS_EV_MUTE_STATE: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
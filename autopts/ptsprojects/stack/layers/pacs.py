@@ -13,14 +13,14 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_event_with_condition
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
 from autopts.pybtp import defs
 
 
 class PACS:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_PACS_EV_CHARACTERISTIC_SUBSCRIBED: [],
+            defs.BTP_PACS_EV_CHARACTERISTIC_SUBSCRIBED: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
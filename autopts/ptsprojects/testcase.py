@@ -18,6 +18,7 @@
 import datetime
 import errno
 import logging
+import math
 import os
 import queue
 import re
@@ -25,8 +26,9 @@ import shlex
 import subprocess
 import sys
 import time
+from collections import deque
 
-from autopts.utils import get_global_end
+from autopts.utils import WaitCondition, get_global_end
 
 from . import ptstypes
 from .stack import get_stack
@@ -34,6 +36,9 @@ from .utils import exec_iut_cmd
 
 log = logging.debug
 
+# Notified at every test case state change
+TEST_CASE_STATE_COND = WaitCondition()
+
 
 class ResponseWithPostWID:
     def __init__(self, response, next_steps):
@@ -288,6 +293,30 @@ def is_cleanup_func(func):
     return isinstance(func, TestFuncCleanUp)
 
 
+class TestFuncStart(TestFunc):
+    """Start function that can be run ahead of the test case, while the
+    previous one finishes, see TestCase.prestart. Undone by the clean-up
+    functions."""
+
+
+def is_start_func(func):
+    """Returns True if func is an instance of TestFuncStart"""
+    return isinstance(func, TestFuncStart)
+
+
+# Time to allow the device to settle down after a test case, see
+# TestCase.post_run. Configured with --settle_time.
+SETTLE_TIME = 3
+_settle_time = SETTLE_TIME
+
+
+def configure_settle(settle_time=SETTLE_TIME):
+    """Set the time to wait after the clean-up of a test case"""
+    global _settle_time
+
+    _settle_time = settle_time
+
+
 class AbstractMethodException(Exception):
     """Exception raised if an abstract method is called."""
 
@@ -411,7 +440,16 @@ class TestCase(PTSCallback):
         self.ok_cancel_wids = ok_cancel_wids
         self.generic_wid_hdl = generic_wid_hdl
         self.steps_queue = None
+        # Called after a step is queued, to wake up the thread running steps
+        self.on_step_queued = None
+        # Called after the clean-up functions have run in post_run
+        self.on_cleanup_done = None
+        # Start functions have been run by prestart
+        self.prestarted = False
         self.post_wid_queue = None
+        self.wid_queued_times = None
+        self.wid_turnarounds = None
+        self.pending_wid = None
         self.ptsproject_name = ptsproject_name
         self.tc_subproc = None
         self.lf_subproc = None
@@ -425,10 +463,24 @@ class TestCase(PTSCallback):
 
     def reset(self):
         # Fields that have to be reinit before retrying a test case
+        self.prestarted = False
         self.status = "init"
         self.state = None
         self.steps_queue = queue.Queue()
         self.post_wid_queue = []
+        self.wid_queued_times = deque()
+        self.wid_turnarounds = []
+        self.pending_wid = None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        with TEST_CASE_STATE_COND:
+            self._state = state
+            TEST_CASE_STATE_COND.notify()
 
     def __str__(self):
         """Returns string representation"""
@@ -652,6 +704,7 @@ class TestCase(PTSCallback):
                          style):
         """Callback called by PTS via xmlrpc proxy"""
 
+        self.wid_queued_times.append(time.monotonic())
         self.add_next_step(self.run_wid, project_name, wid,
                            test_case_name, description, style)
 
@@ -662,6 +715,9 @@ class TestCase(PTSCallback):
         :param func: function to queue in the steps queue"""
         self.steps_queue.put((func, *args))
 
+        if self.on_step_queued:
+            self.on_step_queued()
+
     def run_next_step(self):
         try:
             item = self.steps_queue.get(block=False)
@@ -678,6 +734,9 @@ class TestCase(PTSCallback):
          PTSControl.IPTSImplicitSendCallbackEx.OnImplicitSend"""
         log("%s %s", self, self.on_implicit_send.__name__)
 
+        if self.wid_queued_times:
+            self.pending_wid = (wid, self.wid_queued_times.popleft())
+
         if self.iut_count > 1 and "For IUT2" in description:
             self.get_iut().select_iut(1)
 
@@ -722,6 +781,28 @@ class TestCase(PTSCallback):
         log("Sending response %r to wid %d test case %s", my_response, wid, test_case_name)
         return my_response
 
+    def wid_response_sent(self):
+        """Record turnaround of the WID, from OnImplicitSend to response sent"""
+        if self.pending_wid is None:
+            return
+
+        wid, queued_time = self.pending_wid
+        self.pending_wid = None
+
+        turnaround = time.monotonic() - queued_time
+        self.wid_turnarounds.append(turnaround)
+        log("WID %d turnaround %.1f ms", wid, turnaround * 1e3)
+
+    def log_wid_turnarounds(self):
+        if not self.wid_turnarounds:
+            return
+
+        turnarounds = sorted(self.wid_turnarounds)
+        p95 = turnarounds[math.ceil(len(turnarounds) * 0.95) - 1]
+        log("%s WID turnaround: count %d, mean %.1f ms, p95 %.1f ms, max %.1f ms",
+            self, len(turnarounds), sum(turnarounds) / len(turnarounds) * 1e3,
+            p95 * 1e3, turnarounds[-1] * 1e3)
+
     def pre_run(self):
         """Method called before test case is run in PTS"""
         log(f"{self.pre_run.__name__} {self.project_name} {self.name}")
@@ -751,13 +832,52 @@ class TestCase(PTSCallback):
                                                stdout=self.lf_subproc,
                                                stderr=self.lf_subproc)
 
+        prestarted = self.prestarted
+        self.prestarted = False
+
         # start commands that don't have start trigger (lack start_wid or
         # post_wid) and are not cleanup functions
         for cmd in self.cmds:
+            if prestarted and is_start_func(cmd):
+                continue
+
             if cmd.start_wid is None and cmd.post_wid is None and \
                not is_cleanup_func(cmd):
                 cmd.start()
 
+    def prestart(self):
+        """Runs the start functions ahead of pre_run
+
+        Returns False if the test case has no start functions.
+        """
+        start_cmds = [cmd for cmd in self.cmds if is_start_func(cmd)]
+        if not start_cmds:
+            return False
+
+        log(f"{self.prestart.__name__} {self.project_name} {self.name}")
+
+        self.prestarted = True
+        try:
+            for cmd in start_cmds:
+                cmd.start()
+        except BaseException:
+            self.rollback_prestart()
+            raise
+
+        return True
+
+    def rollback_prestart(self):
+        """Undoes prestart with the clean-up functions"""
+        if not self.prestarted:
+            return
+
+        log(f"{self.rollback_prestart.__name__} {self.project_name} {self.name}")
+
+        self.prestarted = False
+        for cmd in self.cmds:
+            if is_cleanup_func(cmd):
+                cmd.start()
+
     def post_run(self, error_code):
         """Method called after test case is run in PTS
 
@@ -776,12 +896,15 @@ class TestCase(PTSCallback):
             if is_cleanup_func(cmd):
                 cmd.start()
 
+        if self.on_cleanup_done:
+            self.on_cleanup_done()
+
         # in accordance with PTSControlClient.cpp:
         # // Allow device to settle down
         # Sleep(3000);
         # otherwise 4th test case just blocks eternally
         if not get_global_end():
-            time.sleep(3)
+            time.sleep(_settle_time)
 
         for cmd in self.cmds:
             cmd.stop()
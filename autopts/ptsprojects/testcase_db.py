@@ -1,109 +1,198 @@
+import json
+import math
 import sqlite3
+import threading
+from collections import namedtuple
 
 DATABASE_FILE = 'TestCase.db'
 
+# Number of the most recent durations kept per test case for percentiles
+RECENT_DURATIONS_MAX = 50
 
-class TestCaseTable:
-    def __init__(self, name, database_file=DATABASE_FILE):
-        self.database_file = database_file
-        self._open()
-        self.name = name
+# Max number of host parameters in a single query, the SQLite default limit
+# of older versions is 999
+QUERY_CHUNK_SIZE = 500
+
+# Per test case superguard timeout derived from the duration statistics
+SUPERGUARD_MIN_SAMPLES = 5
+SUPERGUARD_P95_FACTOR = 3
+SUPERGUARD_MIN_TIMEOUT = 120
+
+# Columns added to tables created by older versions
+_EXTRA_COLUMNS = {
+    'm2': 'REAL',
+    'p50': 'REAL',
+    'p95': 'REAL',
+    'recent': 'TEXT',
+}
 
-        self.cursor.execute(
-            f"CREATE TABLE IF NOT EXISTS {self.name} (name TEXT, duration REAL, "
-            "count INTEGER, result TEXT);")
-        self.conn.commit()
+TestCaseStats = namedtuple('TestCaseStats', 'mean variance p50 p95 count result')
 
-        self._close()
 
-    def _open(self):
-        self.conn = sqlite3.connect(self.database_file)
-        self.cursor = self.conn.cursor()
+def _percentile(sorted_samples, percent):
+    """Nearest-rank percentile of an ascending list"""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
 
-    def _close(self):
-        self.cursor.close()
-        self.conn.close()
+
+class TestCaseTable:
+    """Duration statistics and the last result of test cases
+
+    The connection is kept open for the lifetime of the object. The table
+    has one row per test case with a running mean and variance (Welford)
+    of all durations, and p50/p95 of the RECENT_DURATIONS_MAX most recent
+    ones.
+    """
+
+    def __init__(self, name, database_file=DATABASE_FILE):
+        self.database_file = database_file
+        self.name = name
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.database_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} (name TEXT, duration REAL, "
+                "count INTEGER, result TEXT, m2 REAL, p50 REAL, p95 REAL, recent TEXT);")
+            self._migrate()
+            self.conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {self.name}_name_idx "
+                f"ON {self.name} (name);")
+
+    def _migrate(self):
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({self.name});")}
+        for column, column_type in _EXTRA_COLUMNS.items():
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE {self.name} ADD COLUMN {column} {column_type};")
+
+        # Older versions could insert the same test case more than once,
+        # keep the row with the most runs.
+        self.conn.execute(
+            f"DELETE FROM {self.name} WHERE rowid NOT IN ("
+            f"SELECT (SELECT rowid FROM {self.name} AS t2 WHERE t2.name = t1.name "
+            "ORDER BY count DESC, rowid DESC LIMIT 1) "
+            f"FROM {self.name} AS t1 GROUP BY name);")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
 
     def update_statistics(self, test_case_name, duration, result):
-        self._open()
-
-        self.cursor.execute(
-            f"SELECT duration, count FROM {self.name} "
-            "WHERE name=:name;", {"name": test_case_name})
-        row = self.cursor.fetchall()
-        if len(row) == 0:
-            self.cursor.execute(
-                f"INSERT INTO {self.name} VALUES(?, ?, ?, ?);",
-                (test_case_name, duration, 1, result))
-            self.conn.commit()
-            self._close()
-            return
-
-        (mean, count) = row[0]
-        if not count:
-            count = 0
-            mean = 0
-
-        count += 1
-        mean += (duration - mean) // count
-
-        self.cursor.execute(
-            f"UPDATE {self.name} SET duration=:duration, count=:count, result=:result "
-            "WHERE name=:name", {"duration": mean,
-                                                   "count": count,
-                                                   "name": test_case_name,
-                                                   "result": result})
-        self.conn.commit()
-        self._close()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                f"SELECT duration, count, m2, recent FROM {self.name} "
+                "WHERE name=:name;", {"name": test_case_name}).fetchone()
+
+            mean, count, m2, recent = row if row else (0, 0, 0, None)
+            if not count:
+                mean, count = 0, 0
+
+            # Rows of older versions have no variance recorded, it is
+            # accumulated from the next run on.
+            m2 = m2 or 0
+
+            count += 1
+            delta = duration - mean
+            mean += delta / count
+            m2 += delta * (duration - mean)
+
+            recent = json.loads(recent) if recent else []
+            recent.append(duration)
+            recent = recent[-RECENT_DURATIONS_MAX:]
+            sorted_recent = sorted(recent)
+
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.name} "
+                "(name, duration, count, result, m2, p50, p95, recent) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?, ?);",
+                (test_case_name, mean, count, result, m2,
+                 _percentile(sorted_recent, 50), _percentile(sorted_recent, 95),
+                 json.dumps(recent)))
+
+    def get_statistics(self, test_case_names):
+        """Return {name: TestCaseStats} of the test cases present in the table"""
+        names = list(test_case_names)
+        stats = {}
+
+        with self.lock:
+            for i in range(0, len(names), QUERY_CHUNK_SIZE):
+                chunk = names[i:i + QUERY_CHUNK_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT name, duration, count, result, m2, p50, p95 FROM {self.name} "
+                    f"WHERE name IN ({', '.join('?' * len(chunk))});", chunk)
+
+                for name, mean, count, result, m2, p50, p95 in rows:
+                    variance = None
+                    if m2 is not None and count and count > 1:
+                        variance = m2 / (count - 1)
+
+                    stats[name] = TestCaseStats(mean, variance, p50, p95, count, result)
+
+        return stats
 
     def get_mean_duration(self, test_case_name):
-        self._open()
+        stats = self.get_statistics([test_case_name]).get(test_case_name)
+        if stats is not None:
+            return stats.mean
 
-        self.cursor.execute(
-            f"SELECT duration FROM {self.name} "
-            "WHERE name=:name;", {"name": test_case_name})
-        row = self.cursor.fetchone()
-        self._close()
+        return None
 
-        if row is not None:
-            return row[0]
+    def get_result(self, test_case_name):
+        stats = self.get_statistics([test_case_name]).get(test_case_name)
+        if stats is not None:
+            return stats.result
 
         return None
 
-    def get_result(self, test_case_name):
-        self._open()
+    def get_superguard_timeout(self, test_case_name, max_timeout=0):
+        """Return superguard timeout in seconds derived from recent durations
 
-        self.cursor.execute(
-            f"SELECT result FROM {self.name} "
-            "WHERE name=:name", {"name": test_case_name})
-        row = self.cursor.fetchone()
-        self._close()
+        Returns max_timeout if there are not enough runs recorded. The
+        derived timeout is capped at max_timeout, so 0 keeps the superguard
+        disabled.
+        """
+        if not max_timeout:
+            return 0
 
-        if row is not None:
-            return row[0]
+        stats = self.get_statistics([test_case_name]).get(test_case_name)
+        if stats is None or stats.p95 is None or stats.count < SUPERGUARD_MIN_SAMPLES:
+            return max_timeout
 
-        return None
+        return min(max(stats.p95 * SUPERGUARD_P95_FACTOR, SUPERGUARD_MIN_TIMEOUT), max_timeout)
 
-    def estimate_session_duration(self, test_cases_names, run_count_max):
+    def estimate_session_duration(self, test_cases_names, run_count_max, percentile=None):
+        """Estimate duration of a session in seconds
+
+        percentile - None to sum mean durations, 50 or 95 to sum p50 or p95
+                     of recent durations, e.g. 95 for a pessimistic estimate
+        """
         duration = 0
         count_unknown = 0
         num_test_cases = len(test_cases_names)
+        stats = self.get_statistics(test_cases_names)
 
         for test_case_name in test_cases_names:
+            tc_stats = stats.get(test_case_name)
+            if tc_stats is None or tc_stats.mean is None:
+                count_unknown += 1
+                continue
+
             expected_run_count = 1
 
             # Assume worst case scenario
-            last_result = self.get_result(test_case_name)
-            if last_result and last_result != 'PASS':
+            if tc_stats.result and tc_stats.result != 'PASS':
                 expected_run_count = run_count_max
 
-            mean_time = self.get_mean_duration(test_case_name)
-            if mean_time is None:
-                count_unknown += 1
-            else:
-                duration += mean_time * expected_run_count
+            tc_duration = tc_stats.mean
+            if percentile == 50 and tc_stats.p50 is not None:
+                tc_duration = tc_stats.p50
+            elif percentile == 95 and tc_stats.p95 is not None:
+                tc_duration = tc_stats.p95
+
+            duration += tc_duration * expected_run_count
 
         if (num_test_cases - count_unknown) != 0:
-            duration += count_unknown * duration // (num_test_cases - count_unknown)
+            duration += count_unknown * duration / (num_test_cases - count_unknown)
 
         return duration
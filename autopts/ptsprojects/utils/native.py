@@ -25,20 +25,26 @@ class NativeIUT:
     def __init__(self):
         self._native_process = None
         self._log_file = None
+        self.log_path = None
 
-    def start(self, native_cmd, log_dir):
+    def start(self, native_cmd, log_dir, cwd=None):
         try:
-            self._log_file = open(os.path.join(log_dir, "native-iut.log"), "a")
+            self.log_path = os.path.join(log_dir, "native-iut.log")
+            self._log_file = open(self.log_path, "a")
 
             log(f"Starting native process: {native_cmd}")
             self._native_process = subprocess.Popen(shlex.split(native_cmd),
                                                     shell=False,
                                                     stdout=self._log_file,
-                                                    stderr=self._log_file)
+                                                    stderr=self._log_file,
+                                                    cwd=cwd)
         except Exception:
             self.close()
             raise
 
+    def is_running(self):
+        return self._native_process is not None and self._native_process.poll() is None
+
     def close(self):
         if self._native_process and self._native_process.poll() is None:
             self._native_process.terminate()
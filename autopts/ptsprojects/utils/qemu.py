@@ -13,15 +13,22 @@
 # more details.
 #
 
+import glob
+import hashlib
+import json
 import logging
 import os
 import pty
 import shlex
+import socket
 import subprocess
 from time import sleep, time
 
 log = logging.debug
 
+# Max time to save or restore the VM state
+SNAPSHOT_TIMEOUT = 30
+
 
 class QEMU:
     def __init__(self):
@@ -51,6 +58,10 @@ class QEMU:
         )
         os.close(slave_fd)
 
+        if not boot_log:
+            # Restored from a snapshot, nothing is printed at boot
+            return
+
         boot_detected = False
         start_time = time()
 
@@ -102,3 +113,193 @@ class QEMU:
             if self._log_file:
                 self._log_file.close()
                 self._log_file = None
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class QMP:
+    """Client of the QEMU Machine Protocol"""
+
+    def __init__(self, address, timeout=SNAPSHOT_TIMEOUT):
+        self._sock = None
+        self._file = None
+        deadline = time() + timeout
+
+        while True:
+            try:
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._sock.settimeout(timeout)
+                self._sock.connect(address)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                self._sock.close()
+                if time() > deadline:
+                    raise
+                sleep(0.05)
+
+        self._file = self._sock.makefile('r')
+        # Greeting
+        self._read()
+        self.execute('qmp_capabilities')
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise Exception("QMP connection closed")
+
+        return json.loads(line)
+
+    def execute(self, command, **arguments):
+        request = {'execute': command}
+        if arguments:
+            request['arguments'] = arguments
+
+        self._sock.sendall(json.dumps(request).encode() + b'\n')
+
+        while True:
+            response = self._read()
+            if 'error' in response:
+                raise Exception(f"QMP {command} failed: {response['error']}")
+            if 'return' in response:
+                return response['return']
+            # Asynchronous events
+
+    def wait(self, command, done, timeout=SNAPSHOT_TIMEOUT):
+        """Poll command until done(its return value) is true"""
+        deadline = time() + timeout
+
+        while True:
+            ret = self.execute(command)
+            if done(ret):
+                return ret
+            if time() > deadline:
+                raise Exception(f"QMP {command} timeout: {ret}")
+            sleep(0.01)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        if self._sock:
+            self._sock.close()
+
+
+class QemuSnapshot:
+    """VM state of a QEMU IUT saved right after its IUT ready event
+
+    The VM is saved with a migration to a file before any BTP command has
+    been sent, and is restored with -incoming instead of booting. The
+    snapshot is named after the SHA-256 of the kernel image and the QEMU
+    command, so a rebuilt image or other QEMU options make a new one.
+    """
+
+    def __init__(self, snapshot_dir, name, qmp_address):
+        self.snapshot_dir = snapshot_dir
+        self.name = name
+        self.qmp_address = qmp_address
+        self.path = None
+        self.disabled = False
+        self._digest = None
+        self._image_stamp = None
+        self._image_digest = None
+
+    def _image_key(self, kernel_image, qemu_cmd):
+        stat = os.stat(kernel_image)
+        image_stamp = (stat.st_mtime_ns, stat.st_size)
+        if image_stamp != self._image_stamp:
+            self._image_digest = _file_digest(kernel_image)
+            self._image_stamp = image_stamp
+
+        return hashlib.sha256(f'{self._image_digest} {qemu_cmd}'.encode()).hexdigest()
+
+    def update(self, kernel_image, qemu_cmd):
+        """Drop the snapshots of other images or QEMU commands
+
+        Returns True if the snapshot of this image can be restored.
+        """
+        if self.disabled:
+            return False
+
+        path = os.path.join(self.snapshot_dir,
+                            f'qemu-snapshot-{self.name}-{self._image_key(kernel_image, qemu_cmd)[:16]}')
+        if path != self.path:
+            for stale in glob.glob(os.path.join(self.snapshot_dir, f'qemu-snapshot-{self.name}-*')):
+                if stale != path:
+                    log(f"Removing stale QEMU snapshot {stale}")
+                    os.remove(stale)
+
+            self.path = path
+            self._digest = _file_digest(path) if os.path.exists(path) else None
+
+        return self._digest is not None
+
+    def verify(self):
+        """Check that the snapshot has not changed since it was saved"""
+        if self._digest == _file_digest(self.path):
+            return True
+
+        log(f"QEMU snapshot {self.path} has changed, dropping it")
+        self.drop()
+
+        return False
+
+    def drop(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self._digest = None
+
+    def boot_cmd(self, qemu_cmd):
+        """QEMU command with the QMP socket to save a snapshot"""
+        if os.path.exists(self.qmp_address):
+            os.remove(self.qmp_address)
+
+        return f'{qemu_cmd} -qmp unix:{self.qmp_address},server=on,wait=off'
+
+    def restore_cmd(self, qemu_cmd):
+        incoming = f'exec:cat {shlex.quote(self.path)}'
+
+        return f'{self.boot_cmd(qemu_cmd)} -incoming {shlex.quote(incoming)}'
+
+    def save(self):
+        """Save the state of the VM started with boot_cmd()"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        qmp = QMP(self.qmp_address)
+
+        try:
+            qmp.execute('stop')
+            try:
+                qmp.execute('migrate', uri=f'exec:cat > {shlex.quote(tmp_path)}')
+                status = qmp.wait('query-migrate',
+                                  lambda ret: ret.get('status') in ('completed', 'failed', 'cancelled'))
+            finally:
+                qmp.execute('cont')
+        finally:
+            qmp.close()
+
+        if status['status'] != 'completed':
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise Exception(f"QEMU snapshot failed: {status}")
+
+        # Restored read only, so no test case can leave its state in it
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, self.path)
+        self._digest = _file_digest(self.path)
+
+        log(f"QEMU snapshot saved to {self.path}")
+
+    def wait_restored(self):
+        """Wait until the VM started with restore_cmd() runs"""
+        qmp = QMP(self.qmp_address)
+
+        try:
+            qmp.wait('query-status', lambda ret: ret.get('status') == 'running')
+        finally:
+            qmp.close()
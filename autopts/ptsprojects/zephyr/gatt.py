@@ -166,7 +166,8 @@ def test_cases_server(ptses):
                     TestFunc(stack.gatt_init)
     ]
 
-    init_server = [
+    # Commands only check the response status, so they are pipelined
+    init_server = [TestFunc(btp.run_batched, [
                      TestFunc(btp.gatts_add_svc, 1, UUID.SVND16_0),
 
                      TestFunc(btp.gatts_add_char, 0,
@@ -296,7 +297,7 @@ def test_cases_server(ptses):
                      TestFunc(btp.gatts_set_val, 0, Value.long_6),
 
                      TestFunc(btp.gatts_start_server)
-                     ]
+                     ])]
 
     custom_test_cases = [
         ZTestCase("GATT", "GATT/SR/GAN/BV-02-C",
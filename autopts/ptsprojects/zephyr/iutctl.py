@@ -18,6 +18,7 @@ import logging
 import os
 
 from autopts.config import AUTOPTS_ROOT_DIR
+from autopts.ptsprojects.iut_pool import close_iut_pools
 from autopts.ptsprojects.iutctl import IutCtl, IutCtlWrapper
 
 log = logging.debug
@@ -46,6 +47,9 @@ def create_zephyr_ctl_class(use_wrapper: bool):
 
 
 def get_iut():
+    if isinstance(ZEPHYR, IutCtlWrapper):
+        return ZEPHYR.handle()
+
     return ZEPHYR
 
 
@@ -73,3 +77,5 @@ def cleanup():
     if ZEPHYR:
         ZEPHYR.stop()
         ZEPHYR = None
+
+    close_iut_pools()
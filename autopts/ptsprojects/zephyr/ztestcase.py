@@ -15,7 +15,7 @@
 
 """Test case that manages Zephyr IUT"""
 
-from autopts.ptsprojects.testcase import TestCaseLT1, TestCaseLT2, TestCaseLT3, TestFunc, TestFuncCleanUp
+from autopts.ptsprojects.testcase import TestCaseLT1, TestCaseLT2, TestCaseLT3, TestFuncCleanUp, TestFuncStart
 from autopts.pybtp.btp import get_iut
 
 
@@ -27,7 +27,7 @@ class ZTestCase(TestCaseLT1):
 
         super().__init__(*args, ptsproject_name="zephyr", **kwargs)
 
-        self.cmds.insert(0, TestFunc(self._test_case_start))
+        self.cmds.insert(0, TestFuncStart(self._test_case_start))
         self.cmds.append(TestFuncCleanUp(self._test_case_cleanup))
 
     def _test_case_start(self):
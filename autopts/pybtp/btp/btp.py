@@ -21,11 +21,11 @@ import re
 import struct
 from collections import namedtuple
 
-from autopts.ptsprojects.stack import get_stack, set_get_stack_method
+from autopts.ptsprojects.stack import get_stack, notify_event_waiters, set_get_stack_method
 from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import defs
 from autopts.pybtp.common import CONTROLLER_INDEX, CONTROLLER_INDEX_NONE, reg_unreg_service, supported_svcs_cmds
-from autopts.pybtp.iutctl_common import set_event_handler
+from autopts.pybtp.iutctl_common import set_command_handler, set_event_handler
 from autopts.pybtp.types import BTPError, BTPFatalError, att_rsp_str
 
 #  get IUT global method from iutctl
@@ -363,6 +363,20 @@ def btp_hdr_check(rcv_hdr, exp_svc_id, exp_op=None):
         raise BTPError(f"Invalid opcode 0x{rcv_hdr.op:02x} in the response, expected 0x{exp_op:02x}!")
 
 
+def run_batched(funcs):
+    """Run TestFuncs with their BTP commands pipelined
+
+    To be used for setup sequences of commands that only check the
+    response status, e.g. TestFunc(btp.run_batched, init_server).
+    See BTPWorker.batch.
+    """
+    iutctl = get_iut()
+
+    with iutctl.btp_socket.batch():
+        for func in funcs:
+            func.start()
+
+
 def bd_addr_convert(bdaddr):
     """ Remove colons from address and convert to lower case """
     if isinstance(bdaddr, bytes):
@@ -680,7 +694,9 @@ def init(get_iut_method):
     global get_iut
 
     get_iut = get_iut_method
+    build_event_dispatch_table()
     set_event_handler(event_handler)
+    set_command_handler(command_handler)
 
 
 def _get_stack():
@@ -690,9 +706,18 @@ def _get_stack():
 # Omitting cyclical imports.
 set_get_stack_method(_get_stack)
 
+# (svc_id, op) -> (event callback, name of the Stack layer attribute)
+EVENT_DISPATCH_TABLE = {}
+
+
+def build_event_dispatch_table():
+    """Flatten the per service event maps into a single lookup table.
+
+    Layers are resolved by name at dispatch time, because Stack.cleanup()
+    and the *_init() methods replace layer instances between test cases.
+    """
+    global EVENT_DISPATCH_TABLE
 
-def event_handler(hdr, data):
-    logging.debug("%r %r", hdr, data)
     from .event_map import (
         AICS_EV,
         ASCS_EV,
@@ -724,48 +749,77 @@ def event_handler(hdr, data):
         VOCS_EV,
         # GENERATOR append 2
     )
-    stack = get_stack()
-    if not stack:
-        logging.info("Stack not initialized")
-        return False
 
     service_map = {
-        defs.BTP_SERVICE_ID_MESH: (MESH_EV, stack.mesh),
-        defs.BTP_SERVICE_ID_L2CAP: (L2CAP_EV, stack.l2cap),
-        defs.BTP_SERVICE_ID_GAP: (GAP_EV, stack.gap),
-        defs.BTP_SERVICE_ID_GATT: (GATT_EV, stack.gatt),
-        defs.BTP_SERVICE_ID_GATTC: (GATTC_EV, stack.gatt_cl),
-        defs.BTP_SERVICE_ID_IAS: (IAS_EV, stack.ias),
-        defs.BTP_SERVICE_ID_VCS: (VCS_EV, stack.vcs),
-        defs.BTP_SERVICE_ID_AICS: (AICS_EV, stack.aics),
-        defs.BTP_SERVICE_ID_VOCS: (VOCS_EV, stack.vocs),
-        defs.BTP_SERVICE_ID_PACS: (PACS_EV, stack.pacs),
-        defs.BTP_SERVICE_ID_ASCS: (ASCS_EV, stack.ascs),
-        defs.BTP_SERVICE_ID_BAP: (BAP_EV, stack.bap),
-        defs.BTP_SERVICE_ID_CORE: (CORE_EV, stack.core),
-        defs.BTP_SERVICE_ID_MICP: (MICP_EV, stack.micp),
-        defs.BTP_SERVICE_ID_MICS: (MICS_EV, stack.mics),
-        defs.BTP_SERVICE_ID_CCP: (CCP_EV, stack.ccp),
-        defs.BTP_SERVICE_ID_VCP: (VCP_EV, stack.vcp),
-        defs.BTP_SERVICE_ID_MCP: (MCP_EV, stack.mcp),
-        defs.BTP_SERVICE_ID_GMCS: (GMCS_EV, stack.gmcs),
-        defs.BTP_SERVICE_ID_HAP: (HAP_EV, stack.hap),
-        defs.BTP_SERVICE_ID_CAP: (CAP_EV, stack.cap),
-        defs.BTP_SERVICE_ID_CSIP: (CSIP_EV, stack.csip),
-        defs.BTP_SERVICE_ID_TBS: (TBS_EV, stack.tbs),
-        defs.BTP_SERVICE_ID_TMAP: (TMAP_EV, stack.tmap),
-        defs.BTP_SERVICE_ID_OTS: (OTS_EV, stack.ots),
-        defs.BTP_SERVICE_ID_PBP: (PBP_EV, stack.pbp),
-        defs.BTP_SERVICE_ID_SDP: (SDP_EV, stack.sdp),
-        defs.BTP_SERVICE_ID_RFCOMM: (RFCOMM_EV, stack.rfcomm),
+        defs.BTP_SERVICE_ID_MESH: (MESH_EV, 'mesh'),
+        defs.BTP_SERVICE_ID_L2CAP: (L2CAP_EV, 'l2cap'),
+        defs.BTP_SERVICE_ID_GAP: (GAP_EV, 'gap'),
+        defs.BTP_SERVICE_ID_GATT: (GATT_EV, 'gatt'),
+        defs.BTP_SERVICE_ID_GATTC: (GATTC_EV, 'gatt_cl'),
+        defs.BTP_SERVICE_ID_IAS: (IAS_EV, 'ias'),
+        defs.BTP_SERVICE_ID_VCS: (VCS_EV, 'vcs'),
+        defs.BTP_SERVICE_ID_AICS: (AICS_EV, 'aics'),
+        defs.BTP_SERVICE_ID_VOCS: (VOCS_EV, 'vocs'),
+        defs.BTP_SERVICE_ID_PACS: (PACS_EV, 'pacs'),
+        defs.BTP_SERVICE_ID_ASCS: (ASCS_EV, 'ascs'),
+        defs.BTP_SERVICE_ID_BAP: (BAP_EV, 'bap'),
+        defs.BTP_SERVICE_ID_CORE: (CORE_EV, 'core'),
+        defs.BTP_SERVICE_ID_MICP: (MICP_EV, 'micp'),
+        defs.BTP_SERVICE_ID_MICS: (MICS_EV, 'mics'),
+        defs.BTP_SERVICE_ID_CCP: (CCP_EV, 'ccp'),
+        defs.BTP_SERVICE_ID_VCP: (VCP_EV, 'vcp'),
+        defs.BTP_SERVICE_ID_MCP: (MCP_EV, 'mcp'),
+        defs.BTP_SERVICE_ID_GMCS: (GMCS_EV, 'gmcs'),
+        defs.BTP_SERVICE_ID_HAP: (HAP_EV, 'hap'),
+        defs.BTP_SERVICE_ID_CAP: (CAP_EV, 'cap'),
+        defs.BTP_SERVICE_ID_CSIP: (CSIP_EV, 'csip'),
+        defs.BTP_SERVICE_ID_TBS: (TBS_EV, 'tbs'),
+        defs.BTP_SERVICE_ID_TMAP: (TMAP_EV, 'tmap'),
+        defs.BTP_SERVICE_ID_OTS: (OTS_EV, 'ots'),
+        defs.BTP_SERVICE_ID_PBP: (PBP_EV, 'pbp'),
+        defs.BTP_SERVICE_ID_SDP: (SDP_EV, 'sdp'),
+        defs.BTP_SERVICE_ID_RFCOMM: (RFCOMM_EV, 'rfcomm'),
         # GENERATOR append 3
     }
 
-    if hdr.svc_id in service_map:
-        event_dict, stack_obj = service_map[hdr.svc_id]
-        if hdr.op in event_dict and stack_obj:
-            cb = event_dict[hdr.op]
+    EVENT_DISPATCH_TABLE = {
+        (svc_id, op): (cb, layer_name)
+        for svc_id, (event_dict, layer_name) in service_map.items()
+        for op, cb in event_dict.items()
+    }
+
+
+def command_handler(svc_id, op):
+    """Called before a BTP command is sent to the IUT
+
+    Commands of other services than GATT, e.g. of profiles, may change
+    values of the IUT GATT server database without a GATT event, so its
+    snapshot cached for wid/gatt.py gatt_server_fetch_db is invalidated.
+    GATT client commands do not change the server database.
+    """
+    if svc_id in (defs.BTP_SERVICE_ID_GATT, defs.BTP_SERVICE_ID_GATTC):
+        return
+
+    stack = get_stack()
+    if stack and stack.gatt:
+        stack.gatt.snapshot_invalidate()
+
+
+def event_handler(hdr, data):
+    logging.debug("%r %r", hdr, data)
+    stack = get_stack()
+    if not stack:
+        logging.info("Stack not initialized")
+        return False
+
+    entry = EVENT_DISPATCH_TABLE.get((hdr.svc_id, hdr.op))
+    if entry:
+        cb, layer_name = entry
+        stack_obj = getattr(stack, layer_name)
+        if stack_obj:
             cb(stack_obj, data[0], hdr.data_len)
+            # Event handlers may update any stack state, not only queues
+            notify_event_waiters()
             return True
 
     # TODO: Raise BTP error instead of logging
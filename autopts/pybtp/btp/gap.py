@@ -206,6 +206,13 @@ def gap_device_found_ev_(gap, data, data_len):
                                               eir))
 
 
+def _gatt_snapshot_invalidate_secured():
+    # Read responses of attributes with security requirements depend on the connection
+    stack = get_stack()
+    if stack.gatt:
+        stack.gatt.snapshot_invalidate_secured()
+
+
 def gap_connected_ev_(gap, data, data_len):
     logging.debug("%r", data)
 
@@ -217,6 +224,7 @@ def gap_connected_ev_(gap, data, data_len):
     gap.add_connection(addr, addr_type)
 
     gap.set_conn_params(ConnParams(itvl, itvl, latency, timeout))
+    _gatt_snapshot_invalidate_secured()
 
 
 def gap_disconnected_ev_(gap, data, data_len):
@@ -227,6 +235,7 @@ def gap_disconnected_ev_(gap, data, data_len):
     addr = le_bytes_to_hex_str(addr)
 
     gap.remove_connection(addr)
+    _gatt_snapshot_invalidate_secured()
 
 
 def gap_passkey_disp_ev_(gap, data, data_len):
@@ -304,6 +313,7 @@ def gap_sec_level_changed_ev_(gap, data, data_len):
     _addr = le_bytes_to_hex_str(_addr)
 
     gap.set_connection_sec_level(_addr, _level)
+    _gatt_snapshot_invalidate_secured()
 
     logging.debug("received %r", (_addr_t, _addr, _level))
 
@@ -500,6 +510,7 @@ def gap_encryption_change_ev_(gap, data, data_len):
     logging.debug("received %r", (_addr_t, _addr, _encrypted, _key_size))
 
     stack.gap.encryption_change_rcvd.data = (_addr_t, _addr, _encrypted, _key_size)
+    _gatt_snapshot_invalidate_secured()
 
 
 def gap_peer_car_status_ev_(gap, data, data_len):
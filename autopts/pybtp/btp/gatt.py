@@ -19,7 +19,7 @@ import binascii
 import logging
 import struct
 
-from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService
+from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService, get_stack
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import (
     CONTROLLER_INDEX,
@@ -123,6 +123,7 @@ def gatt_attr_value_changed_ev_(gatt, data, data_len):
 
     gatt.attr_value_set(handle, binascii.hexlify(value[0]))
     gatt.attr_value_set_changed(handle)
+    gatt.snapshot_invalidate(handle)
 
 
 def gatt_notification_ev_(gatt, data, data_len):
@@ -133,6 +134,16 @@ def gatt_notification_ev_(gatt, data, data_len):
     gatt.notification_ev_recv(addr_type, addr, notification_type, handle, value)
 
 
+def gatts_snapshot_invalidate(hdl=None):
+    """Invalidate cached server database read by wid/gatt.py gatt_server_fetch_db
+
+    hdl -- handle of the changed attribute, 0 or None invalidates all
+    """
+    stack = get_stack()
+    if stack.gatt:
+        stack.gatt.snapshot_invalidate(hdl or None)
+
+
 GATT_EV = {
     defs.BTP_GATT_EV_ATTR_VALUE_CHANGED: gatt_attr_value_changed_ev_,
     defs.BTP_GATT_EV_NOTIFICATION: gatt_notification_ev_,
@@ -151,6 +162,7 @@ def gatts_add_svc(svc_type, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['add_svc'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -168,6 +180,7 @@ def gatts_add_inc_svc(hdl):
     hdl_ba = struct.pack('H', hdl)
     data_ba.extend(hdl_ba)
 
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['add_inc_svc'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -200,6 +213,7 @@ def gatts_add_char(hdl, prop, perm, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['add_char'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -227,6 +241,7 @@ def gatts_set_val(hdl, val):
     data_ba.extend(val_len_ba)
     data_ba.extend(val_ba)
 
+    gatts_snapshot_invalidate(hdl)
     iutctl.btp_socket.send(*GATTS['set_val'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -254,6 +269,7 @@ def gatts_add_desc(hdl, perm, uuid):
     data_ba.extend(chr(len(uuid_ba)).encode('utf-8'))
     data_ba.extend(uuid_ba)
 
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['add_desc'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -277,6 +293,7 @@ def gatts_change_database(start_hdl, end_hdl, vis):
     data_ba.extend(end_hdl_ba)
     data_ba.extend(chr(vis).encode('utf-8'))
 
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['change_database'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -306,6 +323,7 @@ def gatts_start_server():
     logging.debug("")
 
     iutctl = get_iut()
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['start_server'])
 
     gatt_command_rsp_succ()
@@ -347,6 +365,7 @@ def remove_handle_from_db(hdl):
     hdl_ba = struct.pack('H', hdl)
     data_ba.extend(hdl_ba)
 
+    gatts_snapshot_invalidate()
     iutctl.btp_socket.send(*GATTS['remove_handle_from_db'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -367,6 +386,7 @@ def gatts_set_enc_key_size(hdl, enc_key_size):
     data_ba.extend(hdl_ba)
     data_ba.extend(chr(enc_key_size).encode('utf-8'))
 
+    gatts_snapshot_invalidate(hdl)
     iutctl.btp_socket.send(*GATTS['set_enc_key_size'], data=data_ba)
 
     gatt_command_rsp_succ()
@@ -13,22 +13,24 @@
 # more details.
 #
 
-import binascii
+import atexit
 import logging
 import os
 import queue
-import re
 import socket
+import struct
 import sys
 import threading
+import time
 from abc import abstractmethod
-from datetime import datetime
+from contextlib import contextmanager
 
 import serial
 
 from autopts.pybtp import defs
 from autopts.pybtp.parser import HDR_LEN, dec_data, dec_hdr, enc_frame, repr_hdr
-from autopts.pybtp.types import BTPError
+from autopts.pybtp.types import BTPBatchError, BTPError
+from autopts.pybtp.wirelog import DIR_CMD, DIR_RSP, WIRE_LOG_TEXT, create_wire_logs
 from autopts.utils import get_global_end, raise_on_global_end
 
 log = logging.debug
@@ -36,6 +38,23 @@ log = logging.debug
 # BTP communication transport: unix domain socket file name
 BTP_ADDRESS = "/tmp/bt-stack-tester"
 
+# Max time a BTPWorker.read may block before re-checking global end
+RX_QUEUE_WAKEUP_PERIOD = 1.0
+
+# Default max number of batched commands sent without a response. The
+# Zephyr tester drops commands that arrive when all of its (two) command
+# buffers are in use.
+BTP_BATCH_WINDOW = 2
+
+# Max time between the bytes of a BTP frame on a serial port, after which
+# the partial frame is dropped
+BTP_SERIAL_FRAME_TIMEOUT = 0.5
+
+# Services of valid BTP frame headers, used to find the next frame after
+# garbage on a serial port
+BTP_SERVICE_IDS = frozenset(value for name, value in vars(defs).items()
+                            if name.startswith('BTP_SERVICE_ID_'))
+
 EVENT_HANDLER = None
 
 
@@ -46,14 +65,29 @@ def set_event_handler(event_handler):
     EVENT_HANDLER = event_handler
 
 
+COMMAND_HANDLER = None
+
+
+def set_command_handler(command_handler):
+    """BTPWorker calls it with svc_id and op before sending a command"""
+    global COMMAND_HANDLER
+
+    COMMAND_HANDLER = command_handler
+
+
 class BTPSocket:
 
-    def __init__(self, log_dir=None, log_file="autopts-iutctl.log"):
+    def __init__(self, log_dir=None, log_file="autopts-iutctl.log", wire_log=WIRE_LOG_TEXT, iut_name=None):
         self.conn = None
         self.addr = None
-        self.btp_service_id_dict = None
-        self.log_file = open(os.path.join(log_dir, log_file), "a")
-        self.btp_service_id_dict = self.get_svc_id()
+        self.wire_logs = []
+
+        if log_dir is not None:
+            self.open_wire_logs(log_dir, log_file, wire_log, iut_name)
+
+    def open_wire_logs(self, log_dir, log_file="autopts-iutctl.log", wire_log=WIRE_LOG_TEXT, iut_name=None):
+        """Log the BTP traffic to log_dir, e.g. once a pooled IUT is handed out"""
+        self.wire_logs = create_wire_logs(os.path.join(log_dir, log_file), wire_log, iut_name)
 
     @abstractmethod
     def open(self, address):
@@ -63,48 +97,6 @@ class BTPSocket:
     def accept(self, timeout=10.0):
         pass
 
-    @staticmethod
-    def get_svc_id():
-        """Looks for BTP_SVC_ID variables from the defs.py"""
-        btp_service_ids = {}
-
-        for name, value in vars(defs).items():
-            if name.startswith('BTP_SERVICE_ID_') and isinstance(value, int):
-                trimmed_name = name.replace('BTP_SERVICE_ID_', '')
-                btp_service_ids[trimmed_name] = value
-
-        return btp_service_ids
-
-    def write_to_log(self, req, data, hex_data):
-        """Log decoded header and raw data"""
-        current_time = datetime.now().strftime('%H:%M:%S:%f')
-        f = self.log_file
-        indent = ' ' * 18
-
-        hex_data = hex_data[:14] + "|" + hex_data[14 + 1:]
-
-        if len(hex_data) > 47:
-            # This ensures clean text indentation for longer raw data, with 16 bytes per line
-            hex_data = '\n' + indent + re.sub(r'(.{48})', r'\1\n' + indent, hex_data)
-
-        if req:
-            f.write(f'{current_time[:-3]}    > {self.parse_data(data)} {hex_data}\n')
-        else:
-            f.write(f'{current_time[:-3]}    < {self.parse_data(data)} {hex_data}\n')
-
-    def write_err_status(self, data, hex_data, status):
-        """Log command status value for error response"""
-        current_time = datetime.now().strftime('%H:%M:%S:%f')
-        f = self.log_file
-        status_values = {
-            1: 'Fail',
-            2: 'Unknown Command',
-            3: 'Not Ready',
-            4: 'Invalid Index'
-        }
-        err_status = status_values[int(status)]
-        f.write(f'{current_time[:-3]}    < {self.parse_data(data, err_status)} {hex_data}\n')
-
     def read(self, timeout=20.0):
         """Read BTP data from socket
 
@@ -124,11 +116,11 @@ class BTPSocket:
             hdr_memview = hdr_memview[nbytes:]
             toread_hdr_len -= nbytes
 
-        hex_hdr = ' '.join(hdr.hex()[i:i + 2] for i in range(0, len(hdr.hex()), 2))
         tuple_hdr = dec_hdr(hdr)
         toread_data_len = tuple_hdr.data_len
 
-        logging.debug("Received: hdr: %s %r", repr_hdr(tuple_hdr), hdr)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Received: hdr: %s %r", repr_hdr(tuple_hdr), hdr)
 
         data = bytearray(toread_data_len)
         data_memview = memoryview(data)
@@ -142,16 +134,11 @@ class BTPSocket:
             data_memview = data_memview[nbytes:]
             toread_data_len -= nbytes
 
-        data_string = binascii.hexlify(data).decode('utf-8')
-        data_string = ' '.join(f'{data_string[i:i + 2]}' for i in range(0, len(data_string), 2))
-        raw_data = hex_hdr if data_string == '' else hex_hdr + ' ' + data_string
-
-        if tuple_hdr.op == 0:
-            self.write_err_status(tuple_hdr, raw_data, data_string)
-        else:
-            # 0 for logging response, 1 for command
-            self.write_to_log(0, tuple_hdr, raw_data)
-        log(f"Received data: { {data_string} }, {data}")
+        if self.wire_logs:
+            frame = hdr + data
+            for wire_log in self.wire_logs:
+                wire_log.record(DIR_RSP, frame)
+        log("Received data: %r", data)
 
         self.conn.settimeout(None)
         return tuple_hdr, dec_data(data)
@@ -159,65 +146,28 @@ class BTPSocket:
     def send(self, svc_id, op, ctrl_index, data):
         """Send BTP formated data over socket"""
         logging.debug("%r %r %r %r",
-                      svc_id, op, ctrl_index, str(data))
+                      svc_id, op, ctrl_index, data)
 
         frame = enc_frame(svc_id, op, ctrl_index, data)
 
-        logging.debug("sending frame %r", frame.hex())
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("sending frame %r", frame.hex())
 
-        hex_data = ' '.join(frame.hex()[i:i + 2] for i in range(0, len(frame.hex()), 2))
-        tuple_data = (svc_id, op, ctrl_index, len(data) if isinstance(data, (str, bytearray)) else data)
-        # 0 for logging response, 1 for command
-        self.write_to_log(1, tuple_data, hex_data)
+        for wire_log in self.wire_logs:
+            wire_log.record(DIR_CMD, frame)
         self.conn.send(frame)
 
-    def parse_data(self, data, extra=None):
-        def get_btp_cmd_name(prefix, op_code):
-            """Looks for BTP Command variables from the defs.py"""
-            if op_code in ('0x0', '0x00'):
-                return 'BTP_ERROR'
-            for key, value in vars(defs).items():
-                if (key.startswith(f'BTP_{prefix}_CMD_') and value == int(op_code, 16)) or\
-                        (key.startswith(f'BTP_{prefix}_EV_') and value == int(op_code, 16)):
-                    return key
-
-            return 'BTP Undecoded'  # Return if no matching variable is found
-
-        parsed_data = ''
-        svc_name = ''
-        if isinstance(data, str):
-            svc_id = data[:2]
-            opc = data[2:4]
-        else:
-            svc_id, opc, ctrl_idx, data_len = data[0], data[1], data[2], data[3]
-        for name, btp_id in self.btp_service_id_dict.items():
-            if btp_id == int(svc_id):
-                svc_name += name
-                break
-
-        indent = "\n" + (" " * 17)
-
-        def to_hex(x):
-            return f"0x{int(x):02x}"
-        btp_command = get_btp_cmd_name(svc_name, to_hex(opc))
-        parsed_data += f'{btp_command} ({to_hex(svc_id)}|{to_hex(opc)}|{to_hex(ctrl_idx)})'
-        if extra:
-            parsed_data += f' {extra}'
-        parsed_data += f'{indent} raw data ({data_len}):'
-
-        return parsed_data
-
     @abstractmethod
     def close(self):
-        self.log_file.close()
-        self.log_file = None
-        pass
+        for wire_log in self.wire_logs:
+            wire_log.close()
+        self.wire_logs = []
 
 
 class BTPSocketSrv(BTPSocket):
 
-    def __init__(self, log_dir=None, log_file="autopts-iutctl.log"):
-        super().__init__(log_dir, log_file)
+    def __init__(self, log_dir=None, log_file="autopts-iutctl.log", wire_log=WIRE_LOG_TEXT, iut_name=None):
+        super().__init__(log_dir, log_file, wire_log, iut_name)
         self.sock = None
 
     def open(self, addres=BTP_ADDRESS, port=0):
@@ -269,6 +219,7 @@ class BTPSocketCli(BTPSocket):
         self.conn.connect(self.addr)
 
     def close(self):
+        super().close()
         try:
             if self.conn:
                 self.conn.shutdown(socket.SHUT_RDWR)
@@ -280,6 +231,139 @@ class BTPSocketCli(BTPSocket):
             self.addr = None
 
 
+class BTPSerial(BTPSocket):
+    """BTP over a serial port, kept open between the test cases
+
+    A frame header is valid if its service is known, its controller index
+    is 0 or BTP_INDEX_NONE and its data fits in BTP_MTU. On an invalid
+    header, or a frame not completed within BTP_SERIAL_FRAME_TIMEOUT, the
+    first byte is dropped and the next header is looked for.
+
+    close() only closes the wire logs of a test case, close_port() closes
+    the port.
+    """
+
+    def __init__(self, log_dir=None, log_file="autopts-iutctl.log", wire_log=WIRE_LOG_TEXT, iut_name=None):
+        super().__init__(log_dir, log_file, wire_log, iut_name)
+        self._rx_buf = bytearray()
+        self._rx_time = 0
+
+    def open(self, port, baudrate=115200, rtscts=False):
+        self.addr = port
+        self.conn = serial.Serial(port=port, baudrate=baudrate, rtscts=rtscts, timeout=0)
+
+    def accept(self, timeout=10.0):
+        # Opened in open()
+        pass
+
+    def flush(self):
+        """Drop the bytes received so far, e.g. between the test cases"""
+        self.conn.reset_input_buffer()
+        self._rx_buf.clear()
+
+    def _resync(self, reason):
+        log("BTP serial resync, %s: dropping 0x%02x", reason, self._rx_buf[0])
+        del self._rx_buf[0]
+
+    def _frame_len(self):
+        """Length of the frame at the start of the buffer, None if unknown yet"""
+        while len(self._rx_buf) >= HDR_LEN:
+            tuple_hdr = dec_hdr(self._rx_buf[:HDR_LEN])
+
+            if tuple_hdr.svc_id in BTP_SERVICE_IDS and \
+                    tuple_hdr.ctrl_index in (0, defs.BTP_INDEX_NONE) and \
+                    tuple_hdr.data_len <= defs.BTP_MTU:
+                return HDR_LEN + tuple_hdr.data_len
+
+            self._resync("invalid header")
+
+        return None
+
+    def read(self, timeout=20.0):
+        """Read a BTP frame from the serial port
+
+        timeout - read timeout in seconds"""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            frame_len = self._frame_len()
+            if frame_len is not None and len(self._rx_buf) >= frame_len:
+                break
+
+            now = time.monotonic()
+            if self._rx_buf and now - self._rx_time > BTP_SERIAL_FRAME_TIMEOUT:
+                self._resync("frame timeout")
+                continue
+
+            if now >= deadline:
+                raise TimeoutError
+
+            wait_until = deadline
+            if self._rx_buf:
+                wait_until = min(deadline, self._rx_time + BTP_SERIAL_FRAME_TIMEOUT)
+
+            self.conn.timeout = max(wait_until - now, 0)
+            data = self.conn.read(max(self.conn.in_waiting, 1))
+            if data:
+                self._rx_buf += data
+                self._rx_time = time.monotonic()
+
+        frame = bytes(self._rx_buf[:frame_len])
+        del self._rx_buf[:frame_len]
+
+        tuple_hdr = dec_hdr(frame[:HDR_LEN])
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Received: hdr: %s %r", repr_hdr(tuple_hdr), frame[:HDR_LEN])
+
+        for wire_log in self.wire_logs:
+            wire_log.record(DIR_RSP, frame)
+
+        return tuple_hdr, dec_data(frame[HDR_LEN:])
+
+    def send(self, svc_id, op, ctrl_index, data):
+        """Send BTP formated data over the serial port"""
+        frame = enc_frame(svc_id, op, ctrl_index, data)
+
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("sending frame %r", frame.hex())
+
+        for wire_log in self.wire_logs:
+            wire_log.record(DIR_CMD, frame)
+        self.conn.write(frame)
+
+    def close_port(self):
+        super().close()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+
+_btp_serials = {}
+
+
+def get_btp_serial(port, baudrate, rtscts):
+    """Return the BTPSerial of a port, opened on first use"""
+    btp_serial = _btp_serials.get(port)
+
+    if btp_serial and (btp_serial.conn.baudrate, btp_serial.conn.rtscts) != (baudrate, rtscts):
+        btp_serial.close_port()
+        btp_serial = None
+
+    if btp_serial is None:
+        btp_serial = BTPSerial()
+        btp_serial.open(port, baudrate, rtscts)
+        _btp_serials[port] = btp_serial
+
+    return btp_serial
+
+
+@atexit.register
+def close_btp_serials():
+    while _btp_serials:
+        _, btp_serial = _btp_serials.popitem()
+        btp_serial.close_port()
+
+
 class BTPWorker:
     def __init__(self, sock, iut_name=None):
         super().__init__()
@@ -290,6 +374,11 @@ class BTPWorker:
         self._running = threading.Event()
         self._lock = threading.Lock()
 
+        # Commands recorded by batch() and the thread recording them
+        self._batch = None
+        self._batch_owner = None
+        self._batch_unread = 0
+
         self._rx_worker = threading.Thread(target=self._rx_task)
         self._rx_worker.name = f'BTPWorker{self._rx_worker.name}'
 
@@ -331,35 +420,44 @@ class BTPWorker:
 
         log(f'{threading.current_thread().name} finishing...')
 
-    @staticmethod
-    def _read_timeout(flag):
-        flag.clear()
+    def _is_batching(self):
+        return self._batch is not None and self._batch_owner == threading.get_ident()
 
     def read(self, timeout=20.0):
         logging.debug("")
 
-        flag = threading.Event()
-        flag.set()
+        if self._is_batching():
+            return self._read_batched()
 
-        t = threading.Timer(timeout, self._read_timeout, [flag])
-        t.start()
+        deadline = time.monotonic() + timeout
 
-        while flag.is_set():
+        while True:
             raise_on_global_end()
 
-            if self._rx_queue.empty():
-                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
 
-            t.cancel()
+            # Block until a frame arrives, but wake up periodically
+            # to stay Ctrl+C friendly.
+            try:
+                data = self._rx_queue.get(timeout=min(remaining, RX_QUEUE_WAKEUP_PERIOD))
+            except queue.Empty:
+                continue
 
-            data = self._rx_queue.get()
             self._rx_queue.task_done()
 
             return data
 
-        raise TimeoutError
-
     def send(self, svc_id, op, ctrl_index, data):
+        if COMMAND_HANDLER:
+            COMMAND_HANDLER(svc_id, op)
+
+        if self._is_batching():
+            self._batch.append((svc_id, op, ctrl_index, data))
+            self._batch_unread += 1
+            return
+
         self._lock.acquire()
         try:
             self._socket.send(svc_id, op, ctrl_index, data)
@@ -367,28 +465,112 @@ class BTPWorker:
             self._lock.release()
 
     def send_wait_rsp(self, svc_id, op, ctrl_index, data):
+        if COMMAND_HANDLER:
+            COMMAND_HANDLER(svc_id, op)
+
+        if self._is_batching():
+            self._batch.append((svc_id, op, ctrl_index, data))
+            return (b'',)
+
         self._lock.acquire()
         try:
             self._socket.send(svc_id, op, ctrl_index, data)
             tuple_hdr, tuple_data = self.read()
-
-            if tuple_hdr.svc_id != svc_id:
-                raise BTPError(
-                    f"Incorrect service ID {tuple_hdr.svc_id} in the response, expected {svc_id}!"
-                )
-
-            if tuple_hdr.op == defs.BTP_STATUS:
-                raise BTPError("Error opcode in response!")
-
-            if op != tuple_hdr.op:
-                raise BTPError(
-                    f"Invalid opcode 0x{tuple_hdr.op:02x} in the response, expected 0x{op:02x}!"
-                )
+            self._check_rsp(tuple_hdr, svc_id, op)
 
             return tuple_data
         finally:
             self._lock.release()
 
+    @staticmethod
+    def _check_rsp(tuple_hdr, svc_id, op):
+        if tuple_hdr.svc_id != svc_id:
+            raise BTPError(
+                f"Incorrect service ID {tuple_hdr.svc_id} in the response, expected {svc_id}!"
+            )
+
+        if tuple_hdr.op == defs.BTP_STATUS:
+            raise BTPError("Error opcode in response!")
+
+        if op != tuple_hdr.op:
+            raise BTPError(
+                f"Invalid opcode 0x{tuple_hdr.op:02x} in the response, expected 0x{op:02x}!"
+            )
+
+    def send_batch(self, cmds, window=BTP_BATCH_WINDOW):
+        """Send commands back to back and match their responses in order
+
+        cmds -- list of (svc_id, op, ctrl_index, data) tuples
+        window -- max number of commands sent without a response
+
+        Returns the list of response data. If a command fails, no further
+        commands are sent, responses of the ones already sent are drained
+        and BTPBatchError with the index of the failed command is raised.
+        """
+        rsps = []
+        error = None
+        sent = 0
+
+        with self._lock:
+            while len(rsps) < sent or (error is None and sent < len(cmds)):
+                while error is None and sent < len(cmds) and sent - len(rsps) < window:
+                    self._socket.send(*cmds[sent])
+                    sent += 1
+
+                index = len(rsps)
+                tuple_hdr, tuple_data = self.read()
+                rsps.append(tuple_data)
+
+                if error is None:
+                    try:
+                        self._check_rsp(tuple_hdr, *cmds[index][:2])
+                    except BTPError as e:
+                        error = BTPBatchError(index, cmds[index], e)
+
+        if error is not None:
+            raise error
+
+        return rsps
+
+    def _read_batched(self):
+        if not self._batch_unread:
+            raise BTPError("No batched command is waiting for a response")
+
+        self._batch_unread -= 1
+        svc_id, op, ctrl_index, _ = self._batch[-1]
+
+        # Placeholder of an empty, successful response. The actual one is
+        # checked when the batch is sent.
+        return dec_hdr(struct.pack("<BBBH", svc_id, op, ctrl_index, 0)), (b'',)
+
+    @contextmanager
+    def batch(self, window=BTP_BATCH_WINDOW):
+        """Record commands sent from this thread and pipeline them on exit
+
+        Meant for sequences of BTP wrappers that only check the response
+        status, e.g. GATT server database setup. Wrappers that need the
+        response data must not be called within a batch, they get an empty
+        placeholder response. Errors are raised on exit as BTPBatchError.
+        """
+        if self._is_batching():
+            # Nested batch is flushed by the outermost one
+            yield
+            return
+
+        self._batch = []
+        self._batch_owner = threading.get_ident()
+        self._batch_unread = 0
+
+        try:
+            yield
+            cmds = self._batch
+        finally:
+            self._batch = None
+            self._batch_owner = None
+
+        if cmds:
+            self.send_batch(cmds, window)
+
     def _reset_rx_queue(self):
         while not self._rx_queue.empty():
             try:
@@ -403,6 +585,10 @@ class BTPWorker:
 
         self._socket.accept(timeout)
 
+        self.start()
+
+    def start(self):
+        """Start receiving on the connected socket"""
         self._running.set()
         self._rx_worker.start()
 
@@ -245,6 +245,19 @@ class BTPError(Exception):
     """
 
 
+class BTPBatchError(BTPError):
+    """Exception raised if a command of a BTP batch fails.
+
+    index -- position of the first failing command in the batch
+    """
+
+    def __init__(self, index, cmd, reason):
+        self.index = index
+        self.cmd = cmd
+        super().__init__(f"Batched command {index} (svc_id=0x{cmd[0]:02x}, op=0x{cmd[1]:02x}) "
+                         f"failed: {reason}")
+
+
 class BTPFatalError(Exception):
     """Exception raised if BTP error occurs and the IUT needs to be recovered.
 
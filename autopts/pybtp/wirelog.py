@@ -0,0 +1,259 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""BTP wire logging
+
+BTPSocket only records raw frames. Decoding and hex formatting of the
+autopts-iutctl.log text is done by a background writer thread, so it does
+not slow down the BTPWorker RX thread.
+
+The binary capture is an append-only file that starts with a file header
+and is followed by records, all fields big-endian:
+
+File header:
+    magic       8 octets    b'btpsnoop'
+    version     4 octets    CAPTURE_VERSION
+
+Record:
+    timestamp   8 octets    microseconds since the Unix epoch
+    direction   1 octet     0 - command sent to IUT, 1 - response or event
+    name_len    1 octet     length of the IUT name
+    frame_len   4 octets    length of the BTP frame, header included
+    iut_name    name_len octets, UTF-8
+    frame       frame_len octets
+
+It can be decoded offline with tools/btpsnoop.py.
+"""
+
+import logging
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from datetime import datetime
+
+from autopts.pybtp import defs
+from autopts.pybtp.parser import HDR_LEN
+
+log = logging.debug
+
+# Values of the btp_log option
+WIRE_LOG_TEXT = 'text'
+WIRE_LOG_BINARY = 'binary'
+WIRE_LOG_BOTH = 'both'
+WIRE_LOG_OFF = 'off'
+WIRE_LOG_MODES = [WIRE_LOG_TEXT, WIRE_LOG_BINARY, WIRE_LOG_BOTH, WIRE_LOG_OFF]
+
+CAPTURE_FILE_EXT = '.btpsnoop'
+CAPTURE_MAGIC = b'btpsnoop'
+CAPTURE_VERSION = 1
+CAPTURE_FILE_HDR = struct.Struct('>8sI')
+CAPTURE_RECORD_HDR = struct.Struct('>QBBI')
+
+# Frame directions
+DIR_CMD = '>'
+DIR_RSP = '<'
+
+_CAPTURE_DIRECTIONS = {DIR_CMD: 0, DIR_RSP: 1}
+_CAPTURE_DIRECTION_NAMES = {0: DIR_CMD, 1: DIR_RSP}
+
+# Max number of frames waiting for the writer thread. If the writer
+# cannot keep up, recording blocks instead of dropping frames.
+WIRE_LOG_QUEUE_SIZE = 4096
+
+BTP_STATUS_NAMES = {
+    1: 'Fail',
+    2: 'Unknown Command',
+    3: 'Not Ready',
+    4: 'Invalid Index',
+}
+
+_INDENT = ' ' * 18
+_RAW_DATA_REFLOW = re.compile(r'(.{48})')
+
+
+def build_service_names():
+    """Map BTP_SERVICE_ID_* values from defs.py to service names"""
+    names = {}
+
+    for name, value in vars(defs).items():
+        if name.startswith('BTP_SERVICE_ID_') and isinstance(value, int):
+            names.setdefault(value, name.replace('BTP_SERVICE_ID_', ''))
+
+    return names
+
+
+def build_opcode_names(service_names):
+    """Map (svc_id, op) to BTP_<SVC>_CMD_* / BTP_<SVC>_EV_* names from defs.py"""
+    names = {}
+
+    for svc_id, svc_name in service_names.items():
+        prefixes = (f'BTP_{svc_name}_CMD_', f'BTP_{svc_name}_EV_')
+
+        for name, value in vars(defs).items():
+            if name.startswith(prefixes) and isinstance(value, int):
+                names.setdefault((svc_id, value), name)
+
+    return names
+
+
+SERVICE_NAMES = build_service_names()
+OPCODE_NAMES = build_opcode_names(SERVICE_NAMES)
+
+
+def get_opcode_name(svc_id, op):
+    if op == defs.BTP_STATUS:
+        return 'BTP_ERROR'
+
+    return OPCODE_NAMES.get((svc_id, op), 'BTP Undecoded')
+
+
+def format_frame(timestamp, direction, frame):
+    """Format a BTP frame the way it is presented in autopts-iutctl.log"""
+    svc_id, op, ctrl_index = frame[0], frame[1], frame[2]
+    data_len = len(frame) - HDR_LEN
+    hex_data = frame.hex(' ')
+
+    current_time = datetime.fromtimestamp(timestamp).strftime('%H:%M:%S:%f')[:-3]
+    desc = f'{get_opcode_name(svc_id, op)} (0x{svc_id:02x}|0x{op:02x}|0x{ctrl_index:02x})'
+
+    if direction == DIR_RSP and op == defs.BTP_STATUS:
+        status = frame[HDR_LEN] if data_len else None
+        desc += f' {BTP_STATUS_NAMES.get(status, status)}'
+    else:
+        # Separate header from data
+        hex_data = hex_data[:14] + '|' + hex_data[15:]
+
+        if len(hex_data) > 47:
+            # This ensures clean text indentation for longer raw data, with 16 bytes per line
+            hex_data = '\n' + _INDENT + _RAW_DATA_REFLOW.sub(r'\1\n' + _INDENT, hex_data)
+
+    return f'{current_time}    {direction} {desc}\n{" " * 17} raw data ({data_len}): {hex_data}\n'
+
+
+class WireLogWriter:
+    """Writes recorded BTP frames to a text log from a background thread"""
+
+    def __init__(self, log_path):
+        self._log_file = open(log_path, 'a')
+        self._queue = queue.Queue(maxsize=WIRE_LOG_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._write_task, daemon=True)
+        self._thread.name = f'WireLogWriter{self._thread.name}'
+        self._thread.start()
+
+    def record(self, direction, frame):
+        """Queue a raw frame, called from the BTP socket threads"""
+        self._queue.put((time.time(), direction, bytes(frame)))
+
+    def _write_task(self):
+        f = self._log_file
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            try:
+                f.write(format_frame(*item))
+            except Exception as e:
+                logging.error('Failed to log BTP frame %r: %r', item, e)
+
+            if self._queue.empty():
+                f.flush()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._log_file.close()
+
+
+class WireCaptureWriter:
+    """Appends recorded BTP frames to a binary capture file
+
+    Records are packed with a single struct call and written to a buffered
+    file, so this is cheap enough to be done directly on the caller thread.
+    """
+
+    def __init__(self, capture_path, iut_name=None):
+        self._iut_name = (iut_name or '').encode('utf-8')[:255]
+        self._lock = threading.Lock()
+        self._file = open(capture_path, 'ab')
+
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_FILE_HDR.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+
+    def record(self, direction, frame):
+        rec_hdr = CAPTURE_RECORD_HDR.pack(time.time_ns() // 1000, _CAPTURE_DIRECTIONS[direction],
+                                          len(self._iut_name), len(frame))
+
+        with self._lock:
+            self._file.write(rec_hdr)
+            self._file.write(self._iut_name)
+            self._file.write(frame)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_capture(capture_path):
+    """Yield (timestamp, direction, iut_name, frame) tuples from a capture file
+
+    A record truncated by an unexpected end of the test run is skipped.
+    """
+    with open(capture_path, 'rb') as f:
+        file_hdr = f.read(CAPTURE_FILE_HDR.size)
+        if len(file_hdr) < CAPTURE_FILE_HDR.size:
+            raise ValueError(f'{capture_path} is not a BTP capture file')
+
+        magic, version = CAPTURE_FILE_HDR.unpack(file_hdr)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f'{capture_path} is not a BTP capture file')
+
+        if version != CAPTURE_VERSION:
+            raise ValueError(f'Unsupported BTP capture version {version}')
+
+        while True:
+            rec_hdr = f.read(CAPTURE_RECORD_HDR.size)
+            if len(rec_hdr) < CAPTURE_RECORD_HDR.size:
+                break
+
+            timestamp_us, direction, name_len, frame_len = CAPTURE_RECORD_HDR.unpack(rec_hdr)
+            payload = f.read(name_len + frame_len)
+            if len(payload) < name_len + frame_len:
+                break
+
+            yield (timestamp_us / 1e6, _CAPTURE_DIRECTION_NAMES[direction],
+                   payload[:name_len].decode('utf-8'), payload[name_len:])
+
+
+def create_wire_logs(log_path, wire_log=WIRE_LOG_TEXT, iut_name=None):
+    """Create the wire loggers selected with the btp_log option
+
+    log_path - path to the text log, the capture uses the same name
+               with the CAPTURE_FILE_EXT extension
+    """
+    wire_logs = []
+
+    if wire_log in (WIRE_LOG_TEXT, WIRE_LOG_BOTH):
+        wire_logs.append(WireLogWriter(log_path))
+
+    if wire_log in (WIRE_LOG_BINARY, WIRE_LOG_BOTH):
+        capture_path = os.path.splitext(log_path)[0] + CAPTURE_FILE_EXT
+        wire_logs.append(WireCaptureWriter(capture_path, iut_name))
+
+    return wire_logs
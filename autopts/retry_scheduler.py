@@ -0,0 +1,152 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Deferred retries of the failed test cases
+
+Instead of retrying a failed test case right away, RetryScheduler runs it
+again after a number of other test cases, or at the end of the run, and
+not earlier than its backoff time. A transient problem of the rig, e.g. a
+PTS dongle hiccup or a stuck IUT, then gets the time to go away before the
+retries are used up.
+"""
+
+import itertools
+import logging
+import math
+import time
+from collections import namedtuple
+
+from autopts.utils import WaitCondition
+
+log = logging.debug
+
+# Statuses that a retry does not change
+DETERMINISTIC_STATUSES = ('NOT_IMPLEMENTED',)
+
+Retry = namedtuple('Retry', ['due_run', 'due_time', 'order', 'test_case'])
+
+
+def is_deterministic_failure(status, previous_status, not_recover):
+    """Return True if retrying a test case is pointless
+
+    not_recover -- the statuses of the failures not caused by the rig, see
+                   --not_recover. Such a failure is deterministic once the
+                   retry ends with the same status.
+    """
+    if status in DETERMINISTIC_STATUSES:
+        return True
+
+    return status in not_recover and status == previous_status
+
+
+class RetryScheduler:
+    """Order of the test cases with the retries of the failed ones deferred
+
+    A deferred test case is run again after slot other test cases, at the
+    end of the run with slot 0, and not earlier than backoff seconds after
+    its failure, doubled with each retry.
+
+    The test cases are taken from the test_cases iterable one at a time,
+    only when no retry is due, so it can be a source shared with other
+    rigs, see iter_shard_test_cases.
+    """
+
+    def __init__(self, test_cases, slot=0, backoff=0):
+        self.slot = slot
+        self.backoff = backoff
+        self.runs = 0
+        self.attempts = {}
+        self._source = iter(test_cases)
+        self._next = None
+        self._retries = []
+        self._order = itertools.count()
+        self._cond = WaitCondition()
+
+    def _due_retry(self, now):
+        due = [retry for retry in self._retries
+               if retry.due_run <= self.runs and retry.due_time <= now]
+
+        return min(due) if due else None
+
+    def _take(self):
+        test_case, self._next = self._next, None
+        if test_case is None:
+            test_case = next(self._source, None)
+
+        return test_case
+
+    def peek(self):
+        """Return the test case pop() would return now, None at the end
+
+        A new test case is taken from the source for it.
+        """
+        retry = self._due_retry(time.monotonic())
+        if retry:
+            return retry.test_case
+
+        if self._next is None:
+            self._next = next(self._source, None)
+
+        if self._next is None and self._retries:
+            return min(self._retries, key=lambda retry: (retry.due_time, retry.order)).test_case
+
+        return self._next
+
+    def pop(self):
+        """Return the next test case and the time to wait before running it
+
+        Returns (None, 0) at the end of the run.
+        """
+        now = time.monotonic()
+        retry = self._due_retry(now)
+        test_case = None
+
+        if retry is None:
+            test_case = self._take()
+
+        if test_case is None and retry is None and self._retries:
+            # Only the retries are left, the first one due is waited for
+            retry = min(self._retries, key=lambda retry: (retry.due_time, retry.order))
+
+        if retry:
+            self._retries.remove(retry)
+            test_case, delay = retry.test_case, max(retry.due_time - now, 0)
+        elif test_case is not None:
+            delay = 0
+        else:
+            return None, 0
+
+        self.runs += 1
+        self.attempts[test_case] = self.attempts.get(test_case, 0) + 1
+
+        return test_case, delay
+
+    def defer(self, test_case):
+        """Run the test case again later"""
+        retries = self.attempts[test_case]
+        due_run = self.runs + self.slot if self.slot else math.inf
+        backoff = self.backoff * 2 ** (retries - 1)
+
+        log(f"Retry #{retries} of {test_case} deferred by {self.slot or 'the end of the run'}"
+            f" slot, {backoff} s backoff")
+
+        self._retries.append(Retry(due_run, time.monotonic() + backoff, next(self._order), test_case))
+
+    def wait(self, delay):
+        """Sleep for the backoff, ends with RunEnd at set_global_end()"""
+        try:
+            self._cond.wait_for(lambda: False, timeout=delay)
+        except TimeoutError:
+            pass
@@ -0,0 +1,252 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Sharded test case execution across independent PTS/IUT rig groups
+
+The stack, the IUT control and the PTS callback servers are process-wide,
+so every rig group other than the client's own runs in a separate client
+process started with --shard_worker. The test cases are partitioned
+between the shards by their mean duration from the test case database.
+Each shard takes test cases from its own queue and, once it is empty,
+steals from the tail of the shard with the most estimated work left.
+
+The shard workers connect to the ShardCoordinator of the main client and
+request test cases one by one:
+    worker -> ('hello', shard_id)   coordinator -> hello(shard_id) dict
+    worker -> ('next', shard_id)    coordinator -> (test_case, index) or None
+    worker -> ('close', shard_id)
+'next' also means the previously received test case has been completed.
+"""
+
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import deque
+from multiprocessing.connection import Client as ConnectionClient
+from multiprocessing.connection import Listener
+
+log = logging.debug
+
+SHARD_AUTHKEY_ENV = 'AUTOPTS_SHARD_AUTHKEY'
+
+# Estimated duration in seconds of a test case with no statistics, if no
+# test case has them
+DEFAULT_TEST_CASE_DURATION = 60
+
+
+def load_rig_groups(path):
+    """Load the --rig_groups file
+
+    The file holds a JSON list with an entry per rig group, each entry
+    is a list of command line arguments of the client for that group.
+    """
+    with open(path) as f:
+        rig_groups = json.load(f)
+
+    if not isinstance(rig_groups, list) or \
+            not all(isinstance(argv, list) and all(isinstance(arg, str) for arg in argv)
+                    for argv in rig_groups):
+        raise ValueError(f'{path}: expected a list of command line argument lists')
+
+    return rig_groups
+
+
+def estimate_durations(test_cases, mean_durations):
+    """Return {test_case: duration}, unknown durations are set to the mean"""
+    known = [mean_durations[tc] for tc in test_cases if mean_durations.get(tc)]
+    default = sum(known) / len(known) if known else DEFAULT_TEST_CASE_DURATION
+
+    return {tc: mean_durations.get(tc) or default for tc in test_cases}
+
+
+def plan_shards(test_cases, durations, num_shards):
+    """Partition test cases with the longest-processing-time-first rule
+
+    Returns a list of num_shards lists, each ordered from the longest test
+    case, so the stealing from the tail takes the shortest ones.
+    """
+    shards = [[] for _ in range(num_shards)]
+    loads = [0] * num_shards
+
+    for tc in sorted(test_cases, key=lambda tc: durations[tc], reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(tc)
+        loads[i] += durations[tc]
+
+    return shards
+
+
+class ShardScheduler:
+    def __init__(self, test_cases, durations, num_shards):
+        self.durations = durations
+        self.queues = [deque(shard) for shard in plan_shards(test_cases, durations, num_shards)]
+        self.remaining = [sum(durations[tc] for tc in queue) for queue in self.queues]
+        self.in_flight = [None] * num_shards
+        self.requeued = set()
+        self.dispatched = 0
+        self.stolen = 0
+        self.lock = threading.Lock()
+
+    def _pop(self, shard_id):
+        if self.queues[shard_id]:
+            return self.queues[shard_id].popleft(), shard_id
+
+        victim = max(range(len(self.queues)), key=lambda i: self.remaining[i])
+        if not self.queues[victim]:
+            return None, None
+
+        self.stolen += 1
+        return self.queues[victim].pop(), victim
+
+    def next_test_case(self, shard_id):
+        """Return (test_case, index) to run on the shard, or None if done
+
+        index is the position in the order of dispatching, for progress.
+        """
+        with self.lock:
+            self.in_flight[shard_id] = None
+
+            test_case, owner = self._pop(shard_id)
+            if test_case is None:
+                return None
+
+            if owner != shard_id:
+                log(f'Shard {shard_id} stole {test_case} from shard {owner}')
+
+            self.remaining[owner] -= self.durations[test_case]
+            self.in_flight[shard_id] = test_case
+            index = self.dispatched
+            self.dispatched += 1
+
+            return test_case, index
+
+    def abort_shard(self, shard_id):
+        """Give the test case of a lost shard to the others, only once"""
+        with self.lock:
+            test_case = self.in_flight[shard_id]
+            self.in_flight[shard_id] = None
+
+            if test_case is None or test_case in self.requeued:
+                return
+
+            log(f'Shard {shard_id} lost, requeuing {test_case}')
+            self.requeued.add(test_case)
+            self.dispatched -= 1
+            queue = max(range(len(self.queues)), key=lambda i: self.remaining[i])
+            self.queues[queue].appendleft(test_case)
+            self.remaining[queue] += self.durations[test_case]
+
+
+def iter_shard_test_cases(next_test_case, stats):
+    """Yield test cases of a shard, with the progress index in stats"""
+    while True:
+        item = next_test_case()
+        if item is None:
+            return
+
+        test_case, stats.index = item
+        yield test_case
+
+
+class ShardCoordinator:
+    """Serves the ShardScheduler to the shard worker processes
+
+    hello - function returning a dict with the shard settings for a shard_id
+    """
+
+    def __init__(self, scheduler, hello):
+        self.scheduler = scheduler
+        self.hello = hello
+        self.authkey = secrets.token_bytes(16)
+        self.listener = Listener(('127.0.0.1', 0), authkey=self.authkey)
+        self.threads = []
+        self.accept_thread = threading.Thread(target=self._accept_task, daemon=True,
+                                              name='ShardCoordinator')
+        self.accept_thread.start()
+
+    @property
+    def address(self):
+        host, port = self.listener.address
+        return f'{host}:{port}'
+
+    def worker_env(self):
+        env = os.environ.copy()
+        env[SHARD_AUTHKEY_ENV] = self.authkey.hex()
+        return env
+
+    def _accept_task(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                # Listener closed
+                break
+            except Exception as e:
+                logging.exception(e)
+                continue
+
+            thread = threading.Thread(target=self._serve_task, args=(conn,), daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def _serve_task(self, conn):
+        shard_id = None
+
+        try:
+            while True:
+                op, shard_id = conn.recv()
+
+                if op == 'hello':
+                    conn.send(self.hello(shard_id))
+                elif op == 'next':
+                    conn.send(self.scheduler.next_test_case(shard_id))
+                elif op == 'close':
+                    break
+                else:
+                    raise ValueError(f'Unknown shard operation {op!r}')
+        except (OSError, EOFError):
+            if shard_id is not None:
+                self.scheduler.abort_shard(shard_id)
+        finally:
+            conn.close()
+
+    def close(self):
+        self.listener.close()
+        for thread in self.threads:
+            thread.join(timeout=1)
+
+
+class ShardWorker:
+    """Connection of a shard worker process to the ShardCoordinator"""
+
+    def __init__(self, address, shard_id):
+        host, port = address.rsplit(':', 1)
+        authkey = bytes.fromhex(os.environ[SHARD_AUTHKEY_ENV])
+        self.shard_id = shard_id
+        self.conn = ConnectionClient((host, int(port)), authkey=authkey)
+        self.conn.send(('hello', shard_id))
+        self.hello = self.conn.recv()
+
+    def next_test_case(self):
+        self.conn.send(('next', self.shard_id))
+        return self.conn.recv()
+
+    def close(self):
+        try:
+            self.conn.send(('close', self.shard_id))
+        finally:
+            self.conn.close()
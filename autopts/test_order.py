@@ -0,0 +1,210 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Ordering of test cases by their preconditions
+
+The precondition signature of a test case is derived from the commands its
+LT instances run before the test case, i.e. the TestFuncs without start_wid
+or post_wid that are not clean-up functions, see TestCase.pre_run. It has a
+component for each kind of state the neighbouring test cases may share:
+- project: the PTS project, so the PIXITs of its module,
+- iut_count: the number of IUTs, so the IUT map and LT instances,
+- stack: the BTP services registered and the stack initialized,
+- pixits: the PIXITs updated by the test case itself.
+
+A transition is a change of a component between two consecutive test
+cases. The order keeps the test cases of a signature together and chains
+the signatures with the fewest transitions between them.
+"""
+
+import functools
+import itertools
+import logging
+from collections import namedtuple
+
+from autopts.ptsprojects.testcase import TestFunc, is_cleanup_func
+
+log = logging.debug
+
+# Estimated time in seconds of a transition, for the simulation
+TRANSITION_TIME = 1.0
+
+Preconditions = namedtuple('Preconditions', ['project', 'iut_count', 'stack', 'pixits'])
+
+PIXIT_FUNCS = ('set_pixit', 'update_pixit_param')
+
+
+def _value_key(value):
+    if value is None or isinstance(value, (str, bytes, int, float)):
+        return value
+
+    if isinstance(value, (tuple, list)):
+        return tuple(_value_key(item) for item in value)
+
+    if isinstance(value, TestFunc):
+        return _func_key(value)
+
+    if callable(value):
+        return _callable_key(value)
+
+    return type(value).__name__
+
+
+def _callable_key(func):
+    if isinstance(func, functools.partial):
+        return _callable_key(func.func), _value_key(func.args)
+
+    code = getattr(func, '__code__', None)
+    if code is not None and code.co_name == '<lambda>':
+        # Lambdas differ by the constants they pass, e.g. PIXIT names
+        return '<lambda>', tuple(const for const in code.co_consts if isinstance(const, str))
+
+    return getattr(func, '__qualname__', type(func).__name__)
+
+
+def _func_key(cmd):
+    return _callable_key(cmd.func), _value_key(cmd.args), \
+        tuple(sorted((name, _value_key(value)) for name, value in cmd.kwds.items()))
+
+
+def _is_pixit_func(key):
+    name = key[0]
+    if isinstance(name, tuple):
+        # A lambda, with its string constants
+        return any(const.startswith('TSPX_') for const in name[1])
+
+    return name.rsplit('.', 1)[-1] in PIXIT_FUNCS
+
+
+def precondition_signature(test_case):
+    """Return the Preconditions of a TestCase instance"""
+    stack = []
+    pixits = []
+
+    for cmd in test_case.cmds:
+        if not isinstance(cmd, TestFunc) or is_cleanup_func(cmd) or \
+                cmd.start_wid is not None or cmd.post_wid is not None:
+            continue
+
+        key = _func_key(cmd)
+        if _is_pixit_func(key):
+            pixits.append(key)
+        else:
+            stack.append(key)
+
+    return Preconditions(test_case.project_name, test_case.iut_count, tuple(stack), tuple(pixits))
+
+
+def get_signatures(test_cases, test_case_instances):
+    """Return {test_case: signature} of the test case names
+
+    The signature of a test case combines the ones of its LT instances.
+    Test cases without instances get None.
+    """
+    instances = {}
+    for instance in test_case_instances:
+        instances.setdefault(instance.name, []).append(instance)
+
+    signatures = {}
+    for name in test_cases:
+        lts = instances.get(name)
+        if not lts:
+            signatures[name] = None
+            continue
+
+        signatures[name] = Preconditions(*(tuple(getattr(precondition_signature(lt), field) for lt in lts)
+                                           for field in Preconditions._fields))
+
+    return signatures
+
+
+def _distance(signature1, signature2):
+    if signature1 is None or signature2 is None:
+        return len(Preconditions._fields)
+
+    return sum(value1 != value2 for value1, value2 in zip(signature1, signature2, strict=True))
+
+
+def count_transitions(test_cases, signatures):
+    """Return the number of transitions of the test cases run in this order"""
+    return sum(_distance(signatures[test_case1], signatures[test_case2])
+               for test_case1, test_case2 in itertools.pairwise(test_cases))
+
+
+def order_test_cases(test_cases, signatures, durations=None):
+    """Order the test cases to minimize the transitions
+
+    The groups of test cases with equal signatures are chained greedily,
+    starting with the group of the first test case and then the nearest
+    group. Historical durations break the ties: the shorter group goes
+    first and the test cases of a group run from the shortest one. Test
+    cases with no duration keep their order after the ones that have.
+    """
+    durations = durations or {}
+
+    groups = {}
+    for test_case in test_cases:
+        groups.setdefault(signatures.get(test_case), []).append(test_case)
+
+    def duration(test_case):
+        value = durations.get(test_case)
+        return (value is None, value or 0)
+
+    def group_duration(signature):
+        return sum(durations.get(test_case) or 0 for test_case in groups[signature])
+
+    remaining = list(groups)
+    ordered = []
+    previous = None
+
+    while remaining:
+        current = remaining[0]
+        if ordered:
+            # min() keeps the first of equal keys, i.e. the workspace order
+            current = min(remaining, key=lambda signature, previous=previous: (
+                _distance(previous, signature), group_duration(signature)))
+
+        remaining.remove(current)
+        ordered.extend(sorted(groups[current], key=duration))
+        previous = current
+
+    return ordered
+
+
+def simulate_order(test_cases, plan, signatures, transition_time=TRANSITION_TIME):
+    """Predict the transitions of a plan compared to the given order
+
+    Returns a dict with the transition counts of both orders, the
+    transitions of the plan per precondition component and the estimated
+    time saved in seconds.
+    """
+    components = dict.fromkeys(Preconditions._fields, 0)
+    for test_case1, test_case2 in itertools.pairwise(plan):
+        signature1, signature2 = signatures[test_case1], signatures[test_case2]
+        for i, field in enumerate(Preconditions._fields):
+            if signature1 is None or signature2 is None or signature1[i] != signature2[i]:
+                components[field] += 1
+
+    transitions = count_transitions(test_cases, signatures)
+    planned_transitions = count_transitions(plan, signatures)
+
+    return {
+        'test_cases': len(plan),
+        'groups': len({signatures[test_case] for test_case in plan}),
+        'transitions': transitions,
+        'planned_transitions': planned_transitions,
+        'planned_components': components,
+        'time_saved': (transitions - planned_transitions) * transition_time,
+    }
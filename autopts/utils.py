@@ -23,10 +23,11 @@ import re
 import sys
 import threading
 import traceback
+import weakref
 import xmlrpc.client
 from collections import defaultdict
 from pathlib import Path
-from time import sleep
+from time import monotonic, sleep
 
 import hid
 import psutil
@@ -51,6 +52,14 @@ TC_NAME_REGEX = re.compile(r"^test_case_name:\s*(.+)")
 # after interrupt triggered with Ctrl+C
 GLOBAL_END = False
 
+# Max time a thread waiting on a WaitCondition sleeps without checking its
+# predicate. Keeps the waits Ctrl+C friendly under Windows.
+WAIT_WAKEUP_PERIOD = 1
+
+# All WaitConditions, woken up at set_global_end()
+_wait_conditions = weakref.WeakSet()
+_wait_conditions_lock = threading.RLock()
+
 
 class RunEnd(KeyboardInterrupt):
     pass
@@ -60,6 +69,12 @@ def set_global_end():
     global GLOBAL_END
     GLOBAL_END = True
 
+    with _wait_conditions_lock:
+        wait_conditions = list(_wait_conditions)
+
+    for cond in wait_conditions:
+        cond.notify()
+
 
 def raise_on_global_end():
     if GLOBAL_END:
@@ -77,23 +92,88 @@ def log_running_threads():
         logging.debug(f"Thread Name: {thread.name}")
 
 
+class WaitCondition:
+    """Condition variable with predicate waits bounded by a deadline
+
+    The state checked by the predicates is changed while holding the
+    condition (with cond: ...), followed by notify(). Waits end with RunEnd
+    at set_global_end() and with TimeoutError at the deadline, no helper
+    threads are used.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.RLock())
+
+        with _wait_conditions_lock:
+            _wait_conditions.add(self)
+
+    def __enter__(self):
+        return self._cond.__enter__()
+
+    def __exit__(self, *args):
+        return self._cond.__exit__(*args)
+
+    def notify(self):
+        """Wake up the waiters to check their predicates again"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_for(self, predicate, timeout=None, poll_period=WAIT_WAKEUP_PERIOD):
+        """Wait until predicate() returns a true value and return it
+
+        Args:
+            predicate: called while holding the condition
+            timeout: timeout in seconds, None to wait without a timeout
+            poll_period: max time between predicate checks, for predicates
+             of a state that is not notified, e.g. of a remote server
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        poll_period = min(poll_period, WAIT_WAKEUP_PERIOD)
+
+        with self._cond:
+            while True:
+                result = predicate()
+                if result:
+                    return result
+
+                raise_on_global_end()
+
+                wait_time = poll_period
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError
+
+                    wait_time = min(wait_time, remaining)
+
+                self._cond.wait(wait_time)
+
+
 class ResultWithFlag:
-    """"""
-    def __init__(self, init_value=None):
+    """A result set by one thread and awaited by others
+
+    cond: WaitCondition to share with other objects, so the waiters are
+     woken up by changes of any of them
+    """
+    def __init__(self, init_value=None, cond=None):
         self.result = init_value
-        self.event = threading.Event()
-        self.lock = threading.Lock()
+        self.flag = False
+        self.cond = cond if cond is not None else WaitCondition()
+        self.lock = self.cond
 
     def is_set(self):
-        return self.event.is_set()
+        return self.flag
 
     def set_flag(self):
-        self.event.set()
+        with self.cond:
+            self.flag = True
+            self.cond.notify()
 
     def set(self, value):
-        with self.lock:
+        with self.cond:
             self.result = value
-            self.event.set()
+            self.flag = True
+            self.cond.notify()
 
     def get(self, timeout=None, predicate=None, clear=False):
         """
@@ -103,82 +183,58 @@ class ResultWithFlag:
              waiting conditions
             clear: clear result and flag so the result will not be reused
         """
-        self.wait(timeout=timeout, predicate=predicate)
-        with self.lock:
+        with self.cond:
+            self.wait(timeout=timeout, predicate=predicate)
             result = self.result
             if clear:
                 self.result = None
-                self.event.clear()
+                self.flag = False
             return result
 
-    def wait(self, timeout=None, predicate=lambda: True):
+    def wait(self, timeout=None, predicate=None):
         """
         Args:
-            timeout: timeout in seconds
+            timeout: timeout in seconds, None or 0 to wait without a timeout
             predicate: a function that will check other additional
-             waiting conditions
+             waiting conditions, returns True to keep waiting
 
         If timeout, will throw an exception: TimeoutError
         """
 
-        def _default_predicate():
-            return True
-
-        # Ctrl+C friendly under Windows
-        if predicate is None:
-            predicate = _default_predicate
-
-        raise_timeout = False
+        def done():
+            return self.flag or (predicate is not None and not predicate())
 
-        def on_timeout():
-            nonlocal raise_timeout
-            raise_timeout = True
-            self.event.set()
+        self.cond.wait_for(done, timeout=timeout or None)
 
-        timer = None
-        if timeout:
-            timer = threading.Timer(timeout, on_timeout)
-            timer.name = f'Timer{timer.name}'
-            timer.start()
-
-        try:
-            while predicate() and not self.event.is_set():
-                raise_on_global_end()
-                self.event.wait(1)
-        finally:
-            if timer:
-                timer.cancel()
-                if raise_timeout:
-                    raise TimeoutError
+    def notify(self):
+        """Wake up the waiters to check their predicates again"""
+        self.cond.notify()
 
     def get_nowait(self):
-        with self.lock:
+        with self.cond:
             return self.result
 
     def cancel_wait(self):
         self.set(None)
 
     def clear(self):
-        with self.lock:
+        with self.cond:
             self.result = None
-        self.event.clear()
+            self.flag = False
 
 
 class CounterWithFlag(ResultWithFlag):
-    def __init__(self, init_count):
-        super().__init__()
-        self.result = init_count
+    def __init__(self, init_count, cond=None):
+        super().__init__(init_count, cond)
 
     def add(self, value):
-        with self.lock:
+        with self.cond:
             self.result += value
-        with self.event._cond:
-            self.event._cond.notify_all()
+            self.cond.notify()
 
     def wait_for(self, value, timeout=None):
         def predicate():
-            with self.lock:
-                return self.result != value
+            return self.result != value
 
         self.wait(timeout=timeout, predicate=predicate)
 
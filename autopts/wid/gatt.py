@@ -37,57 +37,91 @@ log = logging.debug
 
 indication_subbed_already = False
 
+# Values of these attributes are managed by the IUT stack and change without
+# any GATT event, e.g. on a CCC write, so gatt_server_fetch_db always reads
+# them again.
+GATT_SERVER_VOLATILE_ATTRS = (UUID.CCC, UUID.SCC, UUID.CSF, UUID.device_name, UUID.appearance)
+
 
 def gatt_wid_hdl(wid, description, test_case_name):
     log(f'{gatt_wid_hdl.__name__}, {wid}, {description}, {test_case_name}')
     return generic_wid_hdl(wid, description, test_case_name, [__name__])
 
 
-def gatt_server_fetch_db():
-    db = GattDB()
-    bd_addr = btp.pts_addr_get()
-    bd_addr_type = btp.pts_addr_type_get()
+def gatt_server_fetch_attr(bd_addr_type, bd_addr, handle, perm, type_uuid):
+    attr_val = btp.gatts_get_attr_val(bd_addr_type, bd_addr, handle)
+    if not attr_val:
+        logging.debug("cannot read value %r", handle)
+        return None
 
-    attrs = btp.gatts_get_attrs()
-    for attr in attrs:
-        handle, perm, type_uuid = attr
+    att_rsp, val_len, val = attr_val
 
-        attr_val = btp.gatts_get_attr_val(bd_addr_type, bd_addr, handle)
-        if not attr_val:
-            logging.debug("cannot read value %r", handle)
-            continue
+    if type_uuid in ('2800', '2801'):
+        uuid = le_bytes_to_uuid(val, val_len)
 
-        att_rsp, val_len, val = attr_val
+        if type_uuid == '2800':
+            return GattPrimary(handle, perm, uuid, att_rsp)
 
-        if type_uuid in ('2800', '2801'):
-            uuid = le_bytes_to_uuid(val, val_len)
+        return GattSecondary(handle, perm, uuid, att_rsp)
 
-            if type_uuid == '2800':
-                db.attr_add(handle, GattPrimary(handle, perm, uuid, att_rsp))
-            else:
-                db.attr_add(handle, GattSecondary(handle, perm, uuid, att_rsp))
-        elif type_uuid == '2803':
+    if type_uuid == '2803':
+        hdr = '<BH'
+        hdr_len = struct.calcsize(hdr)
+        uuid_len = val_len - hdr_len
 
-            hdr = '<BH'
-            hdr_len = struct.calcsize(hdr)
-            uuid_len = val_len - hdr_len
+        prop, value_handle, uuid = struct.unpack(f"<BH{uuid_len}s", val)
+        uuid = le_bytes_to_uuid(uuid, uuid_len)
 
-            prop, value_handle, uuid = struct.unpack(f"<BH{uuid_len}s", val)
-            uuid = le_bytes_to_uuid(uuid, uuid_len)
+        return GattCharacteristic(handle, perm, uuid, att_rsp, prop, value_handle)
 
-            db.attr_add(handle, GattCharacteristic(handle, perm, uuid, att_rsp, prop, value_handle))
-        elif type_uuid == '2802':
-            hdr = "<HH"
-            hdr_len = struct.calcsize(hdr)
-            uuid_len = val_len - hdr_len
-            incl_svc_hdl, end_grp_hdl, uuid = struct.unpack(hdr + f"{uuid_len}s", val)
-            uuid = le_bytes_to_uuid(uuid, uuid_len)
+    if type_uuid == '2802':
+        hdr = "<HH"
+        hdr_len = struct.calcsize(hdr)
+        uuid_len = val_len - hdr_len
+        incl_svc_hdl, end_grp_hdl, uuid = struct.unpack(hdr + f"{uuid_len}s", val)
+        uuid = le_bytes_to_uuid(uuid, uuid_len)
+
+        return GattServiceIncluded(handle, perm, uuid, att_rsp, incl_svc_hdl, end_grp_hdl)
+
+    uuid = type_uuid.replace("0x", "").replace("-", "").upper()
+
+    return GattCharacteristicDescriptor(handle, perm, uuid, att_rsp, val)
 
-            db.attr_add(handle, GattServiceIncluded(handle, perm, uuid, att_rsp, incl_svc_hdl, end_grp_hdl))
+
+def gatt_server_fetch_db():
+    """Returns GattDB with attributes of the IUT server database
+
+    The database is cached by the GATT stack layer for the test case. Only
+    attributes invalidated by GATT/GAP events or GATT commands, and the ones
+    in GATT_SERVER_VOLATILE_ATTRS, are read again. A command of any other
+    service invalidates the whole database, see btp.command_handler.
+    """
+    gatt = get_stack().gatt
+    bd_addr = btp.pts_addr_get()
+    bd_addr_type = btp.pts_addr_type_get()
+
+    if gatt is None:
+        cached_db, attrs, dirty, generation = None, None, {}, None
+    else:
+        cached_db, attrs, dirty, generation = gatt.snapshot_get()
+
+    refresh_all = cached_db is None
+    if refresh_all:
+        attrs = {handle: (perm, type_uuid) for handle, perm, type_uuid in btp.gatts_get_attrs()}
+        cached_db = GattDB()
+
+    db = GattDB()
+    for handle, (perm, type_uuid) in attrs.items():
+        if refresh_all or handle in dirty or type_uuid in GATT_SERVER_VOLATILE_ATTRS:
+            attr = gatt_server_fetch_attr(bd_addr_type, bd_addr, handle, perm, type_uuid)
         else:
-            uuid = type_uuid.replace("0x", "").replace("-", "").upper()
+            attr = cached_db.attr_lookup_handle(handle)
+
+        if attr is not None:
+            db.attr_add(handle, attr)
 
-            db.attr_add(handle, GattCharacteristicDescriptor(handle, perm, uuid, att_rsp, val))
+    if gatt is not None:
+        gatt.snapshot_store(db, attrs, generation, dirty)
 
     return db
 
@@ -0,0 +1,117 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Persistent HTTP/1.1 connections and multicall for XML-RPC
+
+A ThreadingXMLRPCServer keeps an idle connection for KEEPALIVE_TIMEOUT.
+The autoptsserver serves one connection at a time from its
+handle_request() loop, so there a connection is kept only while its next
+request comes within SERIAL_IDLE_TIMEOUT and no other client, e.g. the
+log proxy or another LT rig process, is connecting. The client side
+closes its connection earlier, after CLIENT_IDLE_TIMEOUT, so it rarely
+sends a request on a connection the server is closing.
+"""
+
+import logging
+import select
+import socketserver
+import threading
+import time
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+log = logging.debug
+
+# Seconds an idle connection is kept open by a threading server
+KEEPALIVE_TIMEOUT = 5
+# Seconds an idle connection is kept open by a server serving one
+# connection at a time, so its loop still checks its end every second
+SERIAL_IDLE_TIMEOUT = 1
+CLIENT_IDLE_TIMEOUT = SERIAL_IDLE_TIMEOUT / 2
+
+
+class KeepAliveXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
+    """SimpleXMLRPCServer request handler keeping connections alive"""
+
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body of a response are separate writes
+    disable_nagle_algorithm = True
+    timeout = KEEPALIVE_TIMEOUT
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+
+        while not self.close_connection and self._next_request_pending():
+            self.handle_one_request()
+
+    def _next_request_pending(self):
+        if isinstance(self.server, socketserver.ThreadingMixIn):
+            return True
+
+        # Served one connection at a time, so other clients come first
+        ready, _, _ = select.select([self.connection, self.server.socket], [], [],
+                                    SERIAL_IDLE_TIMEOUT)
+
+        return self.connection in ready and self.server.socket not in ready
+
+    def log_error(self, fmt, *args):
+        if fmt.startswith('Request timed out'):
+            # Idle connection closed
+            log(fmt, *args)
+            return
+
+        super().log_error(fmt, *args)
+
+
+class ThreadingXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    """SimpleXMLRPCServer serving each connection in its own thread"""
+
+    daemon_threads = True
+
+
+class KeepAliveTransport(xmlrpc.client.Transport):
+    """Transport reusing its connection, can be shared between threads"""
+
+    def __init__(self, idle_timeout=CLIENT_IDLE_TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._last_request_time = 0
+
+    def request(self, host, handler, request_body, verbose=False):
+        with self._lock:
+            if time.monotonic() - self._last_request_time > self.idle_timeout:
+                self.close()
+
+            try:
+                return super().request(host, handler, request_body, verbose)
+            finally:
+                self._last_request_time = time.monotonic()
+
+
+def multicall(proxy, calls):
+    """Call methods in a single system.multicall request
+
+    calls -- iterable of (method_name, args)
+
+    Returns the list of results, raises xmlrpc.client.Fault of the first
+    failed call.
+    """
+    batch = xmlrpc.client.MultiCall(proxy)
+    for method_name, args in calls:
+        getattr(batch, method_name)(*args)
+
+    return list(batch())
@@ -63,6 +63,7 @@ from autopts.utils import (
     ykush_set_usb_power,
 )
 from autopts.winutils import kill_all_processes
+from autopts.xmlrpc_keepalive import KeepAliveTransport, KeepAliveXMLRPCRequestHandler
 
 logging = root_logging.getLogger('server')
 log = root_logging.debug
@@ -114,7 +115,9 @@ class PtsClientProxy(xmlrpc.client.ServerProxy):
     """
     def __init__(self, client_address, client_port):
         super().__init__(uri=f"http://{client_address}:{client_port}/",
-                         allow_none=True, transport=None,
+                         allow_none=True,
+                         transport=KeepAliveTransport(use_datetime=False, use_builtin_types=False,
+                                                      headers=()),
                          encoding=None, verbose=False,
                          use_datetime=False, use_builtin_types=False,
                          headers=(), context=None)
@@ -124,6 +127,14 @@ class PtsClientProxy(xmlrpc.client.ServerProxy):
         self.client_address = client_address
         self.client_port = client_port
 
+        # Log callbacks go over their own connection, so a burst of them
+        # does not delay on_implicit_send and set_result.
+        self._log_proxy = xmlrpc.client.ServerProxy(uri=f"http://{client_address}:{client_port}/",
+                                                    allow_none=True, transport=KeepAliveTransport())
+
+    def log(self, *args):
+        return self._log_proxy.log(*args)
+
 
 class PyPTSWithCallback(ptscontrol.PyPTS, threading.Thread):
     """A child class that adds support of xmlrpc PTS callbacks to PyPTS"""
@@ -530,7 +541,9 @@ class Server(threading.Thread):
 
         print(f"Serving on port {self._args.srv_port} ...")
 
-        self.server = xmlrpc.server.SimpleXMLRPCServer(("", self._args.srv_port), allow_none=True)
+        self.server = xmlrpc.server.SimpleXMLRPCServer(("", self._args.srv_port),
+                                                       requestHandler=KeepAliveXMLRPCRequestHandler,
+                                                       allow_none=True)
         # These methods will be run in the XMLRPC context
         self.server.register_function(self.list_workspace_tree, 'list_workspace_tree')
         self.server.register_function(self.copy_file, 'copy_file')
@@ -541,6 +554,7 @@ class Server(threading.Thread):
         self.server.register_function(self.get_path, 'get_path')
         self.server.register_instance(self.pts)
         self.server.register_introspection_functions()
+        self.server.register_multicall_functions()
         self.server.timeout = 1.0
 
         # Some of PyPTS methods have to be run in the same context as
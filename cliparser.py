@@ -29,6 +29,7 @@ from pathlib import Path
 from autopts.config import CLIENT_PORT, FILE_PATHS, MAX_SERVER_RESTART_TIME, SERIAL_BAUDRATE, SERVER_PORT
 from autopts.ptsprojects.boards import com_to_tty, get_debugger_snr, get_free_device, get_tty, tty_exists
 from autopts.ptsprojects.testcase_db import DATABASE_FILE
+from autopts.pybtp.wirelog import WIRE_LOG_MODES, WIRE_LOG_TEXT
 from autopts.utils import active_hub_server_replug_usb, get_tc_from_wid, load_wid_report, raise_on_global_end, ykush_replug_usb
 
 log = logging.debug
@@ -117,6 +118,20 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
                           help="Repeat test if failed. Parameter specifies "
                                "maximum repeat count per test")
 
+        self.add_argument("--deferred_retry", action='store_true', default=False,
+                          help="Retry a failed test case after other test cases"
+                               " instead of right away, see --retry_slot and"
+                               " --retry_backoff. Stop retrying once the failure"
+                               " repeats with a status of --not_recover.")
+
+        self.add_argument("--retry_slot", type=int, default=0,
+                          help="Number of other test cases run before a deferred"
+                               " retry, 0 to retry at the end of the run.")
+
+        self.add_argument("--retry_backoff", default=10, metavar='SECONDS', type=float,
+                          help="Min time between a failure and its deferred retry,"
+                               " doubled with each retry of the test case.")
+
         self.add_argument("--no_retry_on_regression", type=bool,
                           help="When no_retry_on_regression is used, failed test cases are handled as follows: if test"
                                " failure is not a regression, test case will not be retried (i.e. retry is ignored). If"
@@ -158,6 +173,37 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
                           help="Specify amount of time in minutes, after which"
                                " super guard will blindly trigger recovery steps.")
 
+        self.add_argument("--superguard_stats", action='store_true', default=False,
+                          help="Derive the super guard timeout of each test case from"
+                               " its recent durations in the test case database,"
+                               " capped at --superguard.")
+
+        self.add_argument("--settle_time", default=3, metavar='SECONDS', type=float,
+                          help="Time to allow the IUT and PTS to settle down"
+                               " after a test case.")
+
+        self.add_argument("--pipeline", action='store_true', default=False,
+                          help="Prepare the next test case, e.g. start its native or"
+                               " QEMU IUT, while the previous one finishes.")
+
+        self.add_argument("--order_test_cases", action='store_true', default=False,
+                          help="Run the test cases with the same preconditions, e.g."
+                               " stack initialization and PIXITs, one after another.")
+
+        self.add_argument("--simulate_order", action='store_true', default=False,
+                          help="Print the precondition transitions predicted for"
+                               " --order_test_cases and exit without running the"
+                               " test cases.")
+
+        self.add_argument("--rig_groups", metavar='FILE', type=str, default=None,
+                          help="JSON file with a list of command line argument lists, "
+                               "one per additional PTS/IUT rig group. Test cases are "
+                               "shared between this client and a client process "
+                               "started for each rig group.")
+
+        self.add_argument("--shard_worker", default=None, help=argparse.SUPPRESS)
+        self.add_argument("--shard_id", type=int, default=0, help=argparse.SUPPRESS)
+
         self.add_argument("--ykush", metavar='YKUSH_PORT', type=str,
                           nargs="+", action="extend", default=None,
                           help="Specify ykush downstream port number, so on BTP TIMEOUT "
@@ -172,6 +218,9 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
 
         self.add_argument("--rtscts", dest='rtscts', action="store_true", default=False,
                           help="Enable UART hardware flow control.", iut_param=True)
+        self.add_argument("--serial-btp", "--serial_btp", action="store_true", default=False, iut_param=True,
+                          help="In the tty mode, keep the BTP serial port open in autoptsclient between "
+                               "the test cases instead of bridging it with socat for each test case.")
 
         # Hidden option to save test cases data in TestCase.db
         self.add_argument("-s", "--store", action="store_true",
@@ -220,6 +269,9 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
         self.add_argument("--btattach-at-every-test-case", "--btattach_at_every_test_case",
                           action='store_true', default=False, iut_param=True,
                           help="The path to the btattach executable, e.g. /usr/bin/btattach")
+        self.add_argument("--iut-pool", "--iut_pool", type=int, default=0, iut_param=True,
+                          help="Number of native IUT processes booted ahead of the test "
+                               "cases, so the test cases do not wait for the IUT boot.")
         self.add_argument("--btproxy-bin", "--btproxy_bin", default=None,
                           help="The path to the btproxy executable, e.g. /usr/bin/btproxy")
         self.add_argument("--qemu-bin", "--qemu_bin", default=None, iut_param=True,
@@ -227,6 +279,10 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
         self.add_argument("--qemu-options", "--qemu_options", type=str, iut_param=True,
                           nargs='+', action="extend", default="",
                           help="Additional options for the qemu, e.g. -cpu cortex-m3 -machine lm3s6965evb")
+        self.add_argument("--qemu-snapshot", "--qemu_snapshot", action='store_true', default=False,
+                          iut_param=True,
+                          help="Save the QEMU VM state after the first IUT boot and restore it "
+                               "at the next test cases instead of booting the IUT.")
         self.add_argument("--kernel-cpu", "--kernel_cpu", type=str, nargs="+",
                           default="qemu_cortex_m3", iut_param=True,
                           help="The type of CPU that will be used for building an image, e.g. qemu_cortex_m3")
@@ -279,6 +335,13 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
                                "CAP_SYS_ADMIN permissions are required. "
                                "e.g. sudo setcap cap_net_raw,cap_net_admin,cap_sys_admin+ep /usr/bin/btmon ")
 
+        self.add_argument("--btp-log", "--btp_log", type=str, choices=WIRE_LOG_MODES,
+                          default=WIRE_LOG_TEXT, iut_param=True,
+                          help="BTP traffic log written to autopts-iutctl.log of each test case. "
+                               "'text' - decoded frames, 'binary' - raw capture in autopts-iutctl.btpsnoop, "
+                               "to be decoded with tools/btpsnoop.py, 'both' - text and binary capture, "
+                               "'off' - no BTP traffic log.")
+
         self.add_argument("--device_core", type=str, nargs='+', action="extend",
                           default='NRF52840_XXAA', iut_param=True,
                           help="Specify the device core for JLink related features, "
@@ -617,6 +680,9 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
         if args.btattach_bin and not is_executable(args.btattach_bin):
             return args, f'The btattach_bin={args.btattach_bin} is not an executable file'
 
+        if args.rig_groups and not os.path.isfile(args.rig_groups):
+            return args, f'The rig_groups={args.rig_groups} is not a file'
+
         args.superguard = 60 * args.superguard
 
         if not args.ip_addr:
@@ -629,6 +695,7 @@ class CliParser(SmartDefaultsMixin, argparse.ArgumentParser):
             _args = args.iut_targets_args[iut_name]
             _args.iut_mode = self.get_iut_mode(_args)
             _args.superguard = args.superguard
+            _args.superguard_stats = args.superguard_stats
             _args.ip_addr = args.ip_addr
             _args.local_addr = args.local_addr
 
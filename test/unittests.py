@@ -15,28 +15,86 @@
 
 import os
 import shutil
+import sqlite3
 import struct
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import xml.etree.ElementTree as ElementTree
 from os.path import abspath, dirname
 from pathlib import Path
-from unittest.mock import patch
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
 import pytest
 
+from autopts.bot.build_cache import BUILD_DIR_FILE, BackgroundBuilder, BuildCache, build_key
 from autopts.bot.common_features import report
-from autopts.client import FakeProxy, TestCaseRunStats
+from autopts.client import (
+    Client,
+    ClientCallback,
+    FakeProxy,
+    LogCallbackWorker,
+    PixitRecorder,
+    PtsServerProxy,
+    TestCasePipeline,
+    TestCaseRunStats,
+    apply_pixits,
+    run_recovery,
+    run_test_case_wrapper,
+    run_test_cases,
+    same_test_case_selection,
+    update_pixit_mirror,
+)
 from autopts.config import FILE_PATHS
+from autopts.ptsprojects import ptstypes
+from autopts.ptsprojects.iut_pool import IutPool
+from autopts.ptsprojects.iutctl import IutCtl, get_qemu_cmd
+from autopts.ptsprojects.stack import Stack
+from autopts.ptsprojects.stack.common import EventQueue, wait_event_with_condition
+from autopts.ptsprojects.testcase import (
+    TestCase,
+    TestCaseLT1,
+    TestFunc,
+    TestFuncCleanUp,
+    TestFuncStart,
+    configure_settle,
+)
 from autopts.ptsprojects.testcase_db import TestCaseTable
+from autopts.ptsprojects.utils.native import NativeIUT
+from autopts.ptsprojects.utils.qemu import QemuSnapshot
+from autopts.ptsprojects.zephyr.iutctl import create_zephyr_ctl_class
+from autopts.ptsprojects.zephyr.ztestcase import ZTestCase
 from autopts.pybtp import defs
 from autopts.pybtp.btp.audio import pack_metadata
+from autopts.pybtp.btp.btp import command_handler
 from autopts.pybtp.btp.gap import gap_set_uuid16_svc_data
-from autopts.pybtp.types import AdType
+from autopts.pybtp.iutctl_common import BTPSerial, BTPSocketSrv, BTPWorker
+from autopts.pybtp.parser import HDR_LEN, enc_frame
+from autopts.pybtp.types import AdType, BTPBatchError, BTPError, Perm
+from autopts.pybtp.wirelog import DIR_CMD, DIR_RSP, WireCaptureWriter, format_frame, read_capture
+from autopts.sharding import (
+    ShardCoordinator,
+    ShardScheduler,
+    ShardWorker,
+    estimate_durations,
+    iter_shard_test_cases,
+    plan_shards,
+)
+from autopts.test_order import Preconditions, count_transitions, get_signatures, order_test_cases, simulate_order
+from autopts.utils import CounterWithFlag, ResultWithFlag
+from autopts.wid.gatt import gatt_server_fetch_db
+from autopts.xmlrpc_keepalive import SERIAL_IDLE_TIMEOUT, KeepAliveXMLRPCRequestHandler
 from autoptsclient_bot import import_bot_module, import_bot_projects
 from test.mocks.mocked_test_cases import (
     mock_workspace_test_cases,
     test_case_list_generation_samples,
 )
+from tools.benchmarks.common import LoopbackBTPStub
+from tools.benchmarks.iut_wrapper import target_args
+from tools.benchmarks.xmlrpc_transport import StubServer
 
 DATABASE_FILE = 'test/mocks/zephyr_database.db'
 
@@ -275,6 +333,197 @@ class MyTestCase(unittest.TestCase):
                                 results, regressions, progresses, new_cases)
         assert os.path.exists(FILE_PATHS['REPORT_DIFF_TXT_FILE'])
 
+    def test_stats_results_journal(self):
+        xml_file = FILE_PATHS['ALL_STATS_RESULTS_XML_FILE']
+        stats = TestCaseRunStats(['GAP'], ['GAP/SEC/AUT/BV-11-C', 'GAP/SEC/AUT/BV-12-C'], 0,
+                                 xml_results_file=xml_file)
+        stats.update('GAP/SEC/AUT/BV-11-C', 10, 'FAIL')
+        stats.update('GAP/SEC/AUT/BV-11-C', 12, 'PASS')
+        stats.update('GAP/SEC/AUT/BV-12-C', 10, 'INCONC')
+
+        # Entry cut off by an interrupted run
+        with open(FILE_PATHS['ALL_STATS_RESULTS_JOURNAL_FILE'], 'a') as f:
+            f.write('["set", {"name": "GAP/SEC')
+
+        backup_file = FILE_PATHS['ALL_STATS_JSON_FILE']
+        stats.save_to_backup(backup_file)
+        restored = TestCaseRunStats.load_from_backup(backup_file)
+
+        assert restored.get_status_count() == {'PASS': 1, 'INCONC': 1}
+        assert restored.get_results()['GAP/SEC/AUT/BV-11-C']['run_count'] == '2'
+
+        restored.export_xml()
+        root = ElementTree.parse(xml_file).getroot()
+        assert [tc.attrib['status'] for tc in root.findall('./test_case')] == ['PASS', 'INCONC']
+
+        # Results of the resumed run survive the next resume
+        restored.update('GAP/SEC/AUT/BV-12-C', 11, 'PASS')
+        restored.save_to_backup(backup_file)
+        restored = TestCaseRunStats.load_from_backup(backup_file)
+        assert restored.get_status_count() == {'PASS': 2}
+        assert restored.get_results()['GAP/SEC/AUT/BV-12-C']['run_count'] == '2'
+
+    def test_testcase_db_statistics(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            database_file = os.path.join(tmp_dir, 'TestCase.db')
+
+            # Table of an older version, with a duplicated test case
+            conn = sqlite3.connect(database_file)
+            conn.execute("CREATE TABLE zephyr (name TEXT, duration REAL, count INTEGER, result TEXT);")
+            conn.executemany("INSERT INTO zephyr VALUES(?, ?, ?, ?);",
+                             [('GAP/BROB/BCST/BV-01-C', 10.0, 1, 'PASS'),
+                              ('GAP/BROB/BCST/BV-01-C', 20.0, 3, 'FAIL')])
+            conn.commit()
+            conn.close()
+
+            db = TestCaseTable('zephyr', database_file)
+            assert db.get_mean_duration('GAP/BROB/BCST/BV-01-C') == 20.0
+            assert db.get_result('GAP/BROB/BCST/BV-01-C') == 'FAIL'
+
+            for duration in [10, 11, 12, 13, 100]:
+                db.update_statistics('GAP/BROB/BCST/BV-02-C', duration, 'PASS')
+
+            stats = db.get_statistics(['GAP/BROB/BCST/BV-02-C', 'GAP/BROB/BCST/BV-03-C'])
+            assert list(stats) == ['GAP/BROB/BCST/BV-02-C']
+            assert stats['GAP/BROB/BCST/BV-02-C'].mean == 29.2
+            assert stats['GAP/BROB/BCST/BV-02-C'].variance == pytest.approx(1567.7)
+            assert stats['GAP/BROB/BCST/BV-02-C'].p50 == 12
+            assert stats['GAP/BROB/BCST/BV-02-C'].p95 == 100
+
+            assert db.get_superguard_timeout('GAP/BROB/BCST/BV-01-C', 900) == 900
+            assert db.get_superguard_timeout('GAP/BROB/BCST/BV-02-C', 900) == 300
+            assert db.get_superguard_timeout('GAP/BROB/BCST/BV-02-C', 200) == 200
+            # Disabled superguard
+            assert db.get_superguard_timeout('GAP/BROB/BCST/BV-02-C', 0) == 0
+
+            # FAIL runs twice, the unknown test case takes the average
+            names = ['GAP/BROB/BCST/BV-01-C', 'GAP/BROB/BCST/BV-02-C', 'GAP/BROB/BCST/BV-03-C']
+            assert db.estimate_session_duration(names, 2) == pytest.approx(1.5 * (40 + 29.2))
+            assert db.estimate_session_duration(names, 2, percentile=95) == pytest.approx(1.5 * (40 + 100))
+            db.close()
+
+    def test_sharded_scheduler(self):
+        test_cases = [f'GAP/SEC/AUT/BV-{i:02}-C' for i in range(1, 25)]
+        # Every 4th test case has no statistics
+        durations = estimate_durations(test_cases, {tc: i for i, tc in enumerate(test_cases, 1) if i % 4})
+
+        loads = [sum(durations[tc] for tc in shard) for shard in plan_shards(test_cases, durations, 3)]
+        assert max(loads) - min(loads) <= max(durations.values())
+
+        scheduler = ShardScheduler(test_cases, durations, 3)
+        coordinator = ShardCoordinator(scheduler, lambda shard_id: {'shard_id': shard_id})
+        runs = []
+        lock = threading.Lock()
+
+        def run_shard(next_test_case, shard_id, delay):
+            while item := next_test_case():
+                with lock:
+                    runs.append((item[0], shard_id))
+                time.sleep(delay)
+
+        def run_worker(shard_id, delay):
+            worker = ShardWorker(coordinator.address, shard_id)
+            assert worker.hello == {'shard_id': shard_id}
+            run_shard(worker.next_test_case, shard_id, delay)
+            worker.close()
+
+        try:
+            with patch.dict(os.environ, coordinator.worker_env()):
+                # A worker lost in the middle of a test case
+                worker = ShardWorker(coordinator.address, 1)
+                lost_test_case, _ = worker.next_test_case()
+                worker.conn.close()
+                while scheduler.in_flight[1] is not None:
+                    time.sleep(0.01)
+
+                # Shard 2 is slow, so its test cases are stolen
+                threads = [threading.Thread(target=run_worker, args=(1, 0.001)),
+                           threading.Thread(target=run_worker, args=(2, 0.05))]
+                for thread in threads:
+                    thread.start()
+
+                run_shard(lambda: scheduler.next_test_case(0), 0, 0.001)
+
+                for thread in threads:
+                    thread.join()
+        finally:
+            coordinator.close()
+
+        assert sorted(tc for tc, _ in runs) == sorted(test_cases)
+        assert lost_test_case in scheduler.requeued
+        assert scheduler.stolen > 0
+        assert len([tc for tc, shard_id in runs if shard_id == 2]) < len(test_cases) // 3
+
+    def test_wid_step_wakes_waiter(self):
+        test_case = TestCase('GAP', 'GAP/SEC/AUT/BV-11-C')
+        test_case.reset()
+        result = ResultWithFlag()
+        test_case.on_step_queued = result.notify
+
+        def send_wid():
+            time.sleep(0.05)
+            test_case.on_implicit_send('GAP', 108, 'GAP/SEC/AUT/BV-11-C', 'Please start', 0)
+
+        thread = threading.Thread(target=send_wid)
+        start = time.monotonic()
+        thread.start()
+        result.get(timeout=5, predicate=test_case.steps_queue.empty)
+        elapsed = time.monotonic() - start
+        thread.join()
+
+        # Not woken by the 1 second periodic check
+        assert elapsed < 0.5
+        assert not test_case.steps_queue.empty()
+        assert len(test_case.wid_queued_times) == 1
+
+    def test_wait_condition_stress(self):
+        threads_before = threading.active_count()
+        max_threads = threads_before
+
+        # Expired timed waits do not leave any helper threads behind
+        result = ResultWithFlag()
+        for _ in range(2000):
+            with pytest.raises(TimeoutError):
+                result.wait(timeout=0.0001)
+            max_threads = max(max_threads, threading.active_count())
+
+        assert max_threads == threads_before
+
+        # Wake-up latency of a result passed back and forth between threads
+        rounds = 2000
+        ping = ResultWithFlag()
+        pong = ResultWithFlag()
+        latencies = []
+
+        def pong_task():
+            for _ in range(rounds):
+                sent = ping.get(timeout=5, clear=True)
+                latencies.append(time.perf_counter() - sent)
+                pong.set(True)
+
+        thread = threading.Thread(target=pong_task)
+        thread.start()
+        for _ in range(rounds):
+            ping.set(time.perf_counter())
+            pong.get(timeout=5, clear=True)
+            max_threads = max(max_threads, threading.active_count())
+        thread.join()
+
+        assert max_threads == threads_before + 1
+        latencies.sort()
+        assert latencies[int(len(latencies) * 0.99)] < 0.05
+
+        # Many threads counted, the waiter is woken up by the last one
+        counter = CounterWithFlag(init_count=0)
+        threads = [threading.Thread(target=counter.add, args=(1,)) for _ in range(100)]
+        for thread in threads:
+            thread.start()
+        start = time.perf_counter()
+        counter.wait_for(100, timeout=5)
+        assert time.perf_counter() - start < 0.5
+        for thread in threads:
+            thread.join()
+
     def test_gap_set_uuid16_svc_data(self):
         advData = {}
         # Test invalid inputs
@@ -395,6 +644,765 @@ class MyTestCase(unittest.TestCase):
         except Exception as e:
             self.fail(f"Function raised unexpected exception: {e}")
 
+    def test_btp_worker_read(self):
+        worker = BTPWorker(None)
+
+        with pytest.raises(TimeoutError):
+            worker.read(timeout=0.1)
+
+        frame = ('hdr', 'data')
+        timer = threading.Timer(0.1, worker._rx_queue.put, [frame])
+        timer.start()
+
+        start = time.monotonic()
+        assert worker.read(timeout=5) == frame
+        assert time.monotonic() - start < 1
+        timer.join()
+
+    def test_btp_worker_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            address = os.path.join(tmp_dir, 'bt-stack-tester')
+            socket_srv = BTPSocketSrv()
+            socket_srv.open(address)
+            worker = BTPWorker(socket_srv)
+            stub = LoopbackBTPStub(address, fail_ops=(defs.BTP_GATT_CMD_ADD_DESCRIPTOR,))
+            stub.connect()
+            stub.start()
+            worker.accept()
+
+            try:
+                set_val = (defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_SET_VALUE, defs.BTP_INDEX_NONE, b'')
+                add_desc = (defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_ADD_DESCRIPTOR, defs.BTP_INDEX_NONE, b'')
+
+                assert worker.send_batch([set_val] * 5, window=2) == [(b'',)] * 5
+
+                with pytest.raises(BTPBatchError) as exc_info:
+                    worker.send_batch([set_val, set_val, add_desc, set_val, set_val], window=4)
+                assert exc_info.value.index == 2
+
+                def run_batched():
+                    with worker.batch():
+                        # Responses are placeholders until the end of the batch
+                        worker.send(*set_val)
+                        hdr, _ = worker.read()
+                        assert hdr.op == defs.BTP_GATT_CMD_SET_VALUE
+                        worker.send(*add_desc)
+                        worker.read()
+
+                with pytest.raises(BTPBatchError) as exc_info:
+                    run_batched()
+                assert exc_info.value.index == 1
+
+                # Responses of the failed batch were drained
+                assert worker.send_wait_rsp(*set_val) == (b'',)
+            finally:
+                worker.close()
+                stub.close()
+
+    def test_gatt_server_fetch_db_cache(self):
+        stack = Stack()
+        stack.gatt_init()
+        attrs = [(1, Perm.read, '2800'), (2, Perm.read, 'AA50'), (3, Perm.read_enc, 'AA51')]
+
+        with patch('autopts.wid.gatt.get_stack', return_value=stack), \
+             patch('autopts.pybtp.btp.gatts_get_attrs', return_value=attrs) as get_attrs, \
+             patch('autopts.pybtp.btp.gatts_get_attr_val', return_value=(0, 2, b'\x40\xaa')) as get_attr_val:
+            db = gatt_server_fetch_db()
+            assert list(db.db) == [1, 2, 3]
+            assert get_attr_val.call_count == 3
+
+            assert gatt_server_fetch_db().db == db.db
+            assert get_attr_val.call_count == 3
+
+            stack.gatt.snapshot_invalidate(2)
+            gatt_server_fetch_db()
+            assert get_attr_val.call_args.args[2] == 2
+
+            # Read again after a failed read
+            stack.gatt.snapshot_invalidate(2)
+            get_attr_val.side_effect = BTPError('Read failed')
+            with pytest.raises(BTPError):
+                gatt_server_fetch_db()
+            get_attr_val.side_effect = None
+            gatt_server_fetch_db()
+            assert get_attr_val.call_args.args[2] == 2
+            assert get_attr_val.call_count == 6
+
+            stack.gatt.snapshot_invalidate_secured()
+            gatt_server_fetch_db()
+            assert get_attr_val.call_args.args[2] == 3
+            assert get_attr_val.call_count == 7
+
+            stack.gatt.snapshot_invalidate()
+            gatt_server_fetch_db()
+            assert get_attrs.call_count == 2
+            assert get_attr_val.call_count == 10
+
+            # A command of another service may change the values, e.g. the volume
+            with patch('autopts.pybtp.btp.btp.get_stack', return_value=stack):
+                command_handler(defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_GET_ATTRIBUTES)
+                gatt_server_fetch_db()
+                assert get_attrs.call_count == 2
+
+                command_handler(defs.BTP_SERVICE_ID_VCS, 0x02)
+                gatt_server_fetch_db()
+                assert get_attrs.call_count == 3
+                assert get_attr_val.call_count == 13
+
+    def test_event_queue_wait(self):
+        queue = EventQueue()
+
+        assert wait_event_with_condition(queue, lambda *_: True, 0.1, True) is None
+
+        timer = threading.Timer(0.1, queue.append, [(1, 'addr')])
+        timer.start()
+
+        start = time.monotonic()
+        ev = wait_event_with_condition(queue, lambda _id, _addr: _id == 1, 5, True)
+        assert ev == (1, 'addr')
+        assert time.monotonic() - start < 1
+        assert len(queue) == 0
+        timer.join()
+
+    def test_wire_log_format_frame(self):
+        frame = enc_frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_CMD_READ_CONTROLLER_INFO,
+                          defs.BTP_INDEX_NONE, bytearray(b'\x01\x02'))
+        lines = format_frame(0, DIR_CMD, frame).splitlines()
+        assert lines[0].endswith('    > BTP_GAP_CMD_READ_CONTROLLER_INFO (0x01|0x03|0xff)')
+        assert lines[1] == ' ' * 18 + 'raw data (2): 01 03 ff 02 00|01 02'
+
+        frame = enc_frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_STATUS, defs.BTP_INDEX_NONE, bytearray(b'\x03'))
+        lines = format_frame(0, DIR_RSP, frame).splitlines()
+        assert lines[0].endswith('    < BTP_ERROR (0x01|0x00|0xff) Not Ready')
+        assert lines[1] == ' ' * 18 + 'raw data (1): 01 00 ff 01 00 03'
+
+    def test_wire_capture(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            capture_path = os.path.join(tmp_dir, 'autopts-iutctl.btpsnoop')
+            cmd = enc_frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_CMD_READ_CONTROLLER_INFO,
+                            defs.BTP_INDEX_NONE, bytearray(b'\x01'))
+            rsp = enc_frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_STATUS, defs.BTP_INDEX_NONE, bytearray(b'\x01'))
+
+            capture = WireCaptureWriter(capture_path, 'IUT1')
+            capture.record(DIR_CMD, cmd)
+            capture.record(DIR_RSP, rsp)
+            capture.close()
+
+            with open(capture_path, 'ab') as f:
+                # Record cut off by an interrupted run
+                f.write(b'\x00' * 5)
+
+            records = list(read_capture(capture_path))
+            assert [(r[1], r[2], r[3]) for r in records] == [(DIR_CMD, 'IUT1', cmd), (DIR_RSP, 'IUT1', rsp)]
+            assert records[0][0] <= records[1][0]
+
+    def test_iut_wrapper_select(self):
+        args = type('Args', (), {})()
+        args.iut_targets_args = {'iut0': target_args('iut0'), 'iut1': target_args('iut1')}
+        wrapper = create_zephyr_ctl_class(True)(args)
+        iut0, iut1 = wrapper._iut_targets['iut0'], wrapper._iut_targets['iut1']
+
+        iut = wrapper.handle()
+        assert hasattr(iut, 'select_iut')
+        assert hasattr(iut, 'remove_flash_bin')
+        assert iut.stack is iut0.stack
+        assert iut0.boot_log == 'Booting Zephyr OS build'
+
+        # The reference held across select_iut follows the selection
+        iut.select_iut(1)
+        assert iut.stack is iut1.stack
+        assert wrapper.iut_target_name == 'iut1'
+        iut.btp_socket = 'socket1'
+        assert iut1.btp_socket == 'socket1'
+        assert iut0.btp_socket is None
+
+        # Other threads start with the first IUT and select their own
+        selected = []
+
+        def select_in_thread():
+            selected.append(wrapper.handle().iut_target_name)
+            wrapper.handle().select_iut(iut_name='iut1')
+            selected.append(wrapper.handle().iut_target_name)
+
+        thread = threading.Thread(target=select_in_thread)
+        thread.start()
+        thread.join()
+        assert selected == ['iut0', 'iut1']
+
+        iut.select_iut(0)
+        assert wrapper.handle() is iut
+        assert iut.iut_target_name == 'iut0'
+
+    def test_pixit_mirror(self):
+        class Pts:
+            def __init__(self):
+                self.pixit_mirror = {}
+                self.calls = []
+
+            def set_pixits(self, project_name, pixits):
+                self.calls.append((project_name, pixits))
+
+        def set_pixits(ptses):
+            ptses[0].set_pixit('GAP', 'TSPX_mtu_size', '23')
+            ptses[0].set_pixit('GAP', 'TSPX_time_guard', '180000')
+            ptses[1].set_pixit('GAP', 'TSPX_mtu_size', '23')
+
+        ptses = [Pts(), Pts()]
+
+        for _ in range(2):
+            recorders = [PixitRecorder(pts) for pts in ptses]
+            set_pixits(recorders)
+            for recorder in recorders:
+                apply_pixits(recorder.pts, recorder.pixits)
+
+        assert ptses[0].calls == [('GAP', {'TSPX_mtu_size': '23', 'TSPX_time_guard': '180000'})]
+        assert ptses[1].calls == [('GAP', {'TSPX_mtu_size': '23'})]
+
+        # Set by a test case directly, only this one is set back
+        update_pixit_mirror(ptses[0], 'GAP', {'TSPX_time_guard': '360000'})
+        recorders = [PixitRecorder(pts) for pts in ptses]
+        set_pixits(recorders)
+        apply_pixits(ptses[0], recorders[0].pixits)
+        assert ptses[0].calls[-1] == ('GAP', {'TSPX_time_guard': '180000'})
+
+    def test_pts_server_proxy_keepalive(self):
+        server = StubServer(KeepAliveXMLRPCRequestHandler)
+        server.start()
+        proxy = PtsServerProxy('127.0.0.1', server.port)
+
+        try:
+            assert proxy.ready()
+            connection = proxy('transport')._connection[1]
+            assert proxy.multicall([('ready', ()), ('get_version', ())]) == [True, 0x00080600]
+            assert proxy('transport')._connection[1] is connection
+
+            calls = server.pts.calls
+            assert proxy.bd_addr() == proxy.bd_addr()
+            assert server.pts.calls == calls + 1
+
+            proxy.open_workspace()
+            proxy.bd_addr()
+            assert server.pts.calls == calls + 3
+
+            # The kept connection does not delay another client
+            other = PtsServerProxy('127.0.0.1', server.port)
+            start = time.monotonic()
+            assert other.get_version() == 0x00080600
+            assert time.monotonic() - start < SERIAL_IDLE_TIMEOUT / 2
+            other('close')()
+            assert proxy.ready()
+        finally:
+            proxy('close')()
+            server.close()
+
+    def test_log_callback_worker(self):
+        class Logger:
+            def __init__(self):
+                self.messages = []
+
+            def info(self, message):
+                self.messages.append(message)
+
+        logger = Logger()
+        worker = LogCallbackWorker(logger)
+        for i in range(3):
+            worker.put((ptstypes.PTS_LOGTYPE_RECEIVE_EVENT, 'Receive Event', f'{i}', 'message', 'GAP/TEST'))
+
+        with worker.deferred():
+            worker.start()
+            time.sleep(0.1)
+            assert not logger.messages
+
+        worker.stop()
+        assert not worker.is_alive()
+        assert len(logger.messages) == 1
+        assert len(logger.messages[0].splitlines()) == 3
+
+    def test_settle_time(self):
+        iut = SimpleNamespace(iut_mode='native', stack=Stack(), is_running=True)
+        iut.stop = lambda: setattr(iut, 'is_running', False)
+        tc = ZTestCase('GAP', 'GAP/TEST/BV-01-C')
+        tc.get_iut = lambda: iut
+        tc.run_pre_and_post_sp = False
+
+        for settle_time in (0.2, 0):
+            tc.state, tc.status = 'FINISHED', 'PASS'
+
+            try:
+                configure_settle(settle_time)
+                with patch('autopts.ptsprojects.zephyr.ztestcase.get_iut', return_value=iut):
+                    start = time.monotonic()
+                    tc.post_run('')
+                    assert settle_time <= time.monotonic() - start < settle_time + 0.5
+            finally:
+                configure_settle()
+
+    def test_test_case_pipeline(self):
+        calls = []
+
+        def test_case(name):
+            tc = TestCaseLT1('GAP', name, [TestFuncStart(calls.append, f'start {name}'),
+                                           TestFuncCleanUp(calls.append, f'cleanup {name}')],
+                             ptsproject_name='zephyr')
+            tc.run_pre_and_post_sp = False
+            return tc
+
+        test_cases = [test_case('GAP/TEST/BV-01-C'), test_case('GAP/TEST/BV-02-C')]
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('autopts.client.get_iut', return_value=SimpleNamespace(iut_mode='native')):
+            pipeline = TestCasePipeline(tmp_dir)
+            pipeline.prepare('GAP/TEST/BV-01-C', [None], test_cases)
+            test_case_lts = pipeline.take('GAP/TEST/BV-01-C', [None], test_cases)
+            assert test_case_lts == [test_cases[0]]
+            assert calls == ['start GAP/TEST/BV-01-C']
+
+            test_cases[0].pre_run()
+            assert calls == ['start GAP/TEST/BV-01-C']
+
+            # Retried instead
+            pipeline.prepare('GAP/TEST/BV-02-C', [None], test_cases)
+            assert pipeline.take('GAP/TEST/BV-01-C', [None], test_cases) is None
+            assert calls[1:] == ['start GAP/TEST/BV-02-C', 'cleanup GAP/TEST/BV-02-C']
+            assert not test_cases[1].prestarted
+
+            # Run on another PTS instead
+            pipeline.prepare('GAP/TEST/BV-02-C', [None], test_cases)
+            assert pipeline.take('GAP/TEST/BV-02-C', [SimpleNamespace()], test_cases) is None
+            assert not test_cases[1].prestarted
+
+        # Prepared only with the IUT map and PTSes of the previous test case
+        iut_maps = {'GAP/TEST/BV-01-C': {'0': 'iut0'}, 'GAP/TEST/BV-02-C': {'0': 'iut1'}}
+        kwargs = {'pre_test_case_fn': lambda **_: None,
+                  'test_case_selection_fn': lambda test_case, **_: iut_maps.get(test_case, {'0': 'iut0'})}
+        assert same_test_case_selection('GAP/TEST/BV-01-C', 'GAP/TEST/BV-03-C', **kwargs)
+        assert not same_test_case_selection('GAP/TEST/BV-01-C', 'GAP/TEST/BV-02-C', **kwargs)
+        assert not same_test_case_selection('GAP/TEST/BV-01-C', 'GAP/TEST/BV-03-C', pre_test_case_fn=print)
+        assert same_test_case_selection('GAP/TEST/BV-01-C', 'GAP/TEST/BV-02-C')
+
+        pts = SimpleNamespace(bd_addr=lambda: '00:1B:DC:F2:20:3A')
+        client = SimpleNamespace(ptses=[pts], args=SimpleNamespace(iut_target_selection={
+            'default_iut_map': iut_maps['GAP/TEST/BV-01-C'],
+            'rules': [{'test_cases': ['GAP/TEST/BV-02-C'], 'iut_map': iut_maps['GAP/TEST/BV-02-C']}]}))
+        client.get_iut_map = lambda test_case: Client.get_iut_map(client, test_case)
+        kwargs['test_case_selection_fn'] = lambda **kwargs: Client.get_test_case_selection(client, **kwargs)
+        with patch('autopts.client.get_iut', return_value=SimpleNamespace(select_iut=None)):
+            assert same_test_case_selection('GAP/TEST/BV-01-C', 'GAP/TEST/BV-03-C', **kwargs)
+            assert not same_test_case_selection('GAP/TEST/BV-01-C', 'GAP/TEST/BV-02-C', **kwargs)
+
+        # The PIXITs are set with the method of the client
+        args = SimpleNamespace(pipeline=True, test_cases=[], deferred_retry=False, repeat_until_fail=False,
+                               stress_test=False)
+        set_pixits = MagicMock()
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('autopts.client.TestCasePipeline') as pipeline_class:
+            stats = TestCaseRunStats(['GAP'], [], 0, xml_results_file=os.path.join(tmp_dir, 'results.xml'))
+            stats.session_log_dir = tmp_dir
+            run_test_cases([], [], args, stats, pre_test_case_fn=print, setup_project_pixits=set_pixits)
+            pipeline_class.assert_called_once_with(tmp_dir, set_pixits)
+
+    def test_iut_pool(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            kernel_image = os.path.join(tmp_dir, 'zephyr.exe')
+            with open(kernel_image, 'w') as f:
+                f.write(f"""import socket, sys, time
+sock = socket.socket(socket.AF_UNIX)
+sock.connect(sys.argv[1])
+sock.sendall(bytes([{defs.BTP_SERVICE_ID_CORE}, {defs.BTP_CORE_EV_IUT_READY}, 0xff, 0, 0]))
+time.sleep(30)
+""")
+
+            iutctl = SimpleNamespace(iut_target_name='test', btp_address=os.path.join(tmp_dir, 'btp'),
+                                     kernel_image=kernel_image, hci=0, tty_baudrate=None, rtscts=False,
+                                     get_native_cmd=lambda kernel_image, btp_address, **kwargs:
+                                     f'{sys.executable} {kernel_image} {btp_address}')
+
+            with patch.dict('autopts.ptsprojects.iut_pool.FILE_PATHS', {'TMP_DIR': tmp_dir}):
+                pool = IutPool(iutctl, 1)
+            try:
+                pool.fill()
+                warm = pool.take()
+                assert warm.native.is_running()
+                warm.close()
+
+                # Rebuilt image
+                os.utime(kernel_image, ns=(0, 0))
+                warm = pool.take()
+                assert warm.image_stamp == (0, os.path.getsize(kernel_image))
+                warm.close()
+            finally:
+                pool.close()
+
+    def test_iut_pool_reset(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            kernel_image = os.path.join(tmp_dir, 'zephyr.exe')
+            with open(kernel_image, 'w') as f:
+                f.write(f"""import socket, sys, time
+with open('flash.bin', 'a') as f:
+    f.write('boot')
+sock = socket.socket(socket.AF_UNIX)
+sock.connect(sys.argv[1])
+sock.sendall(bytes([{defs.BTP_SERVICE_ID_CORE}, {defs.BTP_CORE_EV_IUT_READY}, 0xff, 0, 0]))
+time.sleep(30)
+""")
+
+            iutctl = object.__new__(IutCtl)
+            iutctl.__dict__.update(
+                iut_target_name='test', iut_mode='native', btp_address=os.path.join(tmp_dir, 'btp'),
+                kernel_image=kernel_image, hci=0, tty_baudrate=None, rtscts=False, gdb=None,
+                hid_serial=None, btp_log=False, iut_pool_size=1, _iut_pool=None, _warm_iut=None,
+                _iut_resetting=False, _btattach_at_every_test_case=False, _btattach=None, _btmon=None,
+                _native=NativeIUT(), _save_qemu_snapshot=False, is_running=False, btp_socket=None,
+                stack=MagicMock(),
+                get_native_cmd=lambda kernel_image, btp_address, **kwargs:
+                f'{sys.executable} {kernel_image} {btp_address}')
+            iutctl._start_mode = iutctl._start_native_mode
+            iutctl._stop_mode = iutctl._stop_native_mode
+            test_case = SimpleNamespace(name='GAP/TEST/BV-01-C', log_dir=tmp_dir)
+
+            with patch.dict('autopts.ptsprojects.iut_pool.FILE_PATHS', {'TMP_DIR': tmp_dir}), \
+                    patch('autopts.ptsprojects.iutctl.BTPWorker'), \
+                    patch('autopts.ptsprojects.iutctl.btp.gap.gap_set_powered_off'):
+                try:
+                    # The first start fills the pool
+                    iutctl.start(test_case)
+                    iutctl.stop()
+
+                    iutctl.start(test_case)
+                    warm = iutctl._warm_iut
+                    flash_bin = os.path.join(warm.work_dir, 'flash.bin')
+                    assert warm is not None
+
+                    # A reset in the middle of the test case keeps the flash.bin
+                    iutctl.wait_iut_ready_event()
+                    assert iutctl._warm_iut is warm
+                    while not iutctl._native.is_running() or os.path.getsize(flash_bin) < 8:
+                        time.sleep(0.01)
+                    with open(flash_bin) as f:
+                        assert f.read() == 'bootboot'
+
+                    iutctl.stop()
+                    assert iutctl._warm_iut is None
+                    assert not os.path.exists(warm.work_dir)
+                finally:
+                    iutctl.stop()
+                    iutctl.close_iut_pool()
+
+    def test_qemu_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            kernel_image = os.path.join(tmp_dir, 'zephyr.elf')
+            with open(kernel_image, 'wb') as f:
+                f.write(b'image 1')
+
+            qemu_cmd = get_qemu_cmd(kernel_image, 'qemu-system-arm')
+            snapshot = QemuSnapshot(tmp_dir, 'test', os.path.join(tmp_dir, 'qmp'))
+            assert not snapshot.update(kernel_image, qemu_cmd)
+
+            # Saved by an earlier run
+            with open(snapshot.path, 'wb') as f:
+                f.write(b'vm state')
+            first_path = snapshot.path
+
+            snapshot = QemuSnapshot(tmp_dir, 'test', os.path.join(tmp_dir, 'qmp'))
+            assert snapshot.update(kernel_image, qemu_cmd)
+            assert snapshot.verify()
+            assert f"-incoming 'exec:cat {snapshot.path}'" in snapshot.restore_cmd(qemu_cmd)
+
+            with open(snapshot.path, 'ab') as f:
+                f.write(b' modified')
+            assert not snapshot.verify()
+            assert not os.path.exists(first_path)
+
+            with open(first_path, 'wb') as f:
+                f.write(b'vm state')
+            # Rebuilt with the same size and mtime
+            stat = os.stat(kernel_image)
+            with open(kernel_image, 'wb') as f:
+                f.write(b'image 2')
+            os.utime(kernel_image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            assert not snapshot.update(kernel_image, qemu_cmd)
+            assert snapshot.path != first_path
+            assert not os.path.exists(first_path)
+
+    def test_build_cache(self):
+        builds = []
+
+        def stub_build(build_dir):
+            builds.append(build_dir)
+            os.makedirs(os.path.join(build_dir, 'zephyr', 'CMakeFiles'))
+            for name in ('zephyr.exe', 'CMakeFiles/zephyr.o'):
+                with open(os.path.join(build_dir, 'zephyr', name), 'w') as f:
+                    f.write(build_dir)
+            os.chmod(os.path.join(build_dir, 'zephyr', 'zephyr.exe'), 0o755)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            overlay = os.path.join(tmp_dir, 'overlay.conf')
+            with open(overlay, 'w') as f:
+                f.write('CONFIG_BT_EATT=y\n')
+
+            key = build_key('source', 'native_sim', [overlay])
+            cache = BuildCache(os.path.join(tmp_dir, 'cache'), max_entries=1)
+            builder = BackgroundBuilder(cache)
+            builder.submit(key, stub_build)
+            builder.wait(key)
+            assert key in cache
+
+            build_dir = os.path.join(tmp_dir, 'build')
+            assert cache.build(key, build_dir, stub_build)
+            assert len(builds) == 1
+            assert os.access(os.path.join(build_dir, 'zephyr', 'zephyr.exe'), os.X_OK)
+            assert not os.path.exists(os.path.join(build_dir, 'zephyr', 'CMakeFiles'))
+
+            with open(overlay, 'a') as f:
+                f.write('CONFIG_BT_SMP=y\n')
+            key2 = build_key('source', 'native_sim', [overlay])
+            assert key2 != key
+            assert not cache.build(key2, build_dir, stub_build)
+            assert len(builds) == 2
+            # Pruned
+            assert key not in cache
+
+    def test_build_cache_tty_flash(self):
+        def stub_build(build_dir):
+            # A sysbuild build with the absolute path of its domains
+            app_dir = os.path.join(os.path.abspath(build_dir), 'app')
+            os.makedirs(os.path.join(app_dir, 'zephyr'))
+            with open(os.path.join(build_dir, 'domains.yaml'), 'w') as f:
+                f.write(f'default: app\ndomains:\n- name: app\n  build_dir: {app_dir}\n')
+            with open(os.path.join(app_dir, 'CMakeCache.txt'), 'w') as f:
+                f.write(f'CMAKE_CACHEFILE_DIR:INTERNAL={app_dir}\n')
+            with open(os.path.join(app_dir, 'zephyr', 'zephyr.hex'), 'w') as f:
+                f.write(':00000001FF\n')
+
+        def stub_flash(build_dir):
+            # As west flash --skip-rebuild, from the domains of the build
+            with open(os.path.join(build_dir, 'domains.yaml')) as f:
+                app_dir = f.read().split('build_dir: ')[1].strip()
+            with open(os.path.join(app_dir, 'CMakeCache.txt')) as f:
+                assert f.read() == f'CMAKE_CACHEFILE_DIR:INTERNAL={app_dir}\n'
+            with open(os.path.join(app_dir, 'zephyr', 'zephyr.hex')) as f:
+                return app_dir, f.read()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            key = build_key('source', 'nrf52840dk/nrf52840', [])
+            cache = BuildCache(os.path.join(tmp_dir, 'cache'))
+            builder = BackgroundBuilder(cache)
+            builder.submit(key, stub_build)
+            builder.wait(key)
+            # The background build directory is gone
+            assert os.listdir(cache.cache_dir) == [key]
+
+            build_dir = os.path.join(tmp_dir, 'tester', 'build')
+            assert cache.restore(key, build_dir)
+            assert stub_flash(build_dir) == (os.path.join(build_dir, 'app'), ':00000001FF\n')
+            assert not os.path.exists(os.path.join(build_dir, BUILD_DIR_FILE))
+
+    def test_btp_serial(self):
+        master, slave = os.openpty()
+        btp_serial = BTPSerial()
+        btp_serial.open(os.ttyname(slave), 115200, rtscts=False)
+
+        def responder():
+            cmd = b''
+            while len(cmd) < HDR_LEN:
+                cmd += os.read(master, HDR_LEN - len(cmd))
+            # Garbage of a reset in the middle of a frame
+            os.write(master, b'\x55\xaa' + enc_frame(cmd[0], cmd[1], cmd[2], b'\x01'))
+            # Stalled frame
+            os.write(master, bytes([defs.BTP_SERVICE_ID_GAP, 0x80, 0, 3]))
+            time.sleep(0.3)
+            os.write(master, enc_frame(defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_EV_IUT_READY,
+                                       defs.BTP_INDEX_NONE, b''))
+
+        thread = threading.Thread(target=responder)
+        thread.start()
+
+        try:
+            with patch('autopts.pybtp.iutctl_common.BTP_SERIAL_FRAME_TIMEOUT', 0.1):
+                btp_serial.send(defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                                defs.BTP_INDEX_NONE, b'')
+                hdr, data = btp_serial.read(timeout=2)
+                assert hdr.op == defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS
+                assert data == (b'\x01',)
+
+                hdr, data = btp_serial.read(timeout=2)
+                assert (hdr.svc_id, hdr.op) == (defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_EV_IUT_READY)
+
+                with pytest.raises(TimeoutError):
+                    btp_serial.read(timeout=0.1)
+        finally:
+            thread.join()
+            btp_serial.close_port()
+            os.close(master)
+            os.close(slave)
+
+    def test_run_recovery(self):
+        calls = []
+
+        class StubPts:
+            def __init__(self, name, lost_requests):
+                self.name = name
+                self.lost_requests = lost_requests
+                self.callback = ClientCallback()
+                self.pixit_mirror = {}
+
+            def recover_pts(self):
+                calls.append(self.name)
+                if self.lost_requests:
+                    self.lost_requests -= 1
+                    return
+                # Answered by the callback of the server
+                threading.Timer(0.05, self.callback.set_result, ('recover_pts', True)).start()
+
+            def __str__(self):
+                return self.name
+
+        iut = SimpleNamespace(stop=lambda: calls.append('stop'),
+                              cleanup_stack=lambda: calls.append('cleanup'))
+        ptses = [StubPts('pts0', 0), StubPts('pts1', 1)]
+        args = SimpleNamespace(iut_map={'0': 'iut0'}, usb_replug_available=False,
+                               max_server_restart_time=0.5, superguard=0)
+
+        try:
+            with patch('autopts.client.get_iut', return_value=iut):
+                run_recovery(args, ptses)
+        finally:
+            for pts in ptses:
+                pts.callback.log_worker.stop()
+
+        # Only the stuck instance is requested again
+        assert calls.count('pts0') == 1
+        assert calls.count('pts1') == 2
+        assert calls.count('stop') == 1
+        assert calls[-1] == 'cleanup'
+
+    def test_order_test_cases(self):
+        def reg_gap():
+            pass
+
+        def reg_gatt():
+            pass
+
+        def test_case(name, *funcs, iut_count=1):
+            cmds = [TestFunc(func) for func in funcs]
+            cmds += [TestFunc(lambda: None, start_wid=100),
+                     TestFunc(lambda: FakeProxy().update_pixit_param('GAP', 'TSPX_bd_addr_iut', name)),
+                     TestFuncCleanUp(reg_gap)]
+            return TestCaseLT1(name.split('/')[0], name, cmds, iut_count=iut_count)
+
+        test_cases = [test_case('GAP/A/BV-01-C', reg_gap),
+                      test_case('GAP/B/BV-01-C', reg_gap, reg_gatt),
+                      test_case('GAP/A/BV-02-C', reg_gap),
+                      test_case('GAP/B/BV-02-C', reg_gap, reg_gatt),
+                      test_case('GAP/C/BV-01-C', reg_gap, iut_count=2),
+                      test_case('GAP/A/BV-03-C', reg_gap)]
+        names = [tc.name for tc in test_cases]
+
+        signatures = get_signatures(names, test_cases)
+        # WID triggered and clean-up functions are not preconditions
+        assert signatures['GAP/A/BV-01-C'] == signatures['GAP/A/BV-02-C']
+        assert signatures['GAP/A/BV-01-C'] != signatures['GAP/B/BV-01-C']
+
+        durations = {'GAP/A/BV-03-C': 10, 'GAP/A/BV-01-C': 20}
+        plan = order_test_cases(names, signatures, durations)
+        assert plan == ['GAP/A/BV-03-C', 'GAP/A/BV-01-C', 'GAP/A/BV-02-C',
+                        'GAP/B/BV-01-C', 'GAP/B/BV-02-C', 'GAP/C/BV-01-C']
+
+        report = simulate_order(names, plan, signatures, transition_time=2)
+        assert report['transitions'] == 6
+        assert report['planned_transitions'] == 3
+        assert report['planned_components'] == {'project': 0, 'iut_count': 1, 'stack': 2, 'pixits': 0}
+        assert report['time_saved'] == 6
+
+        # The next group is the nearest to the last placed one
+        signatures = {'t1': Preconditions('GAP', 1, 'stack1', 'pixits1'),
+                      't2': Preconditions('L2CAP', 2, 'stack2', 'pixits2'),
+                      't3': Preconditions('GAP', 1, 'stack1', 'pixits2')}
+        plan = order_test_cases(['t1', 't2', 't3'], signatures)
+        assert plan == ['t1', 't3', 't2']
+        assert count_transitions(['t1', 't2', 't3'], signatures) == 7
+        assert count_transitions(plan, signatures) == 4
+
+    def test_deferred_retry(self):
+        results = {'GAP/A/BV-01-C': ['BTP TIMEOUT', 'PASS'],
+                   'GAP/B/BV-01-C': ['FAIL', 'FAIL', 'PASS'],
+                   'GAP/C/BV-01-C': ['PASS']}
+        runs = []
+        recoveries = []
+
+        def fake_run_test_case(ptses, test_case_instances, test_case_name, stats, *args, **kwargs):
+            runs.append(test_case_name)
+            return results[test_case_name].pop(0)
+
+        test_cases = list(results)
+        args = SimpleNamespace(retry=2, retry_config=None, repeat_until_fail=False, stress_test=False,
+                               deferred_retry=True, retry_slot=0, retry_backoff=0,
+                               no_retry_on_regression=None, recovery=True,
+                               not_recover=['PASS', 'INCONC', 'FAIL', 'NOT_IMPLEMENTED', 'INDCSV'],
+                               superguard=0, superguard_stats=False, test_cases=test_cases)
+        pts = SimpleNamespace(info='stub', bd_addr=lambda: '00:01:02:03:04:05')
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('autopts.client.run_test_case', run_test_case_wrapper(fake_run_test_case)), \
+                patch('autopts.client.run_recovery', lambda args, ptses: recoveries.append(runs[-1])):
+            stats = TestCaseRunStats(['GAP'], test_cases, args.retry,
+                                     xml_results_file=os.path.join(tmp_dir, 'results.xml'))
+            stats.session_log_dir = tmp_dir
+            run_test_cases([pts], None, args, stats)
+
+            # Retried at the end, the repeated FAIL is not retried again
+            assert runs == test_cases + ['GAP/A/BV-01-C', 'GAP/B/BV-01-C']
+            # Once, before the next test case
+            assert recoveries == ['GAP/A/BV-01-C']
+
+            tc_results = stats.get_results()
+            assert tc_results['GAP/A/BV-01-C']['status'] == 'PASS'
+            assert tc_results['GAP/A/BV-01-C']['run_count'] == '2'
+            assert tc_results['GAP/B/BV-01-C']['status'] == 'FAIL'
+            assert tc_results['GAP/B/BV-01-C']['run_count'] == '2'
+            assert tc_results['GAP/C/BV-01-C']['run_count'] == '1'
+            assert stats.index == len(test_cases)
+
+    def test_deferred_retry_shards(self):
+        # Test cases shared with other rigs, with their progress indexes
+        items = [('GAP/A/BV-01-C', 5), ('GAP/B/BV-01-C', 9), ('GAP/C/BV-01-C', 12)]
+        results = {'GAP/A/BV-01-C': ['BTP TIMEOUT', 'PASS'],
+                   'GAP/B/BV-01-C': ['PASS'],
+                   'GAP/C/BV-01-C': ['PASS']}
+        pulled = []
+        runs = []
+
+        def next_test_case():
+            if len(pulled) == len(items):
+                return None
+
+            pulled.append(items[len(pulled)])
+            return pulled[-1]
+
+        def fake_run_test_case(ptses, test_case_instances, test_case_name, stats, *args, **kwargs):
+            runs.append((test_case_name, stats.index, len(pulled)))
+            return results[test_case_name].pop(0)
+
+        test_cases = list(results)
+        args = SimpleNamespace(retry=2, retry_config=None, repeat_until_fail=False, stress_test=False,
+                               deferred_retry=True, retry_slot=0, retry_backoff=0,
+                               no_retry_on_regression=None, recovery=False, not_recover=[],
+                               superguard=0, superguard_stats=False, test_cases=test_cases)
+        pts = SimpleNamespace(info='stub', bd_addr=lambda: '00:01:02:03:04:05')
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('autopts.client.run_test_case', run_test_case_wrapper(fake_run_test_case)):
+            stats = TestCaseRunStats(['GAP'], test_cases, args.retry,
+                                     xml_results_file=os.path.join(tmp_dir, 'results.xml'))
+            stats.session_log_dir = tmp_dir
+            run_test_cases([pts], None, args, stats,
+                           test_case_source=iter_shard_test_cases(next_test_case, stats))
+
+            # Pulled one by one, the retry at the end with the index of the first run
+            assert runs == [('GAP/A/BV-01-C', 5, 1), ('GAP/B/BV-01-C', 9, 2),
+                            ('GAP/C/BV-01-C', 12, 3), ('GAP/A/BV-01-C', 5, 3)]
+            assert stats.get_results()['GAP/A/BV-01-C']['status'] == 'PASS'
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of sequential vs batched BTP command submission
+
+Sends a GATT server setup sized sequence of commands to a local loopback
+stub, once with send_wait_rsp per command and once with send_batch for
+each of the given windows. The stub delays its responses by --link-delay
+to emulate the transport latency of a UART or QEMU IUT; with no delay the
+in-process stub competes with the client for the GIL and batching cannot
+win anything.
+
+Usage:
+$ python3 -m tools.benchmarks.btp_batch --count 60 --link-delay 0.001 --window 2 4 16
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from autopts.pybtp import defs
+from autopts.pybtp.iutctl_common import BTPSocketSrv, BTPWorker
+from tools.benchmarks.common import LoopbackBTPStub, print_latency_summary
+
+
+def run(count, rounds, windows, link_delay):
+    cmd = (defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_SET_VALUE, defs.BTP_INDEX_NONE, b'\x00\x00\x01\x00\x01')
+    cmds = [cmd] * count
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        address = os.path.join(tmp_dir, 'bt-stack-tester')
+        socket_srv = BTPSocketSrv()
+        socket_srv.open(address)
+        worker = BTPWorker(socket_srv)
+
+        stub = LoopbackBTPStub(address, link_delay=link_delay)
+        stub.connect()
+        stub.start()
+        worker.accept()
+
+        try:
+            samples = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for c in cmds:
+                    worker.send_wait_rsp(*c)
+                samples.append(time.perf_counter() - start)
+
+            print_latency_summary(f'Sequential, {count} commands', samples, 1e3, 'ms')
+
+            for window in windows:
+                samples = []
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    worker.send_batch(cmds, window)
+                    samples.append(time.perf_counter() - start)
+
+                print_latency_summary(f'Batched, {count} commands, window {window}', samples, 1e3, 'ms')
+        finally:
+            worker.close()
+            stub.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs batched BTP command benchmark")
+    parser.add_argument('--count', type=int, default=60,
+                        help='Number of commands in a sequence')
+    parser.add_argument('--rounds', type=int, default=20,
+                        help='Number of measured sequences')
+    parser.add_argument('--window', type=int, nargs='+', default=[2, 4, 16],
+                        help='Batch windows to measure')
+    parser.add_argument('--link-delay', type=float, default=0.001,
+                        help='Emulated IUT transport latency of a response in seconds')
+    args = parser.parse_args()
+
+    run(args.count, args.rounds, args.window, args.link_delay)
+
+
+if __name__ == '__main__':
+    main()
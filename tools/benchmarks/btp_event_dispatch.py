@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Throughput benchmark of btp.event_handler
+
+Replays a stream of BTP event frames, as recorded from a BAP broadcast sink
+test, through the event handler running on a stack with GAP and BAP layers.
+
+Usage:
+$ python3 -m tools.benchmarks.btp_event_dispatch --count 100000
+"""
+
+import argparse
+import struct
+import time
+
+from autopts.ptsprojects.stack import Stack
+from autopts.pybtp import btp, defs
+from autopts.pybtp.parser import HDR_LEN, dec_data, dec_hdr
+
+PEER_ADDR = bytes.fromhex('c0ffee000001')
+
+
+class FakeIutCtl:
+    def __init__(self, stack):
+        self.stack = stack
+
+    def get_stack(self):
+        return self.stack
+
+
+def event_frame(svc_id, op, data):
+    return struct.pack('<BBBH', svc_id, op, 0, len(data)) + data
+
+
+def recorded_stream():
+    """One periodic advertising report followed by BIS stream data"""
+    eir = bytes.fromhex('020106')
+    frames = [event_frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_EV_DEVICE_FOUND,
+                          struct.pack('<B6sBBH', 0, PEER_ADDR, 0xc4, 0x04, len(eir)) + eir)]
+
+    iso_data = bytes(40)
+    stream_received = event_frame(defs.BTP_SERVICE_ID_BAP, defs.BTP_BAP_EV_STREAM_RECEIVED,
+                                  struct.pack('<B6sBB', 0, PEER_ADDR, 1, len(iso_data)) + iso_data)
+    frames.extend([stream_received] * 15)
+
+    return frames
+
+
+def decode(frame):
+    return dec_hdr(frame[:HDR_LEN]), dec_data(frame[HDR_LEN:])
+
+
+def run(count):
+    stack = Stack()
+    stack.gap_init()
+    stack.bap_init()
+    btp.init(lambda: FakeIutCtl(stack))
+
+    stream = [decode(frame) for frame in recorded_stream()]
+
+    handled = 0
+    start = time.perf_counter()
+    while handled < count:
+        for hdr, data in stream:
+            btp.event_handler(hdr, data)
+        handled += len(stream)
+
+        # Do not let the replay measure list growth
+        stack.gap.found_devices.data.clear()
+        stack.bap.event_queues[defs.BTP_BAP_EV_STREAM_RECEIVED].clear()
+
+    duration = time.perf_counter() - start
+
+    print(f'Events handled: {handled}')
+    print(f'Duration:       {duration:.3f} s')
+    print(f'Throughput:     {handled / duration:.0f} events/s')
+    print(f'Per event:      {duration / handled * 1e6:.2f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BTP event handler throughput benchmark")
+    parser.add_argument('--count', type=int, default=100000,
+                        help='Number of events to replay')
+    args = parser.parse_args()
+
+    run(args.count)
+
+
+if __name__ == '__main__':
+    main()
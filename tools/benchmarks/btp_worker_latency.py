@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Micro-benchmark of BTPWorker command/response round-trips
+
+Sends BTP commands to a local loopback stub and reports round-trip latency
+together with CPU time consumed by the client process. The stub runs in
+the same process, so the reported CPU time includes its share as well.
+The idle read measurement shows the CPU cost of waiting for a response
+that never arrives.
+
+Usage:
+$ python3 -m tools.benchmarks.btp_worker_latency --count 2000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from autopts.pybtp import defs
+from autopts.pybtp.iutctl_common import BTPSocketSrv, BTPWorker
+from autopts.pybtp.wirelog import WIRE_LOG_MODES, WIRE_LOG_TEXT
+from tools.benchmarks.common import LoopbackBTPStub, print_latency_summary
+
+
+def run(count, idle, wire_log):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        address = os.path.join(tmp_dir, 'bt-stack-tester')
+        socket_srv = BTPSocketSrv(tmp_dir, wire_log=wire_log)
+        socket_srv.open(address)
+        worker = BTPWorker(socket_srv)
+
+        stub = LoopbackBTPStub(address)
+        stub.connect()
+        stub.start()
+        worker.accept()
+
+        try:
+            samples = []
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+
+            for _ in range(count):
+                start = time.perf_counter()
+                worker.send_wait_rsp(defs.BTP_SERVICE_ID_CORE,
+                                     defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS,
+                                     defs.BTP_INDEX_NONE, b'')
+                samples.append(time.perf_counter() - start)
+
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+
+            print_latency_summary('Command/response latency', samples)
+            print(f'  wall:    {wall:.3f} s')
+            print(f'  cpu:     {cpu:.3f} s ({100 * cpu / wall:.0f}% of one core)')
+
+            if idle:
+                # A waiter with nothing to receive should not burn CPU
+                cpu_start = time.process_time()
+                try:
+                    worker.read(timeout=idle)
+                except TimeoutError:
+                    pass
+                cpu = time.process_time() - cpu_start
+                print(f'Idle read({idle} s) cpu: {cpu:.3f} s')
+        finally:
+            worker.close()
+            stub.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BTPWorker command/response latency benchmark")
+    parser.add_argument('--count', type=int, default=1000,
+                        help='Number of command/response round-trips')
+    parser.add_argument('--idle', type=float, default=2.0,
+                        help='Duration in seconds of an idle read measurement, 0 to skip')
+    parser.add_argument('--btp-log', type=str, choices=WIRE_LOG_MODES, default=WIRE_LOG_TEXT,
+                        help='BTP traffic log mode of the benchmarked socket')
+    args = parser.parse_args()
+
+    run(args.count, args.idle, args.btp_log)
+
+
+if __name__ == '__main__':
+    main()
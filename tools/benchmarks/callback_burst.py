@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of the WID callback latency during a burst of log callbacks
+
+Replays to a local client callback server a burst of PTS log callbacks,
+as with the maximum logging enabled, and meanwhile on_implicit_send
+callbacks every --wid-period. The burst is sent as fast as the server
+takes it, or at --log-rate. The log lines are written to a file in a
+temporary directory, each write delayed by --emit-delay to emulate a slow
+console or network share. It compares:
+- serial: the former server, one request at a time from a single thread
+  and the log callbacks written in the request,
+- ClientCallbackServer: a thread per connection and the log callbacks
+  written in batches by the LogCallbackWorker.
+
+Usage:
+$ python3 -m tools.benchmarks.callback_burst --logs 5000 --wid-period 0.01 --emit-delay 0.0005
+"""
+
+import argparse
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCServer
+
+from autopts import client
+from autopts.client import ClientCallback, ClientCallbackServer
+from autopts.ptsprojects import ptstypes
+from autopts.xmlrpc_keepalive import KeepAliveTransport
+from tools.benchmarks.common import print_latency_summary
+
+TEST_CASE = 'GAP/BENCH/BV-01-C'
+LOG_MESSAGE = 'HCI Rx: 04 3e 0c 02 01 00 00 4a 2f 11 40 b4 21 00 c0 ' * 4
+
+
+class SlowFileHandler(logging.FileHandler):
+    def __init__(self, filename, emit_delay):
+        super().__init__(filename)
+        self.emit_delay = emit_delay
+
+    def emit(self, record):
+        super().emit(record)
+        time.sleep(self.emit_delay)
+
+
+class StubTestCase:
+    def on_implicit_send(self, *args):
+        return None
+
+
+class SerialCallback(ClientCallback):
+    """ClientCallback writing the log callbacks in the request"""
+
+    def log(self, log_type, logtype_string, log_time, log_message, test_case_name):
+        logger = logging.getLogger(f"{ClientCallback.__name__}.log")
+        logger.info("%s %s %s %s %s", ptstypes.PTS_LOGTYPE_STRING[log_type],
+                    logtype_string, log_time, test_case_name, log_message)
+
+
+class SerialCallbackServer(threading.Thread):
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.server = SimpleXMLRPCServer(('127.0.0.1', port), allow_none=True, logRequests=False)
+        self.callback = SerialCallback()
+        self.server.register_instance(self.callback)
+        self.server.register_introspection_functions()
+        self.server.timeout = 1.0
+        self.end = False
+
+    def run(self):
+        while not self.end:
+            self.server.handle_request()
+
+        self.server.server_close()
+        self.callback.log_worker.stop()
+
+    def stop(self):
+        self.end = True
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def replay(title, server, port, logs, log_rate, wid_period):
+    server.start()
+    uri = f'http://127.0.0.1:{port}/'
+    log_proxy = xmlrpc.client.ServerProxy(uri, allow_none=True, transport=KeepAliveTransport())
+    wid_proxy = xmlrpc.client.ServerProxy(uri, allow_none=True, transport=KeepAliveTransport())
+    # The server binds in its thread
+    while True:
+        try:
+            log_proxy.system.listMethods()
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.01)
+    wid_proxy.system.listMethods()
+
+    burst_done = threading.Event()
+
+    def burst():
+        burst_start = time.perf_counter()
+        for i in range(logs):
+            if log_rate:
+                delay = burst_start + i / log_rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            log_proxy.log(ptstypes.PTS_LOGTYPE_RECEIVE_EVENT, 'Receive Event', f'{i}', LOG_MESSAGE, TEST_CASE)
+        burst_done.set()
+
+    latencies = []
+    start = time.perf_counter()
+    burst_thread = threading.Thread(target=burst)
+    burst_thread.start()
+
+    while not burst_done.is_set():
+        wid_start = time.perf_counter()
+        wid_proxy.on_implicit_send('GAP', 1, TEST_CASE, 'description', ptstypes.MMI_Style_Ok_Cancel2)
+        latencies.append(time.perf_counter() - wid_start)
+        time.sleep(wid_period)
+
+    burst_thread.join()
+    duration = time.perf_counter() - start
+
+    server.stop()
+    log_proxy('close')()
+    wid_proxy('close')()
+    server.join()
+
+    print(f'{title}: {logs / duration:.0f} log callbacks/s')
+    print_latency_summary(f'{title}, on_implicit_send during the burst', latencies, 1e3, 'ms')
+
+
+def run(logs, log_rate, wid_period, emit_delay):
+    client.RUNNING_TEST_CASE[TEST_CASE] = StubTestCase()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        handler = SlowFileHandler(os.path.join(tmp_dir, 'callbacks.log'), emit_delay)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        root_logger.setLevel(logging.INFO)
+
+        try:
+            port = get_free_port()
+            replay('serial', SerialCallbackServer(port), port, logs, log_rate, wid_period)
+
+            port = get_free_port()
+            replay('ClientCallbackServer', ClientCallbackServer(port, 'bench-callback'), port, logs, log_rate,
+                   wid_period)
+        finally:
+            root_logger.removeHandler(handler)
+            handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WID callback latency during a log callback burst")
+    parser.add_argument('--logs', type=int, default=5000,
+                        help='Number of log callbacks in the burst')
+    parser.add_argument('--log-rate', type=float, default=0,
+                        help='Log callbacks sent per second, 0 for as fast as served')
+    parser.add_argument('--wid-period', type=float, default=0.01,
+                        help='Period of on_implicit_send callbacks in seconds')
+    parser.add_argument('--emit-delay', type=float, default=0.0005,
+                        help='Emulated duration of a log write in seconds')
+    args = parser.parse_args()
+
+    run(args.logs, args.log_rate, args.wid_period, args.emit_delay)
+
+
+if __name__ == '__main__':
+    main()
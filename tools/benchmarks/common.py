@@ -0,0 +1,119 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Helpers shared by the benchmark scripts"""
+
+import queue
+import socket
+import statistics
+import struct
+import threading
+import time
+
+from autopts.pybtp import defs
+from autopts.pybtp.parser import HDR_LEN
+
+
+def recv_exact(conn, length):
+    buf = bytearray()
+    while len(buf) < length:
+        chunk = conn.recv(length - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+class LoopbackBTPStub(threading.Thread):
+    """Minimal IUT stand-in connected to a BTPSocketSrv unix socket.
+
+    Every received command is answered with an empty response carrying
+    the same service ID, opcode and controller index. Commands with an
+    opcode listed in fail_ops are answered with a BTP status error.
+    link_delay (in seconds) emulates the transport latency of a real IUT,
+    e.g. UART, by delaying delivery of each response without blocking
+    processing of the following commands.
+    """
+
+    def __init__(self, address, rsp_data=b'', fail_ops=(), link_delay=0):
+        super().__init__(name='LoopbackBTPStub', daemon=True)
+        self.address = address
+        self.rsp_data = rsp_data
+        self.fail_ops = fail_ops
+        self.link_delay = link_delay
+        self.conn = None
+        self._tx_queue = queue.Queue()
+
+        if link_delay:
+            threading.Thread(target=self._tx_task, name='LoopbackBTPStubTx', daemon=True).start()
+
+    def connect(self):
+        self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.conn.connect(self.address)
+
+    def run(self):
+        while True:
+            hdr = recv_exact(self.conn, HDR_LEN)
+            if hdr is None:
+                break
+
+            svc_id, op, ctrl_index, data_len = struct.unpack('<BBBH', hdr)
+            if data_len and recv_exact(self.conn, data_len) is None:
+                break
+
+            if op in self.fail_ops:
+                rsp = struct.pack('<BBBHB', svc_id, defs.BTP_STATUS, ctrl_index, 1, 1)
+            else:
+                rsp = struct.pack('<BBBH', svc_id, op, ctrl_index, len(self.rsp_data)) + self.rsp_data
+
+            if self.link_delay:
+                self._tx_queue.put((time.monotonic() + self.link_delay, rsp))
+            else:
+                self.conn.sendall(rsp)
+
+    def _tx_task(self):
+        while True:
+            deadline, rsp = self._tx_queue.get()
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            try:
+                self.conn.sendall(rsp)
+            except OSError:
+                break
+
+    def send_event(self, svc_id, op, data=b'', ctrl_index=0):
+        self.conn.sendall(struct.pack('<BBBH', svc_id, op, ctrl_index, len(data)) + data)
+
+    def close(self):
+        if self.conn:
+            try:
+                self.conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.conn.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def print_latency_summary(title, samples, unit_scale=1e6, unit='us'):
+    print(f'{title}:')
+    print(f'  samples: {len(samples)}')
+    print(f'  mean:    {statistics.mean(samples) * unit_scale:.1f} {unit}')
+    print(f'  p50:     {percentile(samples, 50) * unit_scale:.1f} {unit}')
+    print(f'  p95:     {percentile(samples, 95) * unit_scale:.1f} {unit}')
+    print(f'  max:     {max(samples) * unit_scale:.1f} {unit}')
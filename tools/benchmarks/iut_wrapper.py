@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of BTP commands per second with one and with two IUTs
+
+Sends BTP commands the way the btp.* functions do, through
+get_iut().btp_socket, to local loopback stubs:
+- 1 IUT: a plain IutCtl, as with a single --iut_target,
+- 2 IUTs: an IutCtlWrapper, one thread alternating select_iut() per
+  command and one thread per IUT, as the LT threads of a 2-IUT test case.
+It also prints the cost of a single get_iut().btp_socket access.
+
+Usage:
+$ python3 -m tools.benchmarks.iut_wrapper --count 20000
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import timeit
+from types import SimpleNamespace
+
+from autopts.ptsprojects.iutctl import IutCtl, IutCtlWrapper
+from autopts.pybtp import defs
+from autopts.pybtp.iutctl_common import BTPSocketSrv, BTPWorker
+from tools.benchmarks.common import LoopbackBTPStub
+
+CMD = (defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_SET_VALUE, defs.BTP_INDEX_NONE, b'\x00\x00\x01\x00\x01')
+
+
+def target_args(name):
+    return SimpleNamespace(
+        iut_target_name=name, iut_mode='tty', pylink_reset=False, device_core=None,
+        debugger_snr=None, kernel_image=None, kernel_cpu=None, tty_file=None,
+        net_tty_file=None, tty_baudrate=115200, btattach_bin=None,
+        btattach_at_every_test_case=False, btproxy_bin=None, qemu_bin=None,
+        qemu_options='', btmgmt_bin=None, hid_vid=None, hid_pid=None, hid_serial=None,
+        hci=None, gdb=False, rtscts=False, board_name=None, btmon=False, btp_log=False,
+        rtt_log=False, rtt_log_syncto=None)
+
+
+def connect_loopback(iutctl, address):
+    socket_srv = BTPSocketSrv()
+    socket_srv.open(address)
+    worker = BTPWorker(socket_srv)
+
+    stub = LoopbackBTPStub(address)
+    stub.connect()
+    stub.start()
+    worker.accept()
+
+    iutctl.btp_socket = worker
+    return worker, stub
+
+
+def send_cmds(get_iut, count, iut_id=None):
+    if iut_id is not None:
+        get_iut().select_iut(iut_id)
+
+    for _ in range(count):
+        iutctl = get_iut()
+        iutctl.btp_socket.send_wait_rsp(*CMD)
+
+
+def send_cmds_alternating(get_iut, count):
+    for i in range(count):
+        iutctl = get_iut()
+        iutctl.select_iut(i % 2)
+        iutctl.btp_socket.send_wait_rsp(*CMD)
+
+
+def report(title, count, duration, access_ns):
+    print(f'{title}:')
+    print(f'  commands/s:           {count / duration:.0f}')
+    print(f'  get_iut().btp_socket: {access_ns:.0f} ns')
+
+
+def run(count):
+    single = IutCtl(target_args('iut0'))
+    wrapper = IutCtlWrapper(SimpleNamespace(
+        iut_targets_args={'iut0': target_args('iut0'), 'iut1': target_args('iut1')}))
+
+    def get_single():
+        return single
+
+    def get_wrapped():
+        return wrapper.handle()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        connections = [connect_loopback(single, os.path.join(tmp_dir, 'single'))]
+        for iut_id in range(2):
+            wrapper.select_iut(iut_id)
+            connections.append(connect_loopback(wrapper.handle(),
+                                                os.path.join(tmp_dir, f'iut{iut_id}')))
+        wrapper.select_iut(0)
+
+        def access_ns(get_iut):
+            number = 100000
+            return timeit.timeit(lambda: get_iut().btp_socket, number=number) / number * 1e9
+
+        try:
+            start = time.perf_counter()
+            send_cmds(get_single, count)
+            report('1 IUT', count, time.perf_counter() - start, access_ns(get_single))
+
+            start = time.perf_counter()
+            send_cmds_alternating(get_wrapped, count)
+            report('2 IUTs, one thread alternating', count, time.perf_counter() - start,
+                   access_ns(get_wrapped))
+
+            threads = [threading.Thread(target=send_cmds, args=(get_wrapped, count // 2, iut_id))
+                       for iut_id in range(2)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            report('2 IUTs, thread per IUT', count, time.perf_counter() - start,
+                   access_ns(get_wrapped))
+        finally:
+            for worker, stub in connections:
+                worker.close()
+                stub.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BTP commands per second with one and two IUTs")
+    parser.add_argument('--count', type=int, default=20000,
+                        help='Number of commands sent in each case')
+    args = parser.parse_args()
+
+    run(args.count)
+
+
+if __name__ == '__main__':
+    main()
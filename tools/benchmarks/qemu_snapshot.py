@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of the QEMU IUT start, cold boot vs QemuSnapshot restore
+
+Starts a Zephyr tester image with the QEMU command of IutCtl and measures
+the time until the IUT is ready, i.e. until its IUT ready event for a cold
+boot, or until the VM runs for a restore. If nothing listens on the
+controller socket /tmp/bt-server-bredr, a dummy listener is opened there.
+
+The per-suite savings are projected from the number of GAP and GATT test
+cases, given with --suite or counted in the test case database of the bot.
+
+Usage:
+$ python3 -m tools.benchmarks.qemu_snapshot --qemu-bin qemu-system-arm \\
+    --kernel-image zephyr.elf --qemu-options '-cpu cortex-m3 -machine lm3s6965evb' \\
+    --database TestCase.db --table zephyr
+"""
+
+import argparse
+import os
+import socket
+import sqlite3
+import tempfile
+import time
+
+from autopts.ptsprojects.iutctl import get_qemu_cmd
+from autopts.ptsprojects.utils.qemu import QEMU, QemuSnapshot
+from autopts.pybtp import defs
+from autopts.pybtp.iutctl_common import BTPSocketSrv
+from tools.benchmarks.common import print_latency_summary
+
+BREDR_ADDRESS = '/tmp/bt-server-bredr'
+BOOT_LOG = 'Booting Zephyr OS build'
+SUITES = ('GAP', 'GATT')
+
+
+def start_iut(tmp_dir, qemu_cmd, snapshot=None):
+    btp_address = os.path.join(tmp_dir, 'btp')
+    socket_srv = BTPSocketSrv()
+    socket_srv.open(btp_address)
+    qemu = QEMU()
+
+    start = time.perf_counter()
+    if snapshot:
+        qemu.start(snapshot.restore_cmd(qemu_cmd), None, tmp_dir)
+        socket_srv.accept(timeout=30)
+        snapshot.wait_restored()
+    else:
+        qemu.start(qemu_cmd, BOOT_LOG, tmp_dir)
+        socket_srv.accept(timeout=30)
+        tuple_hdr, _ = socket_srv.read(timeout=30)
+        if tuple_hdr.op != defs.BTP_CORE_EV_IUT_READY:
+            raise Exception(f'IUT ready event NOT received: {tuple_hdr}')
+
+    return time.perf_counter() - start, qemu, socket_srv
+
+
+def count_suites(database, table):
+    conn = sqlite3.connect(database)
+    try:
+        return {suite: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE name LIKE ?;",
+                                    (f'{suite}/%',)).fetchone()[0]
+                for suite in SUITES}
+    finally:
+        conn.close()
+
+
+def run(qemu_bin, kernel_image, qemu_options, boots, suites):
+    bredr = None
+    if not os.path.exists(BREDR_ADDRESS):
+        bredr = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        bredr.bind(BREDR_ADDRESS)
+        bredr.listen(boots * 2 + 1)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            btp_address = os.path.join(tmp_dir, 'btp')
+            qemu_cmd = get_qemu_cmd(kernel_image, qemu_bin, btp_address, qemu_options)
+            snapshot = QemuSnapshot(tmp_dir, 'bench', os.path.join(tmp_dir, 'qmp'))
+            snapshot.update(kernel_image, qemu_cmd)
+
+            cold = []
+            for i in range(boots):
+                duration, qemu, socket_srv = start_iut(tmp_dir, snapshot.boot_cmd(qemu_cmd))
+                cold.append(duration)
+                if i == 0:
+                    start = time.perf_counter()
+                    snapshot.save()
+                    print(f'snapshot saved in {time.perf_counter() - start:.3f} s, '
+                          f'{os.path.getsize(snapshot.path)} bytes')
+                socket_srv.close()
+                qemu.close()
+
+            restore = []
+            for _ in range(boots):
+                snapshot.verify()
+                duration, qemu, socket_srv = start_iut(tmp_dir, qemu_cmd, snapshot)
+                restore.append(duration)
+                socket_srv.close()
+                qemu.close()
+    finally:
+        if bredr:
+            bredr.close()
+            os.remove(BREDR_ADDRESS)
+
+    print_latency_summary('cold boot', cold, 1e3, 'ms')
+    print_latency_summary('restore', restore, 1e3, 'ms')
+
+    saved = sum(cold) / len(cold) - sum(restore) / len(restore)
+    for suite, count in suites.items():
+        print(f'{suite}: {count} test cases, {saved * count:.1f} s saved per run')
+
+
+def parse_suite(value):
+    suite, count = value.split('=')
+    return suite, int(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QEMU IUT cold boot vs snapshot restore")
+    parser.add_argument('--qemu-bin', required=True,
+                        help='The path to the QEMU executable')
+    parser.add_argument('--kernel-image', required=True,
+                        help='Zephyr tester image built for QEMU')
+    parser.add_argument('--qemu-options', default='-cpu cortex-m3 -machine lm3s6965evb',
+                        help='Additional options for QEMU')
+    parser.add_argument('--boots', type=int, default=10,
+                        help='Number of cold boots and of restores')
+    parser.add_argument('--suite', type=parse_suite, action='append', default=[],
+                        help='Number of test cases of a suite, e.g. GAP=250')
+    parser.add_argument('--database',
+                        help='Test case database of the bot to count the GAP and GATT test cases in')
+    parser.add_argument('--table', default='zephyr',
+                        help='Table of the test case database')
+    args = parser.parse_args()
+
+    suites = dict(args.suite)
+    if args.database:
+        suites = {**count_suites(args.database, args.table), **suites}
+
+    run(args.qemu_bin, args.kernel_image, args.qemu_options, args.boots, suites)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of stack event wake-up latency
+
+Measures the time between an event being pushed into a stack layer
+event queue (or a state change being notified) and the waiting thread
+returning from wait_event_with_condition() / wait_for_event().
+
+Usage:
+$ python3 -m tools.benchmarks.stack_event_latency --count 500
+"""
+
+import argparse
+import threading
+import time
+
+from autopts.ptsprojects.stack.common import EventQueue, notify_event_waiters, wait_event_with_condition, wait_for_event
+from tools.benchmarks.common import print_latency_summary
+
+
+def bench_event_queue(count):
+    queue = EventQueue()
+    samples = []
+    max_threads = 0
+
+    for i in range(count):
+        def producer(value=i):
+            time.sleep(0.001)
+            queue.append((value, time.perf_counter()))
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        max_threads = max(max_threads, threading.active_count())
+
+        value, sent = wait_event_with_condition(queue, lambda v, _, i=i: v == i, 5, True)
+        samples.append(time.perf_counter() - sent)
+        thread.join()
+
+    print_latency_summary('wait_event_with_condition wake-up latency', samples)
+    print(f'  max active threads: {max_threads}')
+
+
+def bench_state_change(count):
+    state = {'value': None}
+    samples = []
+
+    for i in range(count):
+        def producer(value=i):
+            time.sleep(0.001)
+            state['value'] = (value, time.perf_counter())
+            notify_event_waiters()
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+
+        wait_for_event(5, lambda i=i: state['value'] is not None and state['value'][0] == i)
+        samples.append(time.perf_counter() - state['value'][1])
+        thread.join()
+
+    print_latency_summary('wait_for_event wake-up latency', samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stack event wake-up latency benchmark")
+    parser.add_argument('--count', type=int, default=200,
+                        help='Number of awaited events')
+    args = parser.parse_args()
+
+    bench_event_queue(args.count)
+    bench_state_change(args.count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of XML-RPC calls per second to a loopback autoptsserver stub
+
+The stub serves one request per handle_request() from a single thread,
+as autoptsserver does. It compares:
+- a stock ServerProxy with the stock HTTP/1.0 request handler,
+- PtsServerProxy with the keep-alive request handler,
+- PtsServerProxy with system.multicall batches,
+- memoized bd_addr() of PtsServerProxy.
+
+Usage:
+$ python3 -m tools.benchmarks.xmlrpc_transport --count 2000 --batch 8
+"""
+
+import argparse
+import threading
+import time
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+from autopts.client import PtsServerProxy
+from autopts.xmlrpc_keepalive import KeepAliveXMLRPCRequestHandler
+
+
+class StubPTS:
+    def __init__(self):
+        self.calls = 0
+
+    def _dispatch(self, method_name, params):
+        self.calls += 1
+        return getattr(self, method_name)(*params)
+
+    def ready(self):
+        return True
+
+    def bd_addr(self):
+        return '00:1B:DC:F2:20:3A'
+
+    def get_version(self):
+        return 0x00080600
+
+    def get_project_list(self):
+        return ['GAP', 'GATT', 'SM', 'L2CAP']
+
+    def open_workspace(self, *args):
+        return None
+
+    def set_wid_response(self, response):
+        return True
+
+
+class StubServer(threading.Thread):
+    def __init__(self, request_handler):
+        super().__init__(daemon=True)
+        self.server = SimpleXMLRPCServer(('127.0.0.1', 0), requestHandler=request_handler,
+                                         allow_none=True, logRequests=False)
+        self.pts = StubPTS()
+        self.server.register_instance(self.pts)
+        self.server.register_multicall_functions()
+        self.server.timeout = 1.0
+        self.end = threading.Event()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def run(self):
+        while not self.end.is_set():
+            self.server.handle_request()
+
+    def close(self):
+        self.end.set()
+        self.join()
+        self.server.server_close()
+
+
+def measure(title, count, func):
+    start = time.perf_counter()
+    func()
+    duration = time.perf_counter() - start
+    print(f'{title}: {count / duration:.0f} calls/s')
+
+
+def run(count, batch):
+    stock_server = StubServer(SimpleXMLRPCRequestHandler)
+    keepalive_server = StubServer(KeepAliveXMLRPCRequestHandler)
+    stock_server.start()
+    keepalive_server.start()
+
+    stock = xmlrpc.client.ServerProxy(f'http://127.0.0.1:{stock_server.port}/', allow_none=True)
+    proxy = PtsServerProxy('127.0.0.1', keepalive_server.port)
+
+    def call_stock():
+        for _ in range(count):
+            stock.ready()
+
+    def call_keepalive():
+        for _ in range(count):
+            proxy.ready()
+
+    def call_multicall():
+        for _ in range(count // batch):
+            proxy.multicall([('ready', ())] * batch)
+
+    def bd_addr_stock():
+        for _ in range(count):
+            stock.bd_addr()
+
+    def bd_addr_memoized():
+        for _ in range(count):
+            proxy.bd_addr()
+
+    try:
+        measure('ready(), stock HTTP/1.0', count, call_stock)
+        measure('ready(), keep-alive', count, call_keepalive)
+        measure(f'ready(), keep-alive, multicall of {batch}', count // batch * batch, call_multicall)
+        measure('bd_addr(), stock HTTP/1.0', count, bd_addr_stock)
+        measure('bd_addr(), memoized', count, bd_addr_memoized)
+    finally:
+        stock('close')()
+        proxy('close')()
+        stock_server.close()
+        keepalive_server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XML-RPC calls per second to a loopback server stub")
+    parser.add_argument('--count', type=int, default=2000,
+                        help='Number of calls in each case')
+    parser.add_argument('--batch', type=int, default=8,
+                        help='Number of calls in a system.multicall request')
+    args = parser.parse_args()
+
+    run(args.count, args.batch)
+
+
+if __name__ == '__main__':
+    main()
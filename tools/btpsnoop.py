@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2026, Nordic Semiconductor ASA.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Decoder of binary BTP captures recorded with --btp-log binary/both
+
+Renders the capture in the autopts-iutctl.log text format, optionally
+filtered by IUT, service and opcode, or prints per-command latency
+statistics with a histogram.
+
+Usage:
+$ python3 -m tools.btpsnoop logs/.../autopts-iutctl-IUT1.btpsnoop
+$ python3 -m tools.btpsnoop capture.btpsnoop --svc GAP --op 0x0a
+$ python3 -m tools.btpsnoop capture.btpsnoop --latency
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+
+from autopts.pybtp.wirelog import DIR_CMD, SERVICE_NAMES, format_frame, get_opcode_name, read_capture
+from tools.benchmarks.common import percentile
+
+# Upper bounds of the latency histogram buckets, in microseconds
+HISTOGRAM_BUCKETS = [100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000]
+HISTOGRAM_WIDTH = 40
+
+
+def parse_svc(value):
+    for svc_id, name in SERVICE_NAMES.items():
+        if name.lower() == value.lower():
+            return svc_id
+
+    try:
+        return int(value, 0)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Unknown BTP service: {value}') from None
+
+
+def match_frame(args, iut_name, frame):
+    if args.iut is not None and iut_name != args.iut:
+        return False
+
+    if args.svc is not None and frame[0] != args.svc:
+        return False
+
+    return args.op is None or frame[1] == args.op
+
+
+def print_frames(args, records):
+    for timestamp, direction, iut_name, frame in records:
+        if not match_frame(args, iut_name, frame):
+            continue
+
+        if args.show_iut:
+            print(f'[{iut_name}]')
+        sys.stdout.write(format_frame(timestamp, direction, frame))
+
+
+def collect_latencies(args, records):
+    """Pair each command with the response that follows it on the same IUT
+
+    BTP allows only one pending command per IUT, so the first non-event
+    frame received after a command is its response.
+    """
+    pending = {}
+    latencies = defaultdict(list)
+
+    for timestamp, direction, iut_name, frame in records:
+        svc_id, op = frame[0], frame[1]
+
+        if direction == DIR_CMD:
+            pending[iut_name] = (timestamp, svc_id, op)
+            continue
+
+        if op >= 0x80 or iut_name not in pending:
+            continue
+
+        cmd_timestamp, cmd_svc_id, cmd_op = pending.pop(iut_name)
+        if not match_frame(args, iut_name, bytes((cmd_svc_id, cmd_op))):
+            continue
+
+        latencies[(cmd_svc_id, cmd_op)].append(timestamp - cmd_timestamp)
+
+    return latencies
+
+
+def print_histogram(samples):
+    counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    for sample in samples:
+        sample_us = sample * 1e6
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if sample_us <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    peak = max(counts)
+    labels = [f'<= {bound} us' for bound in HISTOGRAM_BUCKETS] + [f'> {HISTOGRAM_BUCKETS[-1]} us']
+
+    for label, count in zip(labels, counts, strict=True):
+        if count:
+            print(f'    {label:>14} {count:>7} {"#" * max(1, count * HISTOGRAM_WIDTH // peak)}')
+
+
+def print_latencies(latencies):
+    for (svc_id, op), samples in sorted(latencies.items()):
+        print(f'{get_opcode_name(svc_id, op)} (0x{svc_id:02x}|0x{op:02x})')
+        print(f'  count: {len(samples)}  p50: {percentile(samples, 50) * 1e3:.3f} ms  '
+              f'p95: {percentile(samples, 95) * 1e3:.3f} ms  max: {max(samples) * 1e3:.3f} ms')
+        print_histogram(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode binary BTP capture')
+    parser.add_argument('capture', help='Path to the .btpsnoop capture file')
+    parser.add_argument('--iut', default=None, help='Show only frames of the IUT with this name')
+    parser.add_argument('--svc', type=parse_svc, default=None,
+                        help='Show only frames of this BTP service, e.g. GAP or 0x01')
+    parser.add_argument('--op', type=lambda x: int(x, 0), default=None,
+                        help='Show only frames with this opcode, e.g. 0x0a')
+    parser.add_argument('--show-iut', action='store_true', help='Prefix each frame with the IUT name')
+    parser.add_argument('--latency', action='store_true',
+                        help='Print command to response latency statistics instead of frames')
+    args = parser.parse_args()
+
+    records = read_capture(args.capture)
+
+    if args.latency:
+        print_latencies(collect_latencies(args, records))
+    else:
+        print_frames(args, records)
+
+
+if __name__ == '__main__':
+    main()
@@ -90,10 +90,12 @@ def estimate_test_cases(config, included, excluded):
     return test_cases
 
 
-def estimate_test_cases_duration(database_file, table_name, test_cases, max_count):
+def estimate_test_cases_duration(database_file, table_name, test_cases, max_count, percentile=None):
     database = TestCaseTable(table_name, database_file)
-    est_duration = database.estimate_session_duration(test_cases, max_count)
-    return est_duration
+    try:
+        return database.estimate_session_duration(test_cases, max_count, percentile)
+    finally:
+        database.close()
 
 
 def get_estimations(config, included_tc, excluded_tc, limit=None):
@@ -122,9 +124,11 @@ def get_estimations(config, included_tc, excluded_tc, limit=None):
         table_name = f"{config['name']}_{config['auto_pts']['board']}"
         table_name = config['auto_pts'].get('table_name', table_name)
         max_count = config['auto_pts'].get('retry', 0) + 1
+        # e.g. 95 for a pessimistic estimate, so the scheduled jobs do not overlap
+        percentile = config['cron']['test_case_estimation'].get('percentile', None)
 
         est_duration = estimate_test_cases_duration(
-            database_file, table_name, test_cases, max_count)
+            database_file, table_name, test_cases, max_count, percentile)
 
         if est_duration:
             est_duration = timedelta(seconds=int(est_duration))